@@ -1,34 +1,55 @@
 """
 Chat endpoint'leri: RAG ile soru-cevap, mesaj kaydetme, geçmiş getirme.
+Mesajlar write-behind tampondan (message_buffer) toplu olarak yazılır; aynı repoda
+çok benzer sorular önbellekteki cevapla (retrieval_cache.answers) LLM çağrılmadan akıtılır.
 """
+import asyncio
+import base64
+import hashlib
+import json
+import time
 import traceback
-
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import StreamingResponse
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-from pydantic import BaseModel
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
-from supabase import create_client, Client
 
 from app.core.config import settings
 from app.deps import get_current_user
-from app.limiter import limiter
-from app.services.custom_supabase import CustomSupabaseVectorStore
-from app.services.llm_service import llm, embeddings
+from app.limiter import charge, limiter
+from app.services.message_buffer import message_buffer
+from app.services.metrics import ANSWER_CACHE, record_stage, stage_timer
+from app.services.resources import resources
+from app.services.retrieval_cache import retrieval_cache
 
 router = APIRouter()
-supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE_KEY)
 
 
 class ChatRequest(BaseModel):
     collection_name: str
     question: str
     user_id: str
+    # True ise soru ve tamamlanan cevap sunucuda kaydedilir (ayrı /chat/save çağrısı gerekmez)
+    save_messages: bool = False
+
+
+async def _replay(chunks: List[str]) -> AsyncIterator[str]:
+    """Önbellekteki cevabı, LLM'den geldiği parçalarla aynı sırada akıtır."""
+    for chunk in chunks:
+        yield chunk
+
+
+# LLM çağrısı gerektiren sorular için günlük hak; önbellekten cevaplanan sorular hak harcamaz
+ASK_DAILY_LIMIT = "5/day"
 
 
 @router.post("/ask")
-@limiter.limit("5/day", key_func=lambda request: getattr(request.state, 'user_id', get_remote_address(request)))
+@limiter.limit("60/minute", key_func=lambda request: getattr(request.state, 'user_id', get_remote_address(request)))
 async def chat(request: Request, data: ChatRequest, current_user_id: str = Depends(get_current_user)):
 
 
@@ -40,99 +61,50 @@ async def chat(request: Request, data: ChatRequest, current_user_id: str = Depen
         if not hasattr(request.state, 'user_id'):
             request.state.user_id = current_user_id
 
-        vector_store = CustomSupabaseVectorStore(embeddings=embeddings)
-        # Benzer kod parçalarını user_id ve collection_name ile filtreleyerek getir
-        retriever = vector_store.as_retriever(
-            search_type="similarity",
-            search_kwargs={
-                "k": 15,
-                "filter": {
-                    "collection_name": data.collection_name,
-                    "user_id": data.user_id
-                }
-            }
-        )
-        
-        # Gelişmiş prompt şablonu - Görsel zenginlik ve yapılandırılmış çıktı
-        template = """## 🎯 Rol
-Sen "AI Repo Analyst" uygulamasının yapay zeka asistanısın. Deneyimli bir Yazılım Mimarı ve Teknik Lider olarak, GitHub repolarını analiz edip kullanıcılara yardımcı oluyorsun.
-
----
-
-## 📁 Kod Bağlamı
-Aşağıda kullanıcının reposundan alınan ilgili kod parçaları var:
-
-{context}
-
----
-
-## ❓ Kullanıcı Sorusu
-{question}
-
----
-
-## 📝 Yanıt Kuralları
-
-### İçerik Kuralları:
-1. **Doğrudan Cevap Ver:** Sorulan şeye net cevap ver, tüm projeyi özetleme
-2. **Teknik Derinlik:** Kod parçalarından aldığın bilgilerle destekle
-3. **Bilinmeyen Durum:** Bağlamda yoksa "Bu bilgiye kodlarda rastlamadım" de, uydurma
-4. **Kesin Yargılar:** "Bu proje Django framework'ü kullanıyor" gibi net ifadeler kullan
-5. **Kanıt Sunma:** "Kodda @login_required gördüğüm için..." gibi dedektif cümleleri kurma
-
-### Format Kuralları:
-1. **Özet ile Başla:** İlk 1-2 cümlede kısa özet ver
-2. **Yapılandırılmış Yanıt:** Başlıklar (##, ###) ve maddeler kullan
-3. **Kod Örnekleri:** Kod bloklarını dil belirterek yaz (```python, ```javascript vb.)
-4. **Dosya Referansları:** 📁 `dosya_adi.py` şeklinde belirt
-
-
-### Emoji Kullanımı:
-- 💡 Öneri ve ipuçları için
-- ⚠️ Uyarı ve dikkat edilmesi gerekenler için
-- ✅ Doğru/iyi pratikler için
-- ❌ Yanlış/kaçınılması gerekenler için
-- 🔍 Detaylı inceleme gerektiren noktalar için
-- 📁 Dosya referansları için
-- 🚀 Performans ve optimizasyon için
-- 🔒 Güvenlik ile ilgili konular için
-
-### Ek Öneriler (Uygunsa):
-- Best practice tavsiyeleri ver
-- Potansiyel iyileştirme alanlarını belirt
-- Güvenlik veya performans uyarıları ekle
-
----
-
-## 🌐 Dil
-Türkçe yanıt ver. Teknik terimleri (API, endpoint, middleware, framework vb.) İngilizce bırakabilirsin.
+        # Zincir süreç başına bir kez kurulur (resources); burada sadece girdi verilir
+        chain = resources.chat_chain
+        chain_input = {
+            "question": data.question,
+            "collection_name": data.collection_name,
+            "user_id": data.user_id,
+        }
+
+        # Cevap önbelleği: sorgu embedding'i retrieval ile ortaktır, isabette LLM çağrılmaz
+        answers = retrieval_cache.answers
+        embedding, cached, version = None, None, None
+        if answers is not None:
+            try:
+                with stage_timer("answer_cache"):
+                    version = answers.version(data.collection_name, data.user_id)
+                    embedding = await retrieval_cache.aget_query_embedding(
+                        data.question, resources.vector_store.embeddings.aembed_query
+                    )
+                    cached = answers.get(data.collection_name, data.user_id, embedding)
+                ANSWER_CACHE.inc(result="miss" if cached is None else "hit")
+            except Exception as e:
+                print(f"Cevap önbelleği atlandı: {e}")
+        if cached is None:
+            charge(ASK_DAILY_LIMIT, "chat_ask", data.user_id)
 
-Şimdi yukarıdaki kurallara uygun şekilde kullanıcının sorusunu yanıtla:
-"""
-        prompt = ChatPromptTemplate.from_template(template)
-        model = llm
-        
-        def format_docs(docs):
-            """Dokümanları dosya adıyla birlikte formatla"""
-            formatted = []
-            for doc in docs:
-                # Metadata'dan dosya yolunu al (varsa)
-                file_path = doc.metadata.get('file_path', doc.metadata.get('source', 'Bilinmeyen dosya'))
-                content = doc.page_content
-                formatted.append(f"📁 **Dosya:** `{file_path}`\n```\n{content}\n```")
-            return "\n\n---\n\n".join(formatted)
-
-        chain = (
-            {"context": retriever | format_docs, "question": lambda _: data.question}
-            | prompt
-            | model
-            | StrOutputParser()
-        )
+        if data.save_messages:
+            message_buffer.add(data.user_id, data.collection_name, "user", data.question)
 
         async def generate():
+            # Akış başlıklardan sonra sürer: bu aşamalar Server-Timing'e değil /metrics'e düşer
+            answer = []
+            started = time.perf_counter()
             try:
-                async for chunk in chain.astream(data.question):
+                stream = _replay(cached) if cached is not None else chain.astream(chain_input)
+                async for chunk in stream:
+                    if not answer:
+                        record_stage("first_token", time.perf_counter() - started)
+                    answer.append(chunk)
                     yield chunk
+                record_stage("answer", time.perf_counter() - started)
+                if cached is None and embedding is not None and answer:
+                    answers.put(data.collection_name, data.user_id, embedding, answer, version=version)
+                if data.save_messages and answer:
+                    message_buffer.add(data.user_id, data.collection_name, "ai", "".join(answer))
             except Exception as e:
                 msg = str(e)
                 if "NOT_FOUND" in msg and ("models/" in msg or "generateContent" in msg):
@@ -142,10 +114,10 @@ Türkçe yanıt ver. Teknik terimleri (API, endpoint, middleware, framework vb.)
                         "✅ **Önerilen model:** `gemini-1.5-flash-latest`\n"
                     )
                     return
-                if "match_documents" in msg and ("42804" in msg or "result type" in msg):
+                if "match_documents" in msg and ("42804" in msg or "42703" in msg or "result type" in msg):
                     yield (
                         "\n\n⚠️ **Hata:** Supabase `match_documents` fonksiyonu uyumsuz.\n\n"
-                        "💡 **Çözüm:** `backend/supabase/sql/match_documents.sql` dosyasını Supabase SQL Editor'da çalıştırın.\n"
+                        "💡 **Çözüm:** `backend/supabase/migrations/` altındaki SQL dosyalarını sırayla Supabase SQL Editor'da çalıştırın.\n"
                     )
                 else:
                     err_detail = msg if settings.DEBUG else "Beklenmeyen bir hata oluştu."
@@ -153,6 +125,8 @@ Türkçe yanıt ver. Teknik terimleri (API, endpoint, middleware, framework vb.)
 
         return StreamingResponse(generate(), media_type="text/event-stream")
 
+    except RateLimitExceeded:
+        raise
     except Exception as e:
         traceback.print_exc()
         detail = str(e) if settings.DEBUG else "Bir hata oluştu. Lütfen tekrar deneyin."
@@ -165,38 +139,106 @@ class MessageSchema(BaseModel):
     role: str
     content: str
 
+class MessageBatchSchema(BaseModel):
+    messages: List[MessageSchema] = Field(..., min_length=1, max_length=50)
+
+
 @router.post("/save")
 async def save_message(msg: MessageSchema, current_user_id: str = Depends(get_current_user)):
-    """Sohbet mesajını veritabanına kaydeder."""
+    """Sohbet mesajını kayıt tamponuna alır; kısa süre içinde toplu olarak yazılır."""
     if msg.user_id != current_user_id:
         raise HTTPException(status_code=403, detail="Yetkisiz işlem.")
 
+    message_buffer.add(msg.user_id, msg.repo_name, msg.role, msg.content)
+    return {"status": "queued"}
+
+
+@router.post("/save/batch")
+async def save_messages(batch: MessageBatchSchema, current_user_id: str = Depends(get_current_user)):
+    """Birden fazla mesajı (ör. soru + cevap) tek istekte, verilen sırayla kaydeder."""
+    if any(msg.user_id != current_user_id for msg in batch.messages):
+        raise HTTPException(status_code=403, detail="Yetkisiz işlem.")
+
+    message_buffer.add_many([msg.model_dump() for msg in batch.messages])
+    return {"status": "queued", "count": len(batch.messages)}
+
+
+HISTORY_COLUMNS = "id, role, content, created_at"
+
+
+def _encode_cursor(row: dict) -> str:
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    """
+    (created_at, id) döner. Değerler PostgREST or_ filtresine yazıldığından biçimleri
+    doğrulanır (ISO zaman damgası; tamsayı veya UUID id), aksi halde 400.
+    """
     try:
-        supabase.table("chat_messages").insert({
-            "user_id": msg.user_id,
-            "repo_name": msg.repo_name,
-            "role": msg.role,
-            "content": msg.content
-        }).execute()
-        return {"status": "saved"}
-    except Exception as e:
-        print(f"Mesaj kayıt hatası: {e}")
-        return {"status": "error", "detail": str(e)}
+        created_at, message_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        created_at = datetime.fromisoformat(created_at).isoformat()
+        message_id = str(message_id)
+        if not message_id.isdigit():
+            message_id = str(uuid.UUID(message_id))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Geçersiz sayfa imleci.")
+    return created_at, message_id
+
 
 @router.get("/history")
-async def get_chat_history(user_id: str, repo_name: str, current_user_id: str = Depends(get_current_user)):
-    """Belirtilen repo için sohbet geçmişini döner."""
+async def get_chat_history(
+    request: Request,
+    user_id: str,
+    repo_name: str,
+    limit: int = Query(settings.CHAT_HISTORY_PAGE_SIZE, ge=1, le=settings.CHAT_HISTORY_MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    current_user_id: str = Depends(get_current_user),
+):
+    """
+    Belirtilen repo için sohbet geçmişinin en yeni sayfasını (kendi içinde eskiden yeniye) döner.
+    Daha eski mesajlar varsa X-Next-Cursor başlığındaki imleç before parametresiyle gönderilir
+    (created_at, id üzerinde keyset sayfalama). Sayfa değişmediyse If-None-Match ile 304 döner.
+    """
     if user_id != current_user_id:
         raise HTTPException(status_code=403, detail="Bu geçmişi göremezsiniz.")
 
+    # Kullanıcı kendi yazdığını hemen görsün: bu repo için tamponda bekleyen varsa önce yaz
+    if message_buffer.has_pending(user_id, repo_name):
+        await asyncio.to_thread(message_buffer.flush)
+
+    query = resources.supabase.table("chat_messages")\
+        .select(HISTORY_COLUMNS)\
+        .eq("user_id", user_id)\
+        .eq("repo_name", repo_name)
+    if before:
+        created_at, message_id = _decode_cursor(before)
+        query = query.or_(
+            f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{message_id}")'
+        )
+
     try:
-        response = supabase.table("chat_messages")\
-            .select("*")\
-            .eq("user_id", user_id)\
-            .eq("repo_name", repo_name)\
-            .order("created_at", desc=False)\
-            .execute()
-        return response.data
+        # Bir fazlası: sonraki sayfanın varlığı ek sorgu olmadan anlaşılır
+        with stage_timer("history_query"):
+            response = query\
+                .order("created_at", desc=True)\
+                .order("id", desc=True)\
+                .limit(limit + 1)\
+                .execute()
     except Exception as e:
         print(f"Geçmiş getirme hatası: {e}")
-        return []
\ No newline at end of file
+        return []
+
+    rows = response.data[:limit]
+    next_cursor = _encode_cursor(rows[-1]) if len(response.data) > limit else None
+    page = list(reversed(rows))
+
+    body = json.dumps(page, ensure_ascii=False, separators=(",", ":"), default=str)
+    etag = 'W/"' + hashlib.sha1(f"{body}|{next_cursor}".encode("utf-8")).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(page, headers=headers)
@@ -2,25 +2,36 @@
 Repository ile ilgili endpoint'ler: indeksleme, listeleme, silme.
 Tüm işlemler JWT ile doğrulanmış kullanıcıya özeldir.
 """
-import asyncio  
-import gc      
 from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
 from slowapi.util import get_remote_address
-from supabase import create_client
 
 from app.core.config import settings
 from app.core.validators import validate_repo_url
 from app.deps import get_current_user
 from app.limiter import limiter
+from app.services.index_jobs import IndexJob, IndexJobQueue, JobStore
+from app.services.metrics import collect_timings
 from app.services.rag_service import RAGService
+from app.services.resources import resources
 
 router = APIRouter()
 rag_service = RAGService()
-supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE_KEY)
 
 
-REPO_PROCESSING_LOCK = asyncio.Semaphore(1)
+async def run_index_job(job: IndexJob):
+    """Worker tarafından çağrılır; ağır işlem burada yapılıyor. Aşama süreleri işe yazılır."""
+    with collect_timings(job.timings):
+        return await rag_service.index_repository(job.repo_url, job.user_id, job=job)
+
+
+index_queue = IndexJobQueue(
+    runner=run_index_job,
+    worker_count=settings.INDEX_WORKERS,
+    per_user_concurrency=settings.INDEX_JOBS_PER_USER,
+    history_size=settings.INDEX_JOB_HISTORY,
+    store=JobStore(settings.INDEX_JOBS_PATH),
+)
 
 class RepoRequest(BaseModel):
     repo_url: str
@@ -31,52 +42,79 @@ class DeleteRequest(BaseModel):
     user_id: str
 
 
-@router.post("/index")
+@router.post("/index", status_code=202)
 @limiter.limit("3/day", key_func=lambda request: getattr(request.state, 'user_id', get_remote_address(request)))
 async def index_repository(request: Request, data: RepoRequest, current_user_id: str = Depends(get_current_user)):
+    """İndeksleme işini kuyruğa alır ve job_id ile hemen döner."""
+    if data.user_id != current_user_id:
+        raise HTTPException(status_code=403, detail="Başkasının adına işlem yapamazsınız!")
 
-    
-    async with REPO_PROCESSING_LOCK:
-        
-        if data.user_id != current_user_id:
-            raise HTTPException(status_code=403, detail="Başkasının adına işlem yapamazsınız!")
-
-        # URL doğrulama: sadece GitHub, GitLab, Bitbucket desteklenir
-        try:
-            validate_repo_url(data.repo_url)
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
-
-        try:
-            if not hasattr(request.state, 'user_id'):
-                request.state.user_id = current_user_id
-
-            # Kullanıcı başına maksimum 3 repo limiti
-            count_res = supabase.table("user_repos").select("*", count="exact").eq("user_id", data.user_id).execute()
-            current_count = count_res.count if count_res.count is not None else 0
-
-            existing = supabase.table("user_repos").select("*").match({
-                "user_id": data.user_id,
-                "repo_name": data.repo_url.split("/")[-1].replace(".git", "")
-            }).execute()
-
-            if not existing.data and current_count >= 3:
+    # URL doğrulama: sadece GitHub, GitLab, Bitbucket desteklenir
+    try:
+        validate_repo_url(data.repo_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        if not hasattr(request.state, 'user_id'):
+            request.state.user_id = current_user_id
+
+        repo_name = data.repo_url.split("/")[-1].replace(".git", "")
+
+        # Kullanıcı başına maksimum 3 repo limiti: indekslenmiş repolar + kuyruktaki yeni repolar.
+        # Zaten indekslenmiş bir reponun yeniden indekslenmesi yeni yer kaplamaz.
+        indexed_res = resources.supabase.table("user_repos").select("repo_name").eq("user_id", data.user_id).execute()
+        indexed = {row["repo_name"] for row in indexed_res.data or []}
+
+        if repo_name not in indexed:
+            repos = indexed | index_queue.active_repo_names(data.user_id) | {repo_name}
+            if len(repos) > 3:
                 raise HTTPException(status_code=400, detail="Repo limiti (3) doldu. Yeni eklemek için önce eskilerden birini silmelisin.")
 
-            # Ağır işlem burada yapılıyor
-            result = await rag_service.index_repository(data.repo_url, data.user_id)
-            
-            
-            gc.collect()
-            
-            return result
-
-        except HTTPException as he:
-            raise he
-        except Exception as e:
-            print(f"Repo İndeksleme Hatası: {str(e)}")
-            detail = str(e) if settings.DEBUG else "Repo indekslenirken bir hata oluştu."
-            raise HTTPException(status_code=500, detail=detail)
+        job = index_queue.submit(data.user_id, data.repo_url, repo_name)
+        return {
+            "status": job.status,
+            "message": f"{repo_name} indeksleme kuyruğuna alındı.",
+            "job_id": job.id,
+            "repo_name": repo_name,
+        }
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        print(f"Repo İndeksleme Hatası: {str(e)}")
+        detail = str(e) if settings.DEBUG else "Repo indekslenirken bir hata oluştu."
+        raise HTTPException(status_code=500, detail=detail)
+
+
+def _get_owned_job(job_id: str, current_user_id: str) -> IndexJob:
+    job = index_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="İş bulunamadı.")
+    if job.user_id != current_user_id:
+        raise HTTPException(status_code=403, detail="Bu işi görmeye yetkiniz yok.")
+    return job
+
+
+@router.get("/jobs")
+async def list_index_jobs(user_id: str, current_user_id: str = Depends(get_current_user)):
+    """Kullanıcının indeksleme işlerini (en yeni önce) döner."""
+    if user_id != current_user_id:
+        raise HTTPException(status_code=403, detail="Bu listeyi görmeye yetkiniz yok.")
+    return [job.to_dict() for job in index_queue.list_for_user(user_id)]
+
+
+@router.get("/jobs/{job_id}")
+async def get_index_job(job_id: str, current_user_id: str = Depends(get_current_user)):
+    """İşin durumunu ve ilerlemesini (okunan dosya, embed/yüklenen parça) döner."""
+    return _get_owned_job(job_id, current_user_id).to_dict()
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_index_job(job_id: str, current_user_id: str = Depends(get_current_user)):
+    """Kuyruktaki veya çalışan indeksleme işini iptal eder."""
+    _get_owned_job(job_id, current_user_id)
+    return index_queue.cancel(job_id).to_dict()
 
 @router.get("/list")
 async def list_user_repos(user_id: str, current_user_id: str = Depends(get_current_user)):
@@ -85,7 +123,7 @@ async def list_user_repos(user_id: str, current_user_id: str = Depends(get_curre
         raise HTTPException(status_code=403, detail="Bu listeyi görmeye yetkiniz yok.")
     
     try:
-        response = rag_service.supabase.table("user_repos")\
+        response = resources.supabase.table("user_repos")\
             .select("*")\
             .eq("user_id", user_id)\
             .order("created_at", desc=True)\
@@ -105,19 +143,16 @@ async def delete_repo(request: DeleteRequest, current_user_id: str = Depends(get
 
     try:
         # Vektör deposundaki dokümanları sil
-        supabase.table("documents").delete().match({
-            "metadata->>collection_name": request.repo_name,
-            "metadata->>user_id": request.user_id
-        }).execute()
+        rag_service.vector_store.delete_collection(request.repo_name, request.user_id)
 
         # Sohbet geçmişini sil
-        supabase.table("chat_messages").delete().match({
+        resources.supabase.table("chat_messages").delete().match({
             "repo_name": request.repo_name,
             "user_id": request.user_id
         }).execute()
 
         # user_repos listesinden sil
-        supabase.table("user_repos").delete().match({
+        resources.supabase.table("user_repos").delete().match({
             "repo_name": request.repo_name,
             "user_id": request.user_id
         }).execute()
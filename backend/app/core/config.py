@@ -13,16 +13,121 @@ class Settings(BaseSettings):
     
     BASE_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     TEMP_REPO_DIR: str = ""
-    CHROMA_DB_DIR: str = ""
+    # Vektör deposu: "supabase" (pgvector, match_documents) veya "local" (NumPy + mmap)
+    VECTOR_BACKEND: str = "supabase"
+    LOCAL_VECTOR_DIR: str = ""
+    LOCAL_VECTOR_DTYPE: str = "float16"  # float16 yarı disk/bellek, float32 tam hassasiyet
     SUPABASE_URL: str
     SUPABASE_KEY: str
     SUPABASE_JWT_SECRET: str
     SUPABASE_SERVICE_ROLE_KEY: str
 
+    # Kimlik doğrulama: "local" = JWT imzası sunucuda doğrulanır, "remote" = Supabase Auth'a sorulur
+    AUTH_VERIFY_MODE: str = "local"
+    JWT_AUDIENCE: str = "authenticated"
+    JWT_LEEWAY_SECONDS: int = 10  # exp/nbf için saat kayması toleransı
+    AUTH_CACHE_SIZE: int = 10000  # Doğrulanmış token önbelleği (token hash'i → user_id)
+    AUTH_REMOTE_CACHE_TTL: int = 60  # Remote modda bir token'ın tekrar sorulmadan kullanılacağı süre
+
     LLM_MODEL: str = "gemini-flash-latest"
     EMBEDDING_MODEL: str = "models/gemini-embedding-001"
     GOOGLE_API_KEY: str
 
+    # Embedding önbelleği (yerel SQLite, boyut sınırlı LRU)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = ""
+    EMBEDDING_CACHE_MAX_MB: int = 512
+
+    # Paylaşılan HTTP bağlantı havuzu (Supabase istemcileri)
+    HTTP_POOL_SIZE: int = 20
+    HTTP2: bool = True
+    HTTP_KEEPALIVE_SECONDS: float = 60.0
+    HTTP_TIMEOUT_SECONDS: float = 120.0
+
+    # Hibrit arama: vektör + BM25 (yerel SQLite) sonuçları reciprocal rank fusion ile birleşir
+    LEXICAL_INDEX_ENABLED: bool = True
+    LEXICAL_INDEX_PATH: str = ""
+    RETRIEVAL_K: int = 8  # Prompt'a giren parça sayısı
+    HYBRID_CANDIDATES: int = 20  # Her aramadan alınan aday sayısı
+    RRF_K: int = 60
+    CONTEXT_MAX_TOKENS: int = 3500  # Prompt'a giren kod bağlamının token bütçesi
+
+    # /chat/ask önbellekleri (bellek içi, TTL saniye)
+    QUERY_EMBEDDING_CACHE_SIZE: int = 2048
+    QUERY_EMBEDDING_CACHE_TTL: int = 3600
+    RETRIEVAL_CACHE_SIZE: int = 1024
+    RETRIEVAL_CACHE_TTL: int = 600
+    # Benzer sorulara (kosinüs >= eşik) LLM çağırmadan önceki cevap; yeniden indekslemede silinir
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_THRESHOLD: float = 0.95
+    ANSWER_CACHE_SIZE: int = 1000
+    ANSWER_CACHE_TTL: int = 3600
+    # Repo indeks sürümleri (worker'lar arası önbellek geçersiz kılma); varsayılan data/ altında
+    CACHE_VERSIONS_PATH: str = ""
+
+    # Arka plan indeksleme kuyruğu
+    INDEX_WORKERS: int = 2  # Worker süreci başına aynı anda çalışabilecek indeksleme işi sayısı
+    INDEX_JOBS_PER_USER: int = 1  # Kullanıcı başına eşzamanlı iş limiti (tüm süreçlerde, adil sıra)
+    INDEX_JOB_HISTORY: int = 200  # Saklanan bitmiş iş sayısı
+    # İş kuyruğu deposu (worker'lar arası ortak SQLite dosyası); varsayılan data/ altında
+    INDEX_JOBS_PATH: str = ""
+
+    # Klonlama: sığ + blob filtreli (partial) + sparse checkout
+    CLONE_DEPTH: int = 1  # 0 = tam geçmiş
+    CLONE_FILTER: str = "blob:none"  # "" = filtresiz, "blob:limit=1m" vb. de kullanılabilir
+    CLONE_SPARSE: bool = True  # Sadece indekslenebilir uzantıları checkout et
+
+    # Parçalama: sözdizimi sınırlarında, token bütçeli (tiktoken)
+    CHUNK_MAX_TOKENS: int = 512
+    CHUNK_OVERLAP_TOKENS: int = 48  # Sadece bütçeyi aşıp bölünen birimlerde uygulanır
+    TOKENIZER_ENCODING: str = "cl100k_base"
+
+    # Akışlı indeksleme hattı
+    INGEST_BATCH_SIZE: int = 25  # add_documents başına parça sayısı (Gemini rate limit için küçük)
+    INGEST_QUEUE_SIZE: int = 8  # Aşamalar arası kuyrukta bekleyebilecek dosya sayısı
+    # Okuma, parçalama ve hash'leme süreç havuzunda yapılır (0: CPU sayısı, en fazla 8)
+    INDEX_CPU_WORKERS: int = 0
+    INDEX_FILE_BATCH_SIZE: int = 16  # Havuza tek seferde gönderilen dosya sayısı
+
+    # Dosya filtresi: .gitignore/.gitattributes, lock/vendored/minified/üretilmiş dosyalar atlanır
+    INDEX_FILE_FILTER_ENABLED: bool = True
+    INDEX_MAX_FILE_KB: int = 512  # Bundan büyük dosyalar indekslenmez (0: sınırsız)
+    INDEX_MAX_JSON_KB: int = 128  # .json için daha sıkı sınır (fixture/veri dosyaları)
+    INDEX_MAX_AVG_LINE_LENGTH: int = 200  # Ortalama satır uzunluğu bunu aşarsa minified sayılır
+    INDEX_MAX_ENTROPY: float = 5.6  # bit/karakter; base64/gömülü veri ~6, kaynak kod ~5
+
+    # Yakın kopya parçalar (MinHash + LSH): küme başına tek parça embed edilir,
+    # diğer dosyalar temsilcinin metadata.duplicate_sources listesine yazılır
+    DEDUP_ENABLED: bool = True
+    DEDUP_THRESHOLD: float = 0.9  # Tahmini Jaccard benzerliği (5 kelimelik shingle'lar)
+    DEDUP_NUM_PERM: int = 128  # İmza uzunluğu
+    DEDUP_BANDS: int = 16  # LSH bandı (NUM_PERM'e tam bölünmeli); aday eşiği ≈ (1/bant)^(bant/perm)
+    DEDUP_MIN_TOKENS: int = 30  # Daha kısa parçalar karşılaştırılmaz
+
+    # Embedding yükleme hızı: AIMD token bucket (birim: parça/saniye, tüm işler paylaşır)
+    EMBED_CONCURRENCY: int = 4  # Aynı anda uçuşta olabilecek batch sayısı
+    EMBED_RATE_PER_SEC: float = 5.0  # Başlangıç hızı
+    EMBED_RATE_MIN: float = 0.5
+    EMBED_RATE_MAX: float = 100.0
+    EMBED_RATE_INCREASE: float = 0.5  # Başarılı her batch sonrası eklenen hız
+
+    # /chat/history sayfa boyutu (varsayılan ve üst sınır)
+    CHAT_HISTORY_PAGE_SIZE: int = 50
+    CHAT_HISTORY_MAX_PAGE_SIZE: int = 200
+    # Sohbet mesajları write-behind tamponu (istekler arası toplu insert)
+    CHAT_SAVE_FLUSH_SECONDS: float = 1.0  # Bir mesajın yazılması en fazla bu kadar gecikir
+    CHAT_SAVE_BATCH_SIZE: int = 100  # Tek insert'teki en fazla satır; dolunca hemen yazılır
+    CHAT_SAVE_MAX_PENDING: int = 10000  # Veritabanı erişilemezken tamponda tutulacak en fazla mesaj
+
+    # Rate limit sayaçları: boşsa data/rate_limits.sqlite3 (tek makine, tüm worker'lar ortak);
+    # birden fazla makinede redis://host:6379 (pip install redis)
+    RATE_LIMIT_STORAGE_URI: str = ""
+    RATE_LIMIT_STRATEGY: str = "sliding-window-counter"  # veya fixed-window
+
+    # Gözlemlenebilirlik: /metrics (Prometheus) ve Server-Timing başlıkları
+    SERVER_TIMING_ENABLED: bool = True
+    METRICS_TOKEN: str = ""  # /metrics "Authorization: Bearer <token>" ister; boşsa /metrics kapalıdır (404)
+
     ALLOWED_ORIGINS: str = "http://localhost:5173"
     DEBUG: bool = False  # False iken hassas hata detayları kullanıcıya gösterilmez
 
@@ -33,17 +138,54 @@ class Settings(BaseSettings):
 
 settings = Settings()
 
+# İndekslenen dosya uzantıları ve taramada atlanan dizinler
+INDEXABLE_EXTENSIONS = (
+    '.py', '.js', '.ts', '.tsx', '.java', '.cpp', '.h', '.cs', '.php', '.html', '.css', '.md', '.json',
+)
+SKIPPED_DIRS = {'.git', '.github', '__pycache__'}
+
+# Dosya filtresinin varsayılanları (GitHub Linguist'e benzer); .gitattributes ile ezilebilir
+VENDORED_DIRS = {'node_modules', 'bower_components', 'jspm_packages', 'vendor', 'third_party', '.yarn'}
+LOCKFILE_NAMES = {
+    'package-lock.json', 'npm-shrinkwrap.json', 'packages.lock.json', 'composer.lock', 'yarn.lock',
+    'pnpm-lock.yaml', 'bun.lockb', 'deno.lock', 'pipfile.lock', 'poetry.lock', 'cargo.lock', 'gemfile.lock',
+}
+MINIFIED_SUFFIXES = ('.min.js', '.min.css', '-min.js', '-min.css')
+GENERATED_SUFFIXES = (
+    '_pb2.py', '_pb2_grpc.py', '.pb.h', '.g.cs', '.designer.cs', '.generated.cs', '.generated.ts', '.bundle.js',
+)
+
 # Depolama dizinleri: env'de tanımlı değilse varsayılan path kullanılır
 _base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if not settings.TEMP_REPO_DIR:
     settings.TEMP_REPO_DIR = os.path.normpath(os.path.join(_base, "../data/temp_repos"))
 else:
     settings.TEMP_REPO_DIR = os.path.abspath(settings.TEMP_REPO_DIR)
-if not settings.CHROMA_DB_DIR:
-    settings.CHROMA_DB_DIR = os.path.normpath(os.path.join(_base, "../data/chroma_db"))
+if not settings.LOCAL_VECTOR_DIR:
+    settings.LOCAL_VECTOR_DIR = os.path.normpath(os.path.join(_base, "../data/vectors"))
+else:
+    settings.LOCAL_VECTOR_DIR = os.path.abspath(settings.LOCAL_VECTOR_DIR)
+if not settings.EMBEDDING_CACHE_PATH:
+    settings.EMBEDDING_CACHE_PATH = os.path.normpath(os.path.join(_base, "../data/embedding_cache.sqlite3"))
+else:
+    settings.EMBEDDING_CACHE_PATH = os.path.abspath(settings.EMBEDDING_CACHE_PATH)
+if not settings.LEXICAL_INDEX_PATH:
+    settings.LEXICAL_INDEX_PATH = os.path.normpath(os.path.join(_base, "../data/lexical_index.sqlite3"))
+else:
+    settings.LEXICAL_INDEX_PATH = os.path.abspath(settings.LEXICAL_INDEX_PATH)
+if not settings.INDEX_JOBS_PATH:
+    settings.INDEX_JOBS_PATH = os.path.normpath(os.path.join(_base, "../data/index_jobs.sqlite3"))
+else:
+    settings.INDEX_JOBS_PATH = os.path.abspath(settings.INDEX_JOBS_PATH)
+if not settings.CACHE_VERSIONS_PATH:
+    settings.CACHE_VERSIONS_PATH = os.path.normpath(os.path.join(_base, "../data/cache_versions.sqlite3"))
 else:
-    settings.CHROMA_DB_DIR = os.path.abspath(settings.CHROMA_DB_DIR)
+    settings.CACHE_VERSIONS_PATH = os.path.abspath(settings.CACHE_VERSIONS_PATH)
+if not settings.RATE_LIMIT_STORAGE_URI:
+    settings.RATE_LIMIT_STORAGE_URI = "sqlite:///" + os.path.normpath(
+        os.path.join(_base, "../data/rate_limits.sqlite3")
+    ).replace(os.sep, "/").lstrip("/")
 
 # Gerekli dizinler yoksa oluşturulur
 os.makedirs(settings.TEMP_REPO_DIR, exist_ok=True)
-os.makedirs(settings.CHROMA_DB_DIR, exist_ok=True)
\ No newline at end of file
+os.makedirs(settings.LOCAL_VECTOR_DIR, exist_ok=True)
\ No newline at end of file
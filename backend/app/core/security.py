@@ -0,0 +1,101 @@
+"""
+Supabase JWT doğrulama. Yerel modda imza (HS256, SUPABASE_JWT_SECRET), exp/nbf ve
+audience ağ çağrısı yapılmadan kontrol edilir. Remote modda (veya yerel olarak
+doğrulanamayan asimetrik imzalı tokenlarda) Supabase Auth'a sorulur.
+Doğrulanmış tokenlar hash'leri ile, süreleri dolana kadar bellekte tutulur.
+"""
+import asyncio
+import hashlib
+import time
+from typing import Callable, Optional
+
+import jwt
+
+from app.core.cache import TTLCache
+
+# Supabase'in paylaşılan secret ile imzaladığı tokenlar
+LOCAL_ALGORITHMS = ("HS256",)
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class TokenVerifier:
+    def __init__(
+        self,
+        secret: str,
+        audience: str,
+        mode: str = "local",
+        leeway: float = 10,
+        cache_size: int = 10000,
+        remote_cache_ttl: float = 60,
+        remote_verify: Optional[Callable[[str], str]] = None,
+    ):
+        self.secret = secret
+        self.audience = audience
+        self.mode = mode
+        self.leeway = leeway
+        self.remote_cache_ttl = remote_cache_ttl
+        self.remote_verify = remote_verify
+        self.cache = TTLCache(cache_size, remote_cache_ttl)
+
+    @staticmethod
+    def cache_key(token: str) -> str:
+        # Token'ın kendisi bellekte anahtar olarak tutulmaz
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def _can_verify_locally(self, token: str) -> bool:
+        if self.mode != "local":
+            return False
+        try:
+            return jwt.get_unverified_header(token).get("alg") in LOCAL_ALGORITHMS
+        except jwt.InvalidTokenError as e:
+            raise InvalidToken(str(e))
+
+    def verify_local(self, token: str) -> tuple:
+        """(user_id, exp) döner; imza, exp/nbf veya audience geçersizse InvalidToken fırlatır."""
+        try:
+            claims = jwt.decode(
+                token,
+                self.secret,
+                algorithms=list(LOCAL_ALGORITHMS),
+                audience=self.audience,
+                leeway=self.leeway,
+                options={"require": ["exp", "sub"]},
+            )
+        except jwt.InvalidTokenError as e:
+            raise InvalidToken(str(e))
+        return claims["sub"], claims["exp"]
+
+    def _remote_ttl(self, token: str) -> float:
+        try:
+            exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+        except jwt.InvalidTokenError:
+            exp = None
+        ttl = self.remote_cache_ttl
+        if exp is not None:
+            ttl = min(ttl, exp - time.time())
+        return ttl
+
+    async def verify(self, token: str) -> str:
+        """Token'ı doğrular ve user_id döner."""
+        key = self.cache_key(token)
+        user_id = self.cache.get(key)
+        if user_id is not None:
+            return user_id
+
+        if self._can_verify_locally(token):
+            user_id, exp = self.verify_local(token)
+            ttl = exp - time.time()
+        else:
+            if self.remote_verify is None:
+                raise InvalidToken("Remote doğrulama yapılandırılmamış.")
+            user_id = await asyncio.to_thread(self.remote_verify, token)
+            if not user_id:
+                raise InvalidToken("Geçersiz kullanıcı tokenı.")
+            ttl = self._remote_ttl(token)
+
+        if ttl > 0:
+            self.cache.set(key, user_id, ttl=ttl)
+        return user_id
@@ -1,13 +1,29 @@
 """
 JWT tabanlı kimlik doğrulama. Authorization header'dan Bearer token alır,
-Supabase Auth ile doğrular ve user_id döner.
+yerelde (veya AUTH_VERIFY_MODE=remote ise Supabase Auth ile) doğrular ve user_id döner.
 """
 from fastapi import Depends, HTTPException, Header, status
-from supabase import create_client, Client
 
 from app.core.config import settings
+from app.core.security import TokenVerifier
+from app.services.metrics import stage_timer
+from app.services.resources import resources
 
-supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+
+def _remote_get_user(token: str):
+    user_response = resources.supabase_auth.auth.get_user(token)
+    return user_response.user.id if user_response.user else None
+
+
+token_verifier = TokenVerifier(
+    secret=settings.SUPABASE_JWT_SECRET,
+    audience=settings.JWT_AUDIENCE,
+    mode=settings.AUTH_VERIFY_MODE,
+    leeway=settings.JWT_LEEWAY_SECONDS,
+    cache_size=settings.AUTH_CACHE_SIZE,
+    remote_cache_ttl=settings.AUTH_REMOTE_CACHE_TTL,
+    remote_verify=_remote_get_user,
+)
 
 
 async def get_current_user(authorization: str = Header(None), request=None):
@@ -20,12 +36,9 @@ async def get_current_user(authorization: str = Header(None), request=None):
     token = authorization.split(" ")[1]
 
     try:
-        user_response = supabase.auth.get_user(token)
+        with stage_timer("auth"):
+            user_id = await token_verifier.verify(token)
 
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Geçersiz kullanıcı tokenı.")
-
-        user_id = user_response.user.id
         if request is not None:
             try:
                 request.state.user_id = user_id
@@ -38,4 +51,4 @@ async def get_current_user(authorization: str = Header(None), request=None):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Oturum geçersiz veya süresi dolmuş. Lütfen tekrar giriş yapın.",
-        )
\ No newline at end of file
+        )
@@ -2,13 +2,36 @@
 Rate limiting yapılandırması.
 Kullanıcı başına günlük istek limitleri endpoint'lerde tanımlanır.
 Genel API limiti: dakikada 60 istek, saatte 500 istek.
+Sayaçlar tüm worker'ların paylaştığı depoda tutulur (RATE_LIMIT_STORAGE_URI):
+varsayılan yerel SQLite dosyası, birden fazla makinede redis://.
+Strateji sliding window counter'dır; pencere sınırındaki ani artışlar limiti ikiye katlamaz.
 """
+from limits import parse
 from slowapi import Limiter
+from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
+from slowapi.wrappers import Limit
+
+from app.core.config import settings
+# sqlite:// şemasını limits'e kaydeder
+from app.services import rate_limit_storage  # noqa: F401
 
 limiter = Limiter(
     key_func=get_remote_address,
     default_limits=["60/minute", "500/hour"],  # Genel API limiti
-    storage_uri="memory://",
-    strategy="fixed-window"
+    storage_uri=settings.RATE_LIMIT_STORAGE_URI,
+    strategy=settings.RATE_LIMIT_STRATEGY,
 )
+
+
+def charge(limit_value: str, scope: str, key: str):
+    """
+    Dekoratör yerine elle sayılan limit: hak ancak istek gerçekten pahalı işe dönüşünce
+    (ör. /chat/ask'te cevap önbellekte yoksa) düşer. Limit aşılmışsa RateLimitExceeded
+    fırlatılır; yanıt dekoratörle aşılan limitlerle aynıdır.
+    """
+    if not limiter.enabled:
+        return
+    item = parse(limit_value)
+    if not limiter.limiter.hit(item, scope, key):
+        raise RateLimitExceeded(Limit(item, lambda: key, scope, False, None, None, None, 1, True))
@@ -3,17 +3,26 @@ FastAPI ana uygulama giriş noktası.
 CORS, rate limiting ve API route'ları burada yapılandırılır.
 """
 import asyncio
+import hmac
 import logging
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from slowapi.errors import RateLimitExceeded
 import os
 
 
 from app.core.config import settings
 from app.api.api import api_router
+from app.api.endpoints.repo import index_queue
 from app.limiter import limiter
+from app.services.message_buffer import message_buffer
+from app.services.llm_service import embeddings
+from app.services.metrics import HTTP_SECONDS, collect_timings, registry
+from app.services.resources import resources
+from app.services.retrieval_cache import retrieval_cache
 
 # Logging yapılandırması
 logging.basicConfig(
@@ -22,8 +31,24 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Supabase istemcileri, bağlantı havuzu ve sohbet zinciri bir kez oluşturulur
+    resources.startup()
+    # Önceki çalışmadan kuyrukta kalan (veya yarıda kalan) işler devralınır
+    index_queue.start()
+    yield
+    # Kapanışta çalışan işler durdurulup kuyruğa geri alınır, worker'lar beklenir
+    await asyncio.to_thread(index_queue.shutdown)
+    # Tamponda kalan sohbet mesajları Supabase istemcisi kapanmadan yazılır
+    await asyncio.to_thread(message_buffer.shutdown)
+    await resources.ashutdown()
+
+
 IS_DEBUG = os.getenv("DEBUG", "false").lower() == "true"
 app = FastAPI(title=settings.PROJECT_NAME, version=settings.VERSION,
+    lifespan=lifespan,
     docs_url="/docs" if IS_DEBUG else None,
     redoc_url="/redoc" if IS_DEBUG else None,
     openapi_url="/openapi.json" if IS_DEBUG else None)
@@ -76,12 +101,48 @@ async def log_requests(request: Request, call_next):
     logger.info(f"⬅️ {request.method} {request.url.path} - Status: {response.status_code}")
     return response
 
+def _route_label(request: Request) -> str:
+    """Eşleşen route'un şablonu (/api/v1/repo/jobs/{job_id}); eşleşmeyen yollar tek etiket."""
+    route = request.scope.get("route")
+    template = getattr(route, "path", None)
+    if not template:
+        return "unmatched"
+    # include_router ile eklenen route'larda şablon üst router'ların önekini taşımaz;
+    # önek, şablonun eşleştiği yol sonekinin önündeki sabit kısımdır
+    path = request.scope.get("path", "")
+    regex = getattr(route, "path_regex", None)
+    if regex is not None and not regex.match(path):
+        for i, char in enumerate(path):
+            if char == "/" and regex.match(path[i:]):
+                return path[:i] + template
+    return template
+
+# İstek süresi histogramı ve Server-Timing (auth, answer_cache... ; app = başlıklara kadar toplam)
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    started = time.perf_counter()
+    with collect_timings() as timings:
+        response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    HTTP_SECONDS.observe(
+        elapsed, method=request.method, route=_route_label(request), status=str(response.status_code)
+    )
+    if settings.SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = timings.header(total=elapsed)
+        origin = request.headers.get("origin")
+        if origin in origins:
+            # Tarayıcı, farklı origin'deki yanıtın sürelerini ancak bu başlıkla gösterir
+            response.headers["Timing-Allow-Origin"] = origin
+    return response
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Frontend'in okuyabilmesi için (sohbet geçmişi sayfalama ve önbellek doğrulama)
+    expose_headers=["ETag", "X-Next-Cursor", "Server-Timing"],
 )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
@@ -92,4 +153,47 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "model": settings.LLM_MODEL}
\ No newline at end of file
+    # Kimlik doğrulamasız ve ucuz: diske/önbelleklere dokunmaz (istatistikler /metrics'te)
+    return {"status": "healthy", "model": settings.LLM_MODEL}
+
+
+def _stat(read, *path):
+    """İç içe stats() sözlüğünden tek değeri okuyan gauge fonksiyonu."""
+    def value():
+        stats = read()
+        for key in path:
+            stats = stats[key]
+        return stats
+    return value
+
+
+registry.gauge(
+    "repo_analyst_message_buffer_pending", "Yazılmayı bekleyen sohbet mesajları.", message_buffer.pending_count
+)
+for _key in ("written", "dropped", "dead_lettered"):
+    registry.gauge(
+        f"repo_analyst_message_buffer_{_key}", f"Sohbet mesajı tamponu: {_key}.", _stat(message_buffer.stats, _key)
+    )
+if hasattr(embeddings, "stats"):
+    for _key in ("entries", "bytes", "hits", "misses"):
+        registry.gauge(
+            f"repo_analyst_embedding_cache_{_key}", f"Embedding önbelleği: {_key}.", _stat(embeddings.stats, _key)
+        )
+for _cache in ("query_embeddings", "results", "answers"):
+    for _key in ("size", "hits", "misses"):
+        registry.gauge(
+            f"repo_analyst_{_cache}_cache_{_key}",
+            f"/chat/ask önbelleği ({_cache}): {_key}.",
+            _stat(retrieval_cache.stats, _cache, _key),
+        )
+
+@app.get("/metrics")
+@limiter.exempt
+async def metrics(request: Request):
+    """Prometheus metin formatında metrikler (worker başına). METRICS_TOKEN boşsa kapalıdır."""
+    if not settings.METRICS_TOKEN:
+        return JSONResponse(status_code=404, content={"detail": "Not Found"})
+    token = request.headers.get("authorization", "").removeprefix("Bearer ")
+    if not hmac.compare_digest(token.encode("utf-8"), settings.METRICS_TOKEN.encode("utf-8")):
+        return JSONResponse(status_code=401, content={"detail": "Yetkisiz erişim."})
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+Anlamsal cevap önbelleği: aynı repoda (collection_name + user_id) daha önce cevaplanmış,
+embedding'i yeterince benzer (kosinüs >= threshold) bir soru gelirse üretilmiş cevap
+LLM çağrılmadan, stream edildiği parçalarla tekrar oynatılır.
+Kayıtlar TTL ve toplam boyutla (LRU) sınırlıdır. Repo yeniden indekslenince ortak sürüm
+(RepoVersions) artar: diğer worker'lardaki eski sürümlü kayıtlar bir sonraki okumada silinir,
+eski indeksle üretilip indeksleme sonrası biten cevap saklanmaz.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.cache_versions import RepoVersions
+
+
+@dataclass
+class _Entry:
+    embedding: np.ndarray
+    chunks: List[str]
+    expires_at: float
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        maxsize: int = 1000,
+        ttl: float = 3600,
+        versions: Optional[RepoVersions] = None,
+    ):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        # Repo → (sıra numarası → kayıt); iki seviye de en eski kullanılandan en yeniye sıralı
+        self._repos: "OrderedDict[Tuple[str, str], OrderedDict[int, _Entry]]" = OrderedDict()
+        self.versions = versions or RepoVersions()
+        # Repo → kayıtlarının üretildiği indeks sürümü
+        self._entry_versions: Dict[Tuple[str, str], int] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def version(self, collection_name: str, user_id: str) -> int:
+        """Repo indeks sürümü; her geçersiz kılmada (hangi worker'da olursa olsun) artar."""
+        return self.versions.get(collection_name, user_id)
+
+    def _drop_stale(self, key: Tuple[str, str], version: int):
+        # _lock tutulurken çağrılır; başka worker'da geçersiz kılınmış reponun kayıtları silinir
+        if self._entry_versions.get(key, version) != version:
+            entries = self._repos.pop(key, None) or {}
+            self._size -= len(entries)
+        self._entry_versions[key] = version
+
+    def get(self, collection_name: str, user_id: str, embedding: List[float]) -> Optional[List[str]]:
+        """En benzer kaydın cevap parçalarını döner; eşik altındaysa None."""
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        version = self.version(collection_name, user_id)
+        with self._lock:
+            self._drop_stale((collection_name, user_id), version)
+            entries = self._repos.get((collection_name, user_id))
+            if entries:
+                for entry_id in [i for i, e in entries.items() if e.expires_at < now]:
+                    del entries[entry_id]
+                    self._size -= 1
+            if not entries:
+                self.misses += 1
+                return None
+            ids = list(entries)
+            matrix = np.stack([entries[i].embedding for i in ids])
+            scores = matrix @ query if matrix.shape[1] == query.shape[0] else np.zeros(len(ids))
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            entries.move_to_end(ids[best])
+            self._repos.move_to_end((collection_name, user_id))
+            self.hits += 1
+            return list(entries[ids[best]].chunks)
+
+    def put(
+        self,
+        collection_name: str,
+        user_id: str,
+        embedding: List[float],
+        chunks: List[str],
+        version: Optional[int] = None,
+    ) -> bool:
+        """version verilirse ve o sırada repo yeniden indekslendiyse cevap saklanmaz."""
+        entry = _Entry(self._normalize(embedding), list(chunks), time.monotonic() + self.ttl)
+        current = self.version(collection_name, user_id)
+        if version is not None and version != current:
+            return False
+        with self._lock:
+            self._drop_stale((collection_name, user_id), current)
+            entries = self._repos.setdefault((collection_name, user_id), OrderedDict())
+            self._repos.move_to_end((collection_name, user_id))
+            entries[self._next_id] = entry
+            self._next_id += 1
+            self._size += 1
+            while self._size > self.maxsize:
+                # En uzun süredir kullanılmayan reponun en eski kaydı
+                repo_key, oldest = next(iter(self._repos.items()))
+                oldest.popitem(last=False)
+                self._size -= 1
+                if not oldest:
+                    del self._repos[repo_key]
+                    self._entry_versions.pop(repo_key, None)
+            return True
+
+    def invalidate(self, collection_name: str, user_id: str) -> int:
+        version = self.versions.bump(collection_name, user_id)
+        with self._lock:
+            key = (collection_name, user_id)
+            self._entry_versions[key] = version
+            entries = self._repos.pop(key, None) or {}
+            self._size -= len(entries)
+            return len(entries)
+
+    def clear(self):
+        with self._lock:
+            self._repos.clear()
+            self._entry_versions.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": self._size, "hits": self.hits, "misses": self.misses}
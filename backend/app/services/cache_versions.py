@@ -0,0 +1,58 @@
+"""
+Repo indeks sürümleri: yeniden indeksleme veya silme reponun sürümünü artırır; arama sonucu
+ve cevap önbellekleri kayıtlarını bu sürümle eşleştirir. Sürümler aynı makinedeki tüm
+worker'ların paylaştığı SQLite dosyasında tutulur, böylece indeksleme işini çalıştıran
+worker'ın geçersiz kılması diğer worker'larda da bir sonraki okumada geçerli olur.
+"""
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+
+class RepoVersions:
+    """path=":memory:" süreç içi (testler, tek worker) kullanım içindir."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # fork sonrası (gunicorn --preload) ebeveynin bağlantısı kullanılmaz
+        if self._conn is None or self._pid != os.getpid():
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+            conn.execute("pragma journal_mode=wal")
+            conn.execute(
+                "create table if not exists repo_versions ("
+                " collection_name text not null, user_id text not null, version integer not null,"
+                " primary key (collection_name, user_id))"
+            )
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, collection_name: str, user_id: str) -> int:
+        with self._lock:
+            row = self._connection().execute(
+                "select version from repo_versions where collection_name = ? and user_id = ?",
+                (collection_name, user_id),
+            ).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, collection_name: str, user_id: str) -> int:
+        """Sürümü atomik olarak artırır ve yeni değeri döner."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "insert into repo_versions (collection_name, user_id, version) values (?, ?, 1)"
+                " on conflict (collection_name, user_id) do update set version = version + 1",
+                (collection_name, user_id),
+            )
+            row = conn.execute(
+                "select version from repo_versions where collection_name = ? and user_id = ?",
+                (collection_name, user_id),
+            ).fetchone()
+        return row[0]
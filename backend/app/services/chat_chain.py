@@ -0,0 +1,115 @@
+"""
+RAG sohbet zinciri: prompt şablonu, bağlam formatlama ve zincirin kurulumu.
+Zincir bir kez kurulur; collection_name/user_id filtresi her çağrıda girdiden okunur.
+"""
+from operator import itemgetter
+from typing import Any, Dict, List
+
+from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from app.core.config import settings
+from app.services.context_packer import pack_context
+from app.services.metrics import stage_timer
+
+# Gelişmiş prompt şablonu - Görsel zenginlik ve yapılandırılmış çıktı
+PROMPT_TEMPLATE = """## 🎯 Rol
+Sen "AI Repo Analyst" uygulamasının yapay zeka asistanısın. Deneyimli bir Yazılım Mimarı ve Teknik Lider olarak, GitHub repolarını analiz edip kullanıcılara yardımcı oluyorsun.
+
+---
+
+## 📁 Kod Bağlamı
+Aşağıda kullanıcının reposundan alınan ilgili kod parçaları var:
+
+{context}
+
+---
+
+## ❓ Kullanıcı Sorusu
+{question}
+
+---
+
+## 📝 Yanıt Kuralları
+
+### İçerik Kuralları:
+1. **Doğrudan Cevap Ver:** Sorulan şeye net cevap ver, tüm projeyi özetleme
+2. **Teknik Derinlik:** Kod parçalarından aldığın bilgilerle destekle
+3. **Bilinmeyen Durum:** Bağlamda yoksa "Bu bilgiye kodlarda rastlamadım" de, uydurma
+4. **Kesin Yargılar:** "Bu proje Django framework'ü kullanıyor" gibi net ifadeler kullan
+5. **Kanıt Sunma:** "Kodda @login_required gördüğüm için..." gibi dedektif cümleleri kurma
+
+### Format Kuralları:
+1. **Özet ile Başla:** İlk 1-2 cümlede kısa özet ver
+2. **Yapılandırılmış Yanıt:** Başlıklar (##, ###) ve maddeler kullan
+3. **Kod Örnekleri:** Kod bloklarını dil belirterek yaz (```python, ```javascript vb.)
+4. **Dosya Referansları:** 📁 `dosya_adi.py` şeklinde belirt
+
+
+### Emoji Kullanımı:
+- 💡 Öneri ve ipuçları için
+- ⚠️ Uyarı ve dikkat edilmesi gerekenler için
+- ✅ Doğru/iyi pratikler için
+- ❌ Yanlış/kaçınılması gerekenler için
+- 🔍 Detaylı inceleme gerektiren noktalar için
+- 📁 Dosya referansları için
+- 🚀 Performans ve optimizasyon için
+- 🔒 Güvenlik ile ilgili konular için
+
+### Ek Öneriler (Uygunsa):
+- Best practice tavsiyeleri ver
+- Potansiyel iyileştirme alanlarını belirt
+- Güvenlik veya performans uyarıları ekle
+
+---
+
+## 🌐 Dil
+Türkçe yanıt ver. Teknik terimleri (API, endpoint, middleware, framework vb.) İngilizce bırakabilirsin.
+
+Şimdi yukarıdaki kurallara uygun şekilde kullanıcının sorusunu yanıtla:
+"""
+
+def format_docs(docs: List[Document]) -> str:
+    """Dokümanları dosya bazında, tekrarsız ve token bütçesi içinde formatla"""
+    return pack_context(docs, settings.CONTEXT_MAX_TOKENS)
+
+
+def build_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+
+
+def build_chat_chain(vector_store, prompt: ChatPromptTemplate, llm) -> Runnable:
+    """
+    Girdi: {"question", "collection_name", "user_id"}. Çıktı: metin parçaları (stream).
+    Kod parçaları user_id ve collection_name ile filtrelenerek hibrit aramayla
+    (vektör + BM25, RRF) getirilir.
+    """
+
+    def search_kwargs(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "k": settings.RETRIEVAL_K,
+            "filter": {
+                "collection_name": inputs["collection_name"],
+                "user_id": inputs["user_id"],
+            },
+        }
+
+    def retrieve(inputs: Dict[str, Any]) -> List[Document]:
+        with stage_timer("retrieval"):
+            return vector_store.hybrid_search(inputs["question"], **search_kwargs(inputs))
+
+    async def aretrieve(inputs: Dict[str, Any]) -> List[Document]:
+        with stage_timer("retrieval"):
+            return await vector_store.ahybrid_search(inputs["question"], **search_kwargs(inputs))
+
+    return (
+        {
+            "context": RunnableLambda(retrieve, afunc=aretrieve) | format_docs,
+            "question": itemgetter("question"),
+        }
+        | prompt
+        | llm
+        | StrOutputParser()
+    )
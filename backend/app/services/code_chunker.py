@@ -0,0 +1,324 @@
+"""
+Sözdizimi farkındalıklı, token bütçeli kod parçalayıcı.
+Birim sınırları Python için ast ile, süslü parantezli diller (JS/TS/Java/C ailesi, CSS, PHP)
+ve JSON için parantez derinliğiyle, Markdown için başlıklarla bulunur. Ardışık birimler
+token bütçesine kadar birleştirilir; bütçeyi aşan birim önce alt birimlerine, en son satır
+pencerelerine bölünür. Örtüşme (overlap) sadece bölünen birimin pencereleri arasında olur.
+"""
+import ast
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+BRACE_EXTENSIONS = {".js", ".ts", ".tsx", ".java", ".cpp", ".h", ".cs", ".php", ".css", ".json"}
+MARKDOWN_EXTENSIONS = {".md"}
+PYTHON_EXTENSIONS = {".py"}
+
+# Bir sonraki satırın yeni birim başlatabileceği satır sonları (parantez dilleri);
+# boş satırdan sonra da yeni birim başlar
+_STATEMENT_ENDINGS = ("}", ";", ",", "]", "{", "[")
+_OPENERS = "{[("
+_CLOSERS = "}])"
+
+
+def approx_token_count(text: str) -> int:
+    """tiktoken yüklenemediğinde kullanılan kaba tahmin (~4 karakter/token)."""
+    return (len(text) + 3) // 4
+
+
+@lru_cache(maxsize=None)
+def token_counter(encoding_name: str) -> Callable[[str], int]:
+    """tiktoken sayacını döner; kodlama dosyası indirilemezse yaklaşık sayaca düşer."""
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        print(f"⚠️ tiktoken kodlaması yüklenemedi ({e}); yaklaşık token sayımı kullanılıyor.")
+        return approx_token_count
+    return lambda text: len(encoding.encode_ordinary(text))
+
+
+@dataclass
+class _Piece:
+    start: int  # 0 tabanlı, dahil
+    end: int  # hariç
+    tokens: int
+    text: Optional[str] = None  # Satırdan uzun tek satır bölündüyse parça metni
+
+
+class _Source:
+    """Bir dosyanın satırları, satır token sayıları ve dile göre birim sınırları."""
+
+    def __init__(self, text: str, ext: str, count_tokens: Callable[[str], int]):
+        self.lines = text.splitlines(keepends=True)
+        self.ext = ext
+        self.prefix = [0]
+        for line in self.lines:
+            self.prefix.append(self.prefix[-1] + count_tokens(line))
+        self.depths: List[int] = []
+        self.python_nodes: Dict[Tuple[int, int], ast.AST] = {}
+        self.python_tree: Optional[ast.Module] = None
+
+        if ext in PYTHON_EXTENSIONS:
+            try:
+                self.python_tree = ast.parse(text)
+            except (SyntaxError, ValueError):
+                self.python_tree = None
+        elif ext in BRACE_EXTENSIONS:
+            self.depths = _brace_depths(self.lines)
+
+    def tokens(self, start: int, end: int) -> int:
+        return self.prefix[end] - self.prefix[start]
+
+    def is_blank(self, i: int) -> bool:
+        return not self.lines[i].strip()
+
+    def top_units(self) -> List[Tuple[int, int]]:
+        n = len(self.lines)
+        if self.python_tree is not None:
+            return self._python_spans(self.python_tree.body, 0, n)
+        if self.depths:
+            return self._brace_spans(0, n, 0)
+        if self.ext in MARKDOWN_EXTENSIONS:
+            return self._markdown_spans(0, n)
+        return self._paragraph_spans(0, n)
+
+    def children(self, start: int, end: int) -> List[Tuple[int, int]]:
+        """Bütçeyi aşan bir birimin alt birimleri (yoksa boş liste)."""
+        if self.python_tree is not None:
+            node = self.python_nodes.get((start, end))
+            body = _python_child_statements(node) if node is not None else []
+            return self._python_spans(body, start, end) if body else []
+        if self.depths:
+            return self._brace_spans(start, end, self.depths[start] + 1)
+        if self.ext in MARKDOWN_EXTENSIONS:
+            return self._paragraph_spans(start, end)
+        return []
+
+    @staticmethod
+    def _spans(boundaries: List[int], start: int, end: int) -> List[Tuple[int, int]]:
+        points = sorted({start, *(b for b in boundaries if start < b < end)})
+        return list(zip(points, points[1:] + [end]))
+
+    def _python_spans(self, nodes: List[ast.stmt], start: int, end: int) -> List[Tuple[int, int]]:
+        firsts = []
+        for node in nodes:
+            first = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])]) - 1
+            # Hemen üstündeki yorum satırları birime dahil edilir
+            while first - 1 > start and self.lines[first - 1].lstrip().startswith("#"):
+                first -= 1
+            firsts.append((max(first, start), node))
+        spans = self._spans([f for f, _ in firsts], start, end)
+        by_start = {f: node for f, node in firsts}
+        for span in spans:
+            if span[0] in by_start:
+                self.python_nodes[span] = by_start[span[0]]
+        return spans
+
+    def _brace_spans(self, start: int, end: int, depth: int) -> List[Tuple[int, int]]:
+        boundaries = []
+        for i in range(start + 1, end):
+            if self.depths[i] != depth or self.is_blank(i):
+                continue
+            previous = self.lines[i - 1].strip()
+            if not previous or previous.endswith(_STATEMENT_ENDINGS):
+                boundaries.append(i)
+        return self._spans(boundaries, start, end)
+
+    def _markdown_spans(self, start: int, end: int) -> List[Tuple[int, int]]:
+        boundaries = []
+        in_fence = False
+        for i in range(start, end):
+            stripped = self.lines[i].lstrip()
+            if stripped.startswith("```"):
+                in_fence = not in_fence
+            elif not in_fence and stripped.startswith("#"):
+                boundaries.append(i)
+        return self._spans(boundaries, start, end)
+
+    def _paragraph_spans(self, start: int, end: int) -> List[Tuple[int, int]]:
+        boundaries = [
+            i for i in range(start + 1, end)
+            if self.is_blank(i - 1) and not self.is_blank(i)
+        ]
+        return self._spans(boundaries, start, end)
+
+
+def _python_child_statements(node: ast.AST) -> List[ast.stmt]:
+    children = []
+    for field in ("body", "orelse", "finalbody"):
+        children.extend(getattr(node, field, None) or [])
+    for handler in getattr(node, "handlers", None) or []:
+        children.extend(handler.body)
+    for case in getattr(node, "cases", None) or []:
+        children.extend(case.body)
+    return sorted((c for c in children if isinstance(c, ast.stmt)), key=lambda c: c.lineno)
+
+
+def _brace_depths(lines: List[str]) -> List[int]:
+    """Her satırın başındaki parantez derinliği; string ve yorumlar yok sayılır."""
+    depths = []
+    depth = 0
+    in_block_comment = False
+    in_template = False  # JS template literal satırlar arası sürebilir
+    for line in lines:
+        depths.append(depth)
+        quote = None
+        i = 0
+        while i < len(line):
+            ch = line[i]
+            pair = line[i:i + 2]
+            if in_block_comment:
+                if pair == "*/":
+                    in_block_comment = False
+                    i += 1
+            elif in_template:
+                if ch == "\\":
+                    i += 1
+                elif ch == "`":
+                    in_template = False
+            elif quote:
+                if ch == "\\":
+                    i += 1
+                elif ch == quote:
+                    quote = None
+            elif pair == "/*":
+                in_block_comment = True
+                i += 1
+            elif pair == "//":
+                break
+            elif ch == "`":
+                in_template = True
+            elif ch in "'\"":
+                quote = ch
+            elif ch in _OPENERS:
+                depth += 1
+            elif ch in _CLOSERS:
+                depth = max(0, depth - 1)
+            i += 1
+    return depths
+
+
+class CodeChunker:
+    """
+    RecursiveCharacterTextSplitter yerine kullanılır (split_documents arayüzü aynıdır).
+    Her parçaya kaynak dosyadaki satır aralığı (start_line, end_line; 1 tabanlı) ve
+    token sayısı (tokens) eklenir; bağlam paketleyici bütçeyi bunlarla hesaplar.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 512,
+        overlap_tokens: int = 48,
+        encoding_name: str = "cl100k_base",
+        count_tokens: Optional[Callable[[str], int]] = None,
+    ):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 2)
+        self.encoding_name = encoding_name
+        self._count_tokens = count_tokens
+        self._lazy_counter = count_tokens is None
+
+    @property
+    def count_tokens(self) -> Callable[[str], int]:
+        # Kodlama ilk parçalamada yüklenir; import sırasında ağa çıkılmaz
+        if self._count_tokens is None:
+            self._count_tokens = token_counter(self.encoding_name)
+        return self._count_tokens
+
+    def __getstate__(self):
+        # Süreç havuzuna gönderilirken tiktoken sayacı taşınmaz; worker kendisininkini yükler
+        state = self.__dict__.copy()
+        if self._lazy_counter:
+            state["_count_tokens"] = None
+        return state
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        chunks = []
+        for doc in documents:
+            chunks.extend(self.split_document(doc))
+        return chunks
+
+    def split_document(self, doc: Document) -> List[Document]:
+        name = doc.metadata.get("file_name") or doc.metadata.get("source") or ""
+        src = _Source(doc.page_content, os.path.splitext(name)[1].lower(), self.count_tokens)
+        if not src.lines:
+            return []
+
+        chunks = []
+        for piece in self._pack(src.top_units(), src):
+            content = piece.text if piece.text is not None else "".join(src.lines[piece.start:piece.end])
+            if not content.strip():
+                continue
+            metadata = {
+                **doc.metadata,
+                "start_line": piece.start + 1,
+                "end_line": piece.end,
+                "tokens": piece.tokens,
+            }
+            chunks.append(Document(page_content=content, metadata=metadata))
+        return chunks
+
+    def _pack(self, spans: List[Tuple[int, int]], src: _Source) -> List[_Piece]:
+        """Birimleri sığdırır ve ardışık olanları bütçe dolana kadar birleştirir."""
+        merged: List[_Piece] = []
+        for start, end in spans:
+            for piece in self._fit(start, end, src):
+                last = merged[-1] if merged else None
+                if (
+                    last is not None
+                    and last.text is None
+                    and piece.text is None
+                    and last.end == piece.start  # örtüşen pencereler birleştirilmez
+                    and last.tokens + piece.tokens <= self.max_tokens
+                ):
+                    last.end = piece.end
+                    last.tokens += piece.tokens
+                else:
+                    merged.append(piece)
+        return merged
+
+    def _fit(self, start: int, end: int, src: _Source) -> List[_Piece]:
+        tokens = src.tokens(start, end)
+        if tokens <= self.max_tokens:
+            return [_Piece(start, end, tokens)]
+        children = src.children(start, end)
+        if len(children) > 1:
+            return self._pack(children, src)
+        return self._windows(start, end, src)
+
+    def _windows(self, start: int, end: int, src: _Source) -> List[_Piece]:
+        """Bölünemeyen birimi satır pencerelerine ayırır; pencereler overlap_tokens kadar örtüşür."""
+        pieces: List[_Piece] = []
+        i = start
+        while i < end:
+            if src.tokens(i, i + 1) > self.max_tokens:
+                pieces.extend(self._split_line(i, src))
+                i += 1
+                continue
+            j = i + 1
+            while j < end and src.tokens(i, j + 1) <= self.max_tokens:
+                j += 1
+            pieces.append(_Piece(i, j, src.tokens(i, j)))
+            if j >= end:
+                break
+            # Sonraki pencere, son satırların overlap_tokens'a sığan kısmıyla başlar
+            k = j
+            while k - 1 > i and src.tokens(k - 1, j) <= self.overlap_tokens:
+                k -= 1
+            i = k
+        return pieces
+
+    def _split_line(self, i: int, src: _Source) -> List[_Piece]:
+        """Bütçeden uzun tek satır (ör. minify edilmiş dosya) karakter oranıyla bölünür."""
+        line = src.lines[i]
+        tokens = src.tokens(i, i + 1)
+        size = max(1, len(line) * self.max_tokens // tokens)
+        return [
+            _Piece(i, i + 1, self.count_tokens(line[p:p + size]), text=line[p:p + size])
+            for p in range(0, len(line), size)
+        ]
@@ -0,0 +1,175 @@
+"""
+Bağlam paketleyici: getirilen parçalar prompt'a girmeden önce sıkıştırılır.
+Tekrarlanan ve örtüşen metin bir kez yazılır, aynı dosyanın komşu parçaları tek
+blokta birleşir, dosyalar ilgi sırasına göre gruplanır ve toplam token bütçesi aşılmaz.
+Bütçe indeksleme sırasında saklanan parça token sayılarıyla (metadata.tokens) hesaplanır;
+dosya başlığı ve kod bloğu işaretleri de dosya ilk eklendiğinde bütçeden düşülür.
+Yakın kopya kümesinin temsilcisiyse (metadata.duplicate_sources) diğer dosyalar da belirtilir.
+"""
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.services.code_chunker import approx_token_count
+
+# Satır bilgisi olmayan (eski indeks) parçalarda örtüşme sayılacak en kısa/uzun ek
+_MIN_TEXT_OVERLAP = 20
+_MAX_TEXT_OVERLAP = 1000
+
+_FENCE_LANGUAGES = {
+    ".py": "python", ".js": "javascript", ".ts": "typescript", ".tsx": "tsx", ".java": "java",
+    ".cpp": "cpp", ".h": "cpp", ".cs": "csharp", ".php": "php", ".html": "html", ".css": "css",
+    ".md": "markdown", ".json": "json",
+}
+
+
+def _source(doc: Document) -> str:
+    return doc.metadata.get("file_path") or doc.metadata.get("source") or "Bilinmeyen dosya"
+
+
+def _tokens(doc: Document) -> int:
+    tokens = doc.metadata.get("tokens")
+    return tokens if isinstance(tokens, int) else approx_token_count(doc.page_content)
+
+
+def _line_span(doc: Document) -> Optional[Tuple[int, List[str]]]:
+    """
+    (ilk satır, satırlar) döner; metadata satır aralığıyla içerik uyuşmuyorsa None.
+    Tek satırlık parçalar da None: uzun bir satırın bölünmüş parçaları aynı satır numarasını
+    taşır, satır bazında birleştirilirse ilkinden sonrakiler kaybolur.
+    """
+    start, end = doc.metadata.get("start_line"), doc.metadata.get("end_line")
+    if not isinstance(start, int) or not isinstance(end, int) or start == end:
+        return None
+    lines = doc.page_content.splitlines()
+    if len(lines) != end - start + 1:
+        return None
+    return start, lines
+
+
+def _file_header(source: str) -> str:
+    return f"📁 **Dosya:** `{source}`"
+
+
+def _fence_language(source: str) -> str:
+    return _FENCE_LANGUAGES.get(os.path.splitext(source)[1].lower(), "")
+
+
+def _file_overhead(source: str) -> int:
+    """Dosya başlığı, ayraç ve bir kod bloğu (satır etiketiyle) işaretlerinin token maliyeti."""
+    return approx_token_count(
+        f"\n\n---\n\n{_file_header(source)}\nSatır 1-1:\n```{_fence_language(source)}\n\n```"
+    )
+
+
+def _text_overlap(left: str, right: str) -> int:
+    """left'in sonu ile right'ın başı arasındaki en uzun ortak kısım (karakter)."""
+    for size in range(min(len(left), len(right), _MAX_TEXT_OVERLAP), _MIN_TEXT_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class _FileContext:
+    def __init__(self):
+        self.lines: Dict[int, str] = {}
+        self.texts: List[str] = []
+        self.duplicate_sources: List[str] = []
+
+    def new_line_count(self, start: int, lines: List[str]) -> int:
+        return sum(1 for n in range(start, start + len(lines)) if n not in self.lines)
+
+    def add_lines(self, start: int, lines: List[str]):
+        for offset, line in enumerate(lines):
+            self.lines.setdefault(start + offset, line)
+
+    def merge_text(self, text: str) -> str:
+        """Metni örtüştüğü bloğa ekler; eklenen (yeni) kısmı döner."""
+        if any(text in existing for existing in self.texts):
+            return ""
+        for i, existing in enumerate(self.texts):
+            overlap = _text_overlap(existing, text)
+            if overlap:
+                self.texts[i] = existing + text[overlap:]
+                return text[overlap:]
+            overlap = _text_overlap(text, existing)
+            if overlap:
+                self.texts[i] = text + existing[overlap:]
+                return text[:-overlap]
+        self.texts.append(text)
+        return text
+
+    def blocks(self) -> List[Tuple[Optional[Tuple[int, int]], str]]:
+        """Ardışık satırlar tek blok olur; satır bilgisi olmayan metinler sona eklenir."""
+        blocks = []
+        run: List[int] = []
+        for n in sorted(self.lines):
+            if run and n != run[-1] + 1:
+                blocks.append(((run[0], run[-1]), "\n".join(self.lines[i] for i in run)))
+                run = []
+            run.append(n)
+        if run:
+            blocks.append(((run[0], run[-1]), "\n".join(self.lines[i] for i in run)))
+        blocks.extend((None, text) for text in self.texts)
+        return blocks
+
+
+def pack_context(docs: List[Document], max_tokens: int) -> str:
+    """
+    Parçaları ilgi sırasıyla bütçeye ekler (sığmayan atlanır, daha küçük olanlar denenir)
+    ve dosya bazında formatlanmış bağlamı döner.
+    """
+    files: Dict[str, _FileContext] = {}
+    used = 0
+    for doc in docs:
+        source = _source(doc)
+        file_context = files.get(source) or _FileContext()
+        tokens = _tokens(doc)
+        overhead = 0 if source in files else _file_overhead(source)
+        span = _line_span(doc)
+
+        if span is not None:
+            start, lines = span
+            new_lines = file_context.new_line_count(start, lines)
+            if not new_lines:
+                continue
+            # Örtüşen satırlar ikinci kez sayılmaz
+            cost = math.ceil(tokens * new_lines / max(1, len(lines))) + overhead
+            if used + cost > max_tokens:
+                continue
+            file_context.add_lines(start, lines)
+        else:
+            snapshot = list(file_context.texts)
+            added = file_context.merge_text(doc.page_content)
+            if not added.strip():
+                continue
+            cost = (approx_token_count(added) if len(added) < len(doc.page_content) else tokens) + overhead
+            if used + cost > max_tokens:
+                file_context.texts = snapshot
+                continue
+
+        used += cost
+        for duplicate in doc.metadata.get("duplicate_sources") or []:
+            if duplicate not in file_context.duplicate_sources:
+                file_context.duplicate_sources.append(duplicate)
+        files[source] = file_context
+
+    return format_context(files)
+
+
+def format_context(files: Dict[str, "_FileContext"]) -> str:
+    formatted = []
+    for source, file_context in files.items():
+        language = _fence_language(source)
+        parts = [_file_header(source)]
+        if file_context.duplicate_sources:
+            others = ", ".join(f"`{path}`" for path in file_context.duplicate_sources)
+            parts.append(f"(Benzer içerik şu dosyalarda da var: {others})")
+        for span, text in file_context.blocks():
+            if span is not None:
+                parts.append(f"Satır {span[0]}-{span[1]}:")
+            parts.append(f"```{language}\n{text}\n```")
+        formatted.append("\n".join(parts))
+    return "\n\n---\n\n".join(formatted)
@@ -1,21 +1,52 @@
 """
 Supabase pgvector entegrasyonu. LangChain SupabaseVectorStore'u genişletir.
 metadata filtrelemesini match_documents RPC'ye parametre olarak geçirir.
+Silmeler metadata'dan türetilen indeksli kolonları kullanır (migrations/002); kolonlar
+yoksa aynı filtreler metadata JSON yoluyla (indekssiz, yavaş) uygulanır ve uyarı basılır.
+Parça id'leri deterministiktir; yazmalar upsert, eski satırlar delete_stale_documents RPC'si
+ile tek çağrıda silinir (migrations/005).
+Sözlüksel (BM25) indeks verilirse hibrit arama yapılır (HybridSearchMixin).
+async_client verilirse asimilarity_search* yolları (sorgu embedding'i ve RPC) tamamen
+async'tir; sohbet isteği event loop'u veya bir thread'i ağ çağrısı boyunca tutmaz.
 """
-from typing import Any, Callable, Dict, List, Tuple
+import asyncio
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 from langchain_community.vectorstores import SupabaseVectorStore
 from langchain_core.documents import Document
 from supabase import create_client
 
 from app.core.config import settings
+from app.services.hybrid_search import HybridSearchMixin
+from app.services.lexical_index import LexicalIndex
+from app.services.metrics import stage_timer
+from app.services.resources import is_missing_column
+from app.services.retrieval_cache import retrieval_cache
 
+# migrations/002 çalıştırılmamış veritabanlarında kiracı kolonlarının metadata karşılıkları
+_METADATA_COLUMNS = {
+    "user_id": "metadata->>user_id",
+    "collection_name": "metadata->>collection_name",
+    "source": "metadata->>source",
+}
 
-class CustomSupabaseVectorStore(SupabaseVectorStore):
-    """Supabase vektör deposu; metadata filtreleme destekler."""
 
-    def __init__(self, embeddings, **kwargs):
-        supabase_client = create_client(
+class CustomSupabaseVectorStore(HybridSearchMixin, SupabaseVectorStore):
+    """
+    Supabase vektör deposu; metadata filtreleme destekler.
+    Sorgu embedding'leri ve arama sonuçları retrieval_cache üzerinden önbelleğe alınır.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        client=None,
+        lexical_index: Optional[LexicalIndex] = None,
+        async_client=None,
+        **kwargs,
+    ):
+        # Paylaşılan istemci verilmezse (script'ler) yenisi oluşturulur
+        supabase_client = client or create_client(
             settings.SUPABASE_URL, 
             settings.SUPABASE_SERVICE_ROLE_KEY 
         )
@@ -26,10 +57,41 @@ class CustomSupabaseVectorStore(SupabaseVectorStore):
             table_name="documents",
             query_name="match_documents"
         )
+        self.lexical_index = lexical_index
+        self._async_client = async_client
+        self._tenant_columns = True
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[Dict[Any, Any]]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        docs = self._texts_to_documents(texts, metadatas)
+        # SupabaseVectorStore.add_texts ile aynı; embedding ve yükleme ayrı ölçülür
+        with stage_timer("embed"):
+            vectors = self._embedding.embed_documents(texts)
+        with stage_timer("upload"):
+            # ids verilirse satırlar id üzerinden upsert edilir
+            result = self.add_vectors(vectors, docs, ids)
+        with stage_timer("lexical"):
+            self._lexical_add(texts, metadatas, ids)
+        return result
 
     def _select_relevance_score_fn(self) -> Callable[[float], float]:
         return lambda x: x
 
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter, **kwargs)]
+
     def similarity_search_with_score(
         self,
         query: str,
@@ -37,7 +99,7 @@ class CustomSupabaseVectorStore(SupabaseVectorStore):
         filter: Dict[str, Any] | None = None,
         **kwargs: Any,
     ) -> List[Tuple[Document, float]]:
-        embedding = self.embeddings.embed_query(query)
+        embedding = retrieval_cache.get_query_embedding(query, self.embeddings.embed_query)
         return self.similarity_search_by_vector_with_relevance_scores(
             embedding, k, filter, **kwargs
         )
@@ -49,20 +111,162 @@ class CustomSupabaseVectorStore(SupabaseVectorStore):
         filter: Dict[str, Any] | None = None,
         **kwargs: Any,
     ) -> List[Tuple[Document, float]]:
-        match_documents_params = dict(
+        threshold = kwargs.get("score_threshold", 0.0)
+        cache_key = retrieval_cache.result_key(embedding, k, filter, threshold)
+        if cache_key is not None:
+            cached = retrieval_cache.results.get(cache_key)
+            if cached is not None:
+                return list(cached)
+
+        res = self._client.rpc(self.query_name, self._match_params(embedding, k, filter, threshold)).execute()
+        match_result = self._parse_matches(res.data)
+
+        if cache_key is not None:
+            retrieval_cache.results.set(cache_key, match_result)
+        return match_result
+
+    async def asimilarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k, filter, **kwargs)]
+
+    async def asimilarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        embedding = await retrieval_cache.aget_query_embedding(query, self.embeddings.aembed_query)
+        return await self.asimilarity_search_by_vector_with_relevance_scores(embedding, k, filter, **kwargs)
+
+    async def asimilarity_search_by_vector_with_relevance_scores(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        if self._async_client is None:
+            return await asyncio.to_thread(
+                self.similarity_search_by_vector_with_relevance_scores, embedding, k, filter, **kwargs
+            )
+        threshold = kwargs.get("score_threshold", 0.0)
+        cache_key = retrieval_cache.result_key(embedding, k, filter, threshold)
+        if cache_key is not None:
+            cached = retrieval_cache.results.get(cache_key)
+            if cached is not None:
+                return list(cached)
+
+        res = await self._async_client.rpc(
+            self.query_name, self._match_params(embedding, k, filter, threshold)
+        ).execute()
+        match_result = self._parse_matches(res.data)
+
+        if cache_key is not None:
+            retrieval_cache.results.set(cache_key, match_result)
+        return match_result
+
+    @staticmethod
+    def _match_params(embedding: List[float], k: int, filter: Dict[str, Any] | None, threshold: float) -> dict:
+        return dict(
             query_embedding=embedding,
-            match_threshold=kwargs.get("score_threshold", 0.0),
+            match_threshold=threshold,
             match_count=k,
             filter=filter or {},
         )
-        res = self._client.rpc(self.query_name, match_documents_params).execute()
 
-        match_result = []
-        for doc in res.data:
-            document = Document(
-                page_content=doc.get("content"),
-                metadata=doc.get("metadata")
-            )
-            match_result.append((document, doc.get("similarity", 0.0)))
-            
-        return match_result
\ No newline at end of file
+    @staticmethod
+    def _parse_matches(rows: List[dict]) -> List[Tuple[Document, float]]:
+        return [
+            (Document(page_content=row.get("content"), metadata=row.get("metadata")), row.get("similarity", 0.0))
+            for row in rows
+        ]
+
+    def _tenant_execute(self, run: Callable[[Callable[[str], str]], Any]) -> Any:
+        """
+        run(column) sorguyu kurup çalıştırır; column("user_id") gibi çağrılar kiracı kolon adını
+        verir. Kolonlar yoksa (migrations/002) sorgu metadata JSON yollarıyla tekrarlanır.
+        """
+        if self._tenant_columns:
+            try:
+                return run(lambda name: name)
+            except Exception as e:
+                if not any(is_missing_column(e, column) for column in _METADATA_COLUMNS):
+                    raise
+                print(
+                    "⚠️ UYARI: documents kiracı kolonları yok, silmeler metadata üzerinden (indekssiz) yapılıyor. "
+                    "supabase/migrations/002_documents_tenant_columns.sql çalıştırılmalı."
+                )
+                self._tenant_columns = False
+        return run(_METADATA_COLUMNS.__getitem__)
+
+    def delete_collection(self, collection_name: str, user_id: str):
+        """Bir repoya (collection_name + user_id) ait tüm vektörleri siler. Önbellek silmeden sonra geçersiz kılınır."""
+        try:
+            self._lexical_delete(collection_name, user_id)
+            self._tenant_execute(lambda column: self._client.table(self.table_name).delete()
+                .eq(column("collection_name"), collection_name)
+                .eq(column("user_id"), user_id)
+                .execute())
+        finally:
+            retrieval_cache.invalidate(collection_name, user_id)
+
+    def delete_sources(self, collection_name: str, user_id: str, sources: List[str], batch_size: int = 100):
+        """Belirtilen dosyalara (metadata.source) ait vektörleri siler; URL uzunluğu için parça parça."""
+        try:
+            self._lexical_delete(collection_name, user_id, sources)
+            for i in range(0, len(sources), batch_size):
+                batch = sources[i:i + batch_size]
+                self._tenant_execute(lambda column: self._client.table(self.table_name).delete()
+                    .eq(column("collection_name"), collection_name)
+                    .eq(column("user_id"), user_id)
+                    .in_(column("source"), batch)
+                    .execute())
+        finally:
+            retrieval_cache.invalidate(collection_name, user_id)
+
+    def _existing_vector_ids(self, collection_name: str, user_id: str, ids: List[str], batch_size: int = 100) -> Set[str]:
+        found = set()
+        for i in range(0, len(ids), batch_size):
+            batch = ids[i:i + batch_size]
+            res = self._tenant_execute(lambda column: self._client.table(self.table_name).select("id")
+                .eq(column("collection_name"), collection_name)
+                .eq(column("user_id"), user_id)
+                .in_("id", batch)
+                .execute())
+            found.update(str(row["id"]) for row in res.data)
+        return found
+
+    def _duplicate_groups(
+        self, collection_name: str, user_id: str, page_size: int = 1000
+    ) -> List[Tuple[str, List[str]]]:
+        """Yakın kopya temsilcileri: (source, duplicate_sources); sadece bu satırlar okunur."""
+        groups = []
+        start = 0
+        while True:
+            res = self._tenant_execute(lambda column: self._client.table(self.table_name).select("metadata")
+                .eq(column("collection_name"), collection_name)
+                .eq(column("user_id"), user_id)
+                .not_.is_("metadata->duplicate_sources", "null")
+                .range(start, start + page_size - 1)
+                .execute())
+            groups.extend((row["metadata"].get("source"), row["metadata"]["duplicate_sources"]) for row in res.data)
+            if len(res.data) < page_size:
+                return groups
+            start += page_size
+
+    def _delete_stale_vectors(
+        self, collection_name: str, user_id: str, keep_ids: List[str], sources: Optional[List[str]]
+    ) -> int:
+        res = self._client.rpc("delete_stale_documents", {
+            "p_user_id": user_id,
+            "p_collection_name": collection_name,
+            "keep_ids": keep_ids,
+            "p_sources": sources,
+        }).execute()
+        return int(res.data or 0)
@@ -0,0 +1,199 @@
+"""
+İçerik adresli embedding önbelleği. Anahtar (embedding modeli, normalize edilmiş parça hash'i)
+olduğundan aynı parça yeniden indekslemede, fork'larda ve farklı kullanıcılarda tekrar
+Gemini'ye gönderilmez. Vektörler yerel SQLite dosyasında, boyut sınırlı LRU ile tutulur.
+"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List
+
+from langchain_core.embeddings import Embeddings
+
+# SQLite'ın tek sorguda izin verdiği parametre sayısının altında kalınır
+_LOOKUP_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    """Satır sonu ve satır sonu boşluk farklarını yok sayar."""
+    return "\n".join(line.rstrip() for line in text.strip().splitlines())
+
+
+class EmbeddingCacheStore:
+    """
+    SQLite tabanlı kalıcı vektör deposu. Toplam boyut max_bytes'ı aşınca
+    en uzun süredir okunmayan kayıtlar silinir. Birden fazla worker aynı dosyayı
+    paylaşabilir (WAL modu).
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._lock = threading.Lock()
+        self._approx_bytes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Dosya ilk kullanımda açılır; import sırasında diske dokunulmaz
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("pragma synchronous=normal")
+            conn.execute(
+                "create table if not exists embeddings ("
+                " key text primary key, vector blob not null, size integer not null, last_access real not null)"
+            )
+            conn.execute("create index if not exists embeddings_last_access on embeddings(last_access)")
+            self._approx_bytes = conn.execute("select coalesce(sum(size), 0) from embeddings").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """Toplu arama; bulunan kayıtların erişim zamanı güncellenir."""
+        keys = list(keys)
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            conn = self._connection()
+            now = time.time()
+            for i in range(0, len(keys), _LOOKUP_BATCH):
+                chunk = keys[i:i + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"select key, vector from embeddings where key in ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+                if rows:
+                    hit_keys = [key for key, _ in rows]
+                    conn.execute(
+                        f"update embeddings set last_access = ? where key in ({','.join('?' * len(hit_keys))})",
+                        [now, *hit_keys],
+                    )
+        return found
+
+    def contains_many(self, keys: Iterable[str]) -> set:
+        """Sadece varlık kontrolü; vektörler okunmaz, erişim zamanı değişmez."""
+        keys = list(keys)
+        present = set()
+        with self._lock:
+            conn = self._connection()
+            for i in range(0, len(keys), _LOOKUP_BATCH):
+                chunk = keys[i:i + _LOOKUP_BATCH]
+                rows = conn.execute(
+                    f"select key from embeddings where key in ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                present.update(key for (key,) in rows)
+        return present
+
+    def put_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = array("f", vector).tobytes()
+            rows.append((key, blob, len(blob), now))
+        with self._lock:
+            conn = self._connection()
+            conn.execute("begin")
+            conn.executemany("insert or replace into embeddings values (?, ?, ?, ?)", rows)
+            conn.execute("commit")
+            self._approx_bytes += sum(r[2] for r in rows)
+            if self._approx_bytes > self.max_bytes:
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Toplam boyutu sınırın %90'ına indirene kadar en eski kayıtları siler."""
+        total = conn.execute("select coalesce(sum(size), 0) from embeddings").fetchone()[0]
+        target = int(self.max_bytes * 0.9)
+        if total > self.max_bytes:
+            excess = total - target
+            # Erişim sırasına göre kümülatif toplam; fazlalığı karşılayana kadar en eskiler silinir
+            conn.execute(
+                "delete from embeddings where key in ("
+                " select key from (select key, sum(size) over (order by last_access, key) - size as before"
+                " from embeddings) where before < ?)",
+                [excess],
+            )
+            total = conn.execute("select coalesce(sum(size), 0) from embeddings").fetchone()[0]
+        self._approx_bytes = total
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            conn = self._connection()
+            entries, size = conn.execute("select count(*), coalesce(sum(size), 0) from embeddings").fetchone()
+        return {"entries": entries, "bytes": size}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings sarmalayıcısı. embed_documents önbellekte olmayan parçaları tek
+    toplu çağrıyla modele gönderir; tamamı önbellekteyse ağa hiç çıkılmaz.
+    Sorgu embedding'leri (farklı task type) önbelleğe alınmaz.
+    """
+
+    def __init__(self, underlying: Embeddings, store: EmbeddingCacheStore, namespace: str):
+        self.underlying = underlying
+        self.store = store
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+
+    def cache_key(self, text: str) -> str:
+        payload = f"{self.namespace}\0{normalize_text(text)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def _lookup(self, texts: List[str]):
+        keys = [self.cache_key(t) for t in texts]
+        found = self.store.get_many(set(keys))
+        # Aynı toplu istekte tekrar eden metinler bir kez gönderilir
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return keys, found, missing
+
+    def missing_count(self, texts: List[str]) -> int:
+        """Önbellekte olmayan (modele gidecek) benzersiz metin sayısı; rate limiter maliyeti için."""
+        keys = {self.cache_key(t) for t in texts}
+        return len(keys - self.store.contains_many(keys))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._lookup(texts)
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self.store.put_many(fresh)
+            found.update(fresh)
+        return [found[key] for key in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = await asyncio.to_thread(self._lookup, texts)
+        if missing:
+            vectors = await self.underlying.aembed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            await asyncio.to_thread(self.store.put_many, fresh)
+            found.update(fresh)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.underlying.aembed_query(text)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, **self.store.stats()}
@@ -0,0 +1,384 @@
+"""
+İndekslemeye girmeyecek dosyaların seçimi: repodaki .gitignore / .gitattributes kuralları
+(linguist-generated, linguist-vendored), lock dosyaları, vendored dizinler, minified ve
+üretilmiş kod, dosya boyutu sınırları. Atlanan her dosya nedeni ve boyutuyla raporlanır.
+
+Yol kuralları (FileFilter) taramada, içerik sezgileri (ContentHeuristics) okuma sırasında
+süreç havuzunda uygulanır; ContentHeuristics bu yüzden küçük ve pickle edilebilirdir.
+"""
+import math
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import (
+    GENERATED_SUFFIXES,
+    INDEXABLE_EXTENSIONS,
+    LOCKFILE_NAMES,
+    MINIFIED_SUFFIXES,
+    SKIPPED_DIRS,
+    VENDORED_DIRS,
+    settings,
+)
+from app.services.metrics import INDEX_SKIPPED_BYTES, INDEX_SKIPPED_FILES
+
+# Değişirse dosya seçimi değişir; artımlı indeksleme yerine tam indeksleme gerekir
+FILTER_RULE_FILES = (".gitignore", ".gitattributes")
+
+# Üretilmiş kod başlıkları (dosyanın başındaki yorum satırlarında aranır, küçük harfle)
+GENERATED_MARKERS = (
+    "@generated",
+    "do not edit",
+    "code generated by",
+    "auto-generated",
+    "autogenerated",
+    "automatically generated",
+    "generated by the protocol buffer compiler",
+)
+_HEADER_CHARS = 1024
+_COMMENT_PREFIXES = ("#", "//", "/*", "*", "--", "<!--", ";", "%")
+# Entropi örneklemi; küçük dosyalarda ölçüm anlamsızdır
+_ENTROPY_SAMPLE = 64 * 1024
+_ENTROPY_MIN_CHARS = 1024
+
+
+@dataclass
+class SkippedFile:
+    """Atlanan dosya (göreli yol, neden, bayt). Süreç havuzundan sonuç olarak döner."""
+
+    path: str
+    reason: str
+    size: int
+
+
+class SkipReport:
+    """Atlanan dosyaların nedene göre özeti; tarama thread'i ve hat birlikte yazar."""
+
+    MAX_EXAMPLES = 20
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.by_reason: Dict[str, List[int]] = {}
+        self.examples: List[Dict[str, object]] = []
+        self._lock = threading.Lock()
+
+    def add(self, skipped: SkippedFile, files: int = 1):
+        with self._lock:
+            self.files += files
+            self.bytes += skipped.size
+            entry = self.by_reason.setdefault(skipped.reason, [0, 0])
+            entry[0] += files
+            entry[1] += skipped.size
+            if len(self.examples) < self.MAX_EXAMPLES:
+                self.examples.append({"path": skipped.path, "reason": skipped.reason, "size": skipped.size})
+        INDEX_SKIPPED_FILES.inc(files, reason=skipped.reason)
+        INDEX_SKIPPED_BYTES.inc(skipped.size, reason=skipped.reason)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "files": self.files,
+                "bytes": self.bytes,
+                "by_reason": {
+                    reason: {"files": files, "bytes": size} for reason, (files, size) in sorted(self.by_reason.items())
+                },
+                "examples": list(self.examples),
+            }
+
+
+def _glob_to_regex(pattern: str) -> str:
+    """gitignore glob'u ('*', '**', '?', '[...]', '\\' kaçışı) → '/' ayraçlı yollar için regex."""
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern[i:i + 2] == "**":
+                i += 2
+                if i < n and pattern[i] == "/":
+                    # "**/" sıfır veya daha fazla dizin
+                    out.append("(?:.*/)?")
+                    i += 1
+                else:
+                    out.append(".*")
+                continue
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            j = pattern.find("]", i + 2 if pattern[i + 1:i + 2] in ("!", "]") else i + 1)
+            if j == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = j + 1
+                continue
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+@dataclass
+class _Rule:
+    regex: "re.Pattern"
+    anchored: bool  # '/' içeren desenler kural dosyasının dizinine göre, diğerleri dosya adına uyar
+    dir_only: bool
+    negate: bool = False
+
+    @classmethod
+    def parse(cls, pattern: str, escaped: bool = False) -> Optional["_Rule"]:
+        # escaped: satır '\!' ile başlıyordu, baştaki '!' desenin parçasıdır
+        negate = not escaped and pattern.startswith("!")
+        if negate:
+            pattern = pattern[1:]
+        dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        if not pattern:
+            return None
+        anchored = "/" in pattern
+        return cls(re.compile(_glob_to_regex(pattern.lstrip("/"))), anchored, dir_only, negate)
+
+    def matches(self, relative_path: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        target = relative_path if self.anchored else relative_path.rsplit("/", 1)[-1]
+        return self.regex.fullmatch(target) is not None
+
+
+def _parse_ignore(text: str) -> List[_Rule]:
+    rules = []
+    for line in text.splitlines():
+        # Sondaki kaçışsız boşluklar desene dahil değildir
+        line = re.sub(r"(?<!\\)\s+$", "", line)
+        if not line or line.startswith("#"):
+            continue
+        escaped = line.startswith(("\\#", "\\!"))
+        if escaped:
+            line = line[1:]
+        rule = _Rule.parse(line, escaped=escaped)
+        if rule is not None:
+            rules.append(rule)
+    return rules
+
+
+def _parse_attributes(text: str) -> List[Tuple[_Rule, Dict[str, Optional[bool]]]]:
+    """Sadece linguist-generated / linguist-vendored; değer True, False veya None (unset)."""
+    rules = []
+    for line in text.splitlines():
+        fields = line.split()
+        if not fields or fields[0].startswith("#") or fields[0].startswith("!"):
+            continue
+        attributes: Dict[str, Optional[bool]] = {}
+        for field in fields[1:]:
+            if field.startswith("-"):
+                name, value = field[1:], False
+            elif field.startswith("!"):
+                name, value = field[1:], None
+            elif "=" in field:
+                name, raw = field.split("=", 1)
+                value = raw.lower() not in ("false", "0")
+            else:
+                name, value = field, True
+            if name in ("linguist-generated", "linguist-vendored"):
+                attributes[name] = value
+        rule = _Rule.parse(fields[0]) if attributes else None
+        if rule is not None:
+            rules.append((rule, attributes))
+    return rules
+
+
+def _read_text(path: str) -> str:
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+class FileFilter:
+    """
+    Bir çalışma ağacı için yol kuralları. Kural dosyaları dizin başına bir kez, ihtiyaç
+    olduğunda okunur; derindeki dosyanın kuralları üsttekileri ezer (git ile aynı).
+    .gitattributes'ta açıkça '-linguist-vendored' / 'linguist-generated=false' verilen
+    yollar varsayılan listelere (VENDORED_DIRS, GENERATED_SUFFIXES) rağmen indekslenir.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_file_bytes: Optional[int] = None,
+        max_json_bytes: Optional[int] = None,
+        heuristics: Optional["ContentHeuristics"] = None,
+    ):
+        self.root = root
+        self.max_file_bytes = settings.INDEX_MAX_FILE_KB * 1024 if max_file_bytes is None else max_file_bytes
+        self.max_json_bytes = settings.INDEX_MAX_JSON_KB * 1024 if max_json_bytes is None else max_json_bytes
+        self.heuristics = heuristics if heuristics is not None else ContentHeuristics.from_settings()
+        self.report = SkipReport()
+        self._ignore: Dict[str, List[_Rule]] = {}
+        self._attributes: Dict[str, List[Tuple[_Rule, Dict[str, Optional[bool]]]]] = {}
+        exclude = _read_text(os.path.join(root, ".git", "info", "exclude"))
+        self._exclude = _parse_ignore(exclude)
+
+    def _dir_rules(self, directory: str):
+        """directory ('' kök) altındaki .gitignore ve .gitattributes kuralları (önbellekli)."""
+        if directory not in self._ignore:
+            base = os.path.join(self.root, *directory.split("/")) if directory else self.root
+            self._ignore[directory] = _parse_ignore(_read_text(os.path.join(base, ".gitignore")))
+            self._attributes[directory] = _parse_attributes(_read_text(os.path.join(base, ".gitattributes")))
+        return self._ignore[directory], self._attributes[directory]
+
+    @staticmethod
+    def _scopes(relative_path: str) -> List[Tuple[str, str]]:
+        """Kökten yolun üst dizinine kadar (kural dizini, o dizine göre yol) çiftleri."""
+        parts = relative_path.split("/")
+        return [("/".join(parts[:i]), "/".join(parts[i:])) for i in range(len(parts))]
+
+    def _ignored(self, relative_path: str, is_dir: bool) -> bool:
+        ignored = False
+        for rule in self._exclude:
+            if rule.matches(relative_path, is_dir):
+                ignored = not rule.negate
+        for directory, local_path in self._scopes(relative_path):
+            for rule in self._dir_rules(directory)[0]:
+                if rule.matches(local_path, is_dir):
+                    ignored = not rule.negate
+        return ignored
+
+    def attribute(self, relative_path: str, name: str) -> Optional[bool]:
+        value = None
+        for directory, local_path in self._scopes(relative_path):
+            for rule, attributes in self._dir_rules(directory)[1]:
+                if name in attributes and rule.matches(local_path, False):
+                    value = attributes[name]
+        return value
+
+    def skip_dir(self, relative_dir: str) -> Optional[str]:
+        """Taramada budanacak dizin için neden, aksi halde None."""
+        if self._ignored(relative_dir, True):
+            return "gitignore"
+        if relative_dir.rsplit("/", 1)[-1] in VENDORED_DIRS:
+            # "vendor/** -linguist-vendored" gibi açık istisnalar dizini budatmaz
+            if self.attribute(f"{relative_dir}/_", "linguist-vendored") is not False:
+                return "vendored"
+        return None
+
+    def _path_reason(self, relative_path: str, size: int) -> Optional[str]:
+        parts = relative_path.split("/")
+        name = parts[-1].lower()
+        if any(self._ignored("/".join(parts[:i]), True) for i in range(1, len(parts))):
+            return "gitignore"
+        if self._ignored(relative_path, False):
+            return "gitignore"
+
+        vendored = self.attribute(relative_path, "linguist-vendored")
+        if vendored or (vendored is None and VENDORED_DIRS.intersection(parts[:-1])):
+            return "vendored"
+        generated = self.attribute(relative_path, "linguist-generated")
+        if generated or (generated is None and name.endswith(GENERATED_SUFFIXES)):
+            return "generated"
+        if name in LOCKFILE_NAMES:
+            return "lockfile"
+        if name.endswith(MINIFIED_SUFFIXES):
+            return "minified"
+
+        limit = self.max_json_bytes if name.endswith(".json") else self.max_file_bytes
+        if limit and size > limit:
+            return "too_large"
+        return None
+
+    def check(self, file_path: str, relative_path: str) -> Optional[SkippedFile]:
+        """Dosya yol kurallarına veya boyut sınırına takılırsa raporlar ve SkippedFile döner."""
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            size = 0
+        reason = self._path_reason(relative_path, size)
+        if reason is None:
+            return None
+        skipped = SkippedFile(relative_path, reason, size)
+        self.report.add(skipped)
+        return skipped
+
+    def record_dir(self, directory: str, relative_dir: str, reason: str):
+        """Budanan dizindeki indekslenebilir dosyaları tek kalemde raporlar (sadece stat)."""
+        files, size = 0, 0
+        for current, dirs, names in os.walk(directory):
+            dirs[:] = [d for d in dirs if d not in SKIPPED_DIRS]
+            for name in names:
+                if name.endswith(INDEXABLE_EXTENSIONS):
+                    files += 1
+                    try:
+                        size += os.path.getsize(os.path.join(current, name))
+                    except OSError:
+                        pass
+        if files:
+            self.report.add(SkippedFile(relative_dir + "/", reason, size), files=files)
+
+
+def header_comments(content: str) -> str:
+    """
+    Dosyanın başındaki yorum bloğu (shebang ve boş satırlar atlanır, ilk koddan sonrası
+    alınmaz). Docstring ve kod içindeki "auto-generated" gibi ifadeler başlık sayılmaz.
+    """
+    comments = []
+    for line in content[:_HEADER_CHARS].splitlines():
+        line = line.strip()
+        if not line or line.startswith("#!"):
+            continue
+        if not line.startswith(_COMMENT_PREFIXES):
+            break
+        comments.append(line)
+    return "\n".join(comments)
+
+
+def shannon_entropy(text: str) -> float:
+    """Karakter başına bit (kaynak kod ~4.5-5.2, base64 ~6)."""
+    if not text:
+        return 0.0
+    total = len(text)
+    return -sum(count / total * math.log2(count / total) for count in Counter(text).values())
+
+
+@dataclass(frozen=True)
+class ContentHeuristics:
+    """İçerikten ucuz tespit: üretilmiş kod başlığı, minified satırlar, yüksek entropili veri."""
+
+    max_avg_line_length: int = 200
+    max_entropy: float = 5.6
+    # Düzyazıda paragraf başına tek satır olağandır; satır uzunluğu ve üretilmiş kod
+    # başlığı ölçütleri uygulanmaz
+    prose_extensions: Tuple[str, ...] = (".md",)
+
+    @classmethod
+    def from_settings(cls) -> "ContentHeuristics":
+        return cls(max_avg_line_length=settings.INDEX_MAX_AVG_LINE_LENGTH, max_entropy=settings.INDEX_MAX_ENTROPY)
+
+    def reason(self, relative_path: str, content: str) -> Optional[str]:
+        # Düzyazıda "automatically generated" gibi ifadeler üretilmiş dosya anlamına gelmez
+        prose = relative_path.lower().endswith(self.prose_extensions)
+        header = "" if prose else header_comments(content).lower()
+        if header and any(marker in header for marker in GENERATED_MARKERS):
+            return "generated"
+        lines = content.count("\n") + 1
+        if self.max_avg_line_length and not prose and len(content) / lines > self.max_avg_line_length:
+            return "minified"
+        if self.max_entropy and len(content) >= _ENTROPY_MIN_CHARS:
+            # Sadece ASCII karakterler ölçülür: base64/hex verisi tamamen ASCII'dir, CJK vb.
+            # düzyazı ve yorumlar ise geniş alfabeleri yüzünden eşiği kolayca aşar
+            sample = content[:_ENTROPY_SAMPLE].encode("ascii", "ignore").decode("ascii")
+            if len(sample) >= _ENTROPY_MIN_CHARS and shannon_entropy(sample) > self.max_entropy:
+                return "high_entropy"
+        return None
@@ -1,15 +1,77 @@
 """
 Git işlemleri: Repo klonlama, boyut ve dosya sayısı limitleri.
+Varsayılan klon sığ (depth=1), blob filtreli (partial clone) ve sadece indekslenebilir
+uzantılarla sınırlı sparse checkout'tur; geçmiş ve gereksiz dosyalar indirilmez.
 """
 import os
 import shutil
 import stat
-from git import Repo
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
 
-from app.core.config import settings
+from git import GitCommandError, Repo
+
+from app.core.config import INDEXABLE_EXTENSIONS, SKIPPED_DIRS, settings
+from app.services.file_filter import FILTER_RULE_FILES
+from app.services.ingest_pipeline import is_indexable_path
+
+
+@dataclass
+class CloneResult:
+    """Klonlama sonucu ve maliyeti."""
+
+    path: str
+    commit: str
+    bytes_transferred: int
+    duration_seconds: float
+    file_count: int
+    total_size: int
+
+    def to_dict(self) -> dict:
+        return {
+            "commit": self.commit,
+            "bytes_transferred": self.bytes_transferred,
+            "duration_seconds": round(self.duration_seconds, 3),
+            "file_count": self.file_count,
+            "total_size": self.total_size,
+        }
+
+
+@dataclass
+class CommitDiff:
+    """İki commit arasındaki indekslenebilir dosya değişiklikleri."""
+
+    upserted: List[str] = field(default_factory=list)  # eklenen, değişen, yeniden adlandırılan (yeni yol)
+    deleted: List[str] = field(default_factory=list)  # silinen, yeniden adlandırılan (eski yol)
+    rules_changed: bool = False  # .gitignore/.gitattributes değişti: dosya seçimi yeniden yapılmalı
+
+    @property
+    def touched(self) -> List[str]:
+        """Vektörleri silinmesi gereken tüm yollar."""
+        return sorted(set(self.upserted) | set(self.deleted))
+
+
+def _dir_size(path: str, skip_git: bool = False) -> tuple:
+    """(dosya sayısı, toplam bayt) döner."""
+    total_size = 0
+    file_count = 0
+    for root, dirs, files in os.walk(path):
+        if skip_git and '.git' in dirs:
+            dirs.remove('.git')
+        for f in files:
+            file_count += 1
+            try:
+                total_size += os.path.getsize(os.path.join(root, f))
+            except Exception:
+                pass
+    return file_count, total_size
 
 
 class GitService:
+    MAX_TOTAL_SIZE_MB = 100
+    MAX_FILE_COUNT = 500
+
     @staticmethod
     def remove_readonly(func, path, excinfo):
         """Windows'ta salt okunur dosyaları silmek için shutil.rmtree callback'i."""
@@ -17,35 +79,132 @@ class GitService:
         func(path)
 
     @staticmethod
-    def clone_repository(repo_url: str) -> str:
-        """Repoyu klonlar. Max 100MB, max 500 dosya limiti uygular."""
-        repo_name = repo_url.split("/")[-1].replace(".git", "")
-        target_path = os.path.join(settings.TEMP_REPO_DIR, repo_name)
+    def sparse_patterns() -> List[str]:
+        """
+        Sparse checkout (non-cone) desenleri: indekslenebilir uzantılar ve dosya filtresinin
+        okuduğu .gitignore/.gitattributes, atlanan dizinler hariç.
+        """
+        patterns = [f"*{ext}" for ext in INDEXABLE_EXTENSIONS] + list(FILTER_RULE_FILES)
+        patterns += [f"!**/{d}/**" for d in sorted(SKIPPED_DIRS)]
+        return patterns
+
+    @staticmethod
+    def clone_repository(
+        repo_url: str,
+        target_path: Optional[str] = None,
+        depth: Optional[int] = None,
+        blob_filter: Optional[str] = None,
+        sparse: Optional[bool] = None,
+        max_total_size_mb: int = MAX_TOTAL_SIZE_MB,
+        max_file_count: int = MAX_FILE_COUNT,
+    ) -> CloneResult:
+        """
+        Repoyu klonlar. Max 100MB, max 500 dosya limiti uygular.
+        Parametreler verilmezse CLONE_DEPTH / CLONE_FILTER / CLONE_SPARSE ayarları kullanılır;
+        depth=0 tam geçmiş, blob_filter="" filtresiz, sparse=False tam checkout demektir.
+        """
+        depth = settings.CLONE_DEPTH if depth is None else depth
+        blob_filter = settings.CLONE_FILTER if blob_filter is None else blob_filter
+        sparse = settings.CLONE_SPARSE if sparse is None else sparse
+
+        if target_path is None:
+            repo_name = repo_url.split("/")[-1].replace(".git", "")
+            target_path = os.path.join(settings.TEMP_REPO_DIR, repo_name)
 
         if os.path.exists(target_path):
             shutil.rmtree(target_path, onerror=GitService.remove_readonly)
 
-        Repo.clone_from(repo_url, target_path)
-
-        # Repo boyut limitleri
-        max_total_size_mb = 100
-        max_file_count = 500
-        total_size = 0
-        file_count = 0
-        for root, dirs, files in os.walk(target_path):
-            for f in files:
-                file_count += 1
-                fp = os.path.join(root, f)
+        started = time.perf_counter()
+        clone_kwargs = {"no_checkout": True, "single_branch": True}
+        if depth:
+            clone_kwargs["depth"] = depth
+        if blob_filter:
+            clone_kwargs["filter"] = blob_filter
+        repo = Repo.clone_from(repo_url, target_path, **clone_kwargs)
+
+        try:
+            # Dosya sayısı limiti checkout'tan önce ağaçtan kontrol edilir (blob indirmeden)
+            tracked = repo.git.ls_tree("-r", "--name-only", "HEAD").splitlines()
+            if sparse:
+                tracked = [p for p in tracked if is_indexable_path(p)]
+            if len(tracked) > max_file_count:
+                raise Exception(f"Repo dosya sayısı limiti aşıldı: {len(tracked)} dosya (Limit: {max_file_count})")
+
+            if sparse:
                 try:
-                    total_size += os.path.getsize(fp)
-                except Exception:
-                    pass
-        total_size_mb = total_size / (1024 * 1024)
-        if total_size_mb > max_total_size_mb:
-            shutil.rmtree(target_path, onerror=GitService.remove_readonly)
-            raise Exception(f"Repo boyutu limiti aşıldı: {total_size_mb:.2f} MB (Limit: {max_total_size_mb} MB)")
-        if file_count > max_file_count:
+                    repo.git.sparse_checkout("set", "--no-cone", *GitService.sparse_patterns())
+                except GitCommandError as e:
+                    # Eski git sürümleri: tam checkout ile devam et
+                    print(f"Sparse checkout desteklenmiyor, tam checkout yapılıyor: {e}")
+            repo.git.checkout()
+
+            file_count, total_size = _dir_size(target_path, skip_git=True)
+            total_size_mb = total_size / (1024 * 1024)
+            if total_size_mb > max_total_size_mb:
+                raise Exception(f"Repo boyutu limiti aşıldı: {total_size_mb:.2f} MB (Limit: {max_total_size_mb} MB)")
+            if file_count > max_file_count:
+                raise Exception(f"Repo dosya sayısı limiti aşıldı: {file_count} dosya (Limit: {max_file_count})")
+
+            # Alınan paketler ve lazy blob indirmeleri .git/objects altında toplanır
+            _, bytes_transferred = _dir_size(os.path.join(target_path, ".git", "objects"))
+            commit = repo.head.commit.hexsha
+        except Exception:
+            repo.close()
             shutil.rmtree(target_path, onerror=GitService.remove_readonly)
-            raise Exception(f"Repo dosya sayısı limiti aşıldı: {file_count} dosya (Limit: {max_file_count})")
+            raise
+
+        repo.close()
+        return CloneResult(
+            path=target_path,
+            commit=commit,
+            bytes_transferred=bytes_transferred,
+            duration_seconds=time.perf_counter() - started,
+            file_count=file_count,
+            total_size=total_size,
+        )
+
+    @staticmethod
+    def diff_commits(repo_path: str, old_commit: str, new_commit: str) -> CommitDiff:
+        """
+        İki commit arasındaki değişen yolları döner (rename tespiti dahil).
+        Sığ klonda eski commit bulunmadığından origin'den sadece o commit (depth=1) çekilir;
+        partial clone'un tüm geçmişi lazy-fetch etmesine izin verilmez.
+        Eski commit bulunamazsa (force-push vb.) GitCommandError fırlar.
+        """
+        repo = Repo(repo_path)
+        try:
+            fetch_args = ["--no-tags", "--depth=1"]
+            if settings.CLONE_FILTER:
+                fetch_args.append(f"--filter={settings.CLONE_FILTER}")
+            repo.git.fetch(*fetch_args, "origin", old_commit)
+
+            # -z: NUL ayraçlı çıktı, özel karakterli dosya adları güvenle ayrıştırılır
+            raw = repo.git.diff("--name-status", "-M", "-z", "--no-ext-diff", old_commit, new_commit)
+        finally:
+            repo.close()
 
-        return target_path
\ No newline at end of file
+        diff = CommitDiff()
+        fields = raw.split("\0")
+        i = 0
+        while i < len(fields) and fields[i]:
+            status = fields[i][0]
+            count = 3 if status in ("R", "C") else 2
+            if any(p.rsplit("/", 1)[-1] in FILTER_RULE_FILES for p in fields[i + 1:i + count]):
+                diff.rules_changed = True
+            if status in ("R", "C"):
+                old_path, new_path = fields[i + 1], fields[i + 2]
+                i += 3
+                if status == "R" and is_indexable_path(old_path):
+                    diff.deleted.append(old_path)
+                if is_indexable_path(new_path):
+                    diff.upserted.append(new_path)
+                continue
+            path = fields[i + 1]
+            i += 2
+            if not is_indexable_path(path):
+                continue
+            if status == "D":
+                diff.deleted.append(path)
+            else:
+                diff.upserted.append(path)
+        return diff
@@ -0,0 +1,123 @@
+"""
+Vektör depoları için ortak hibrit arama: vektör araması ve BM25 (LexicalIndex)
+eşzamanlı çalışır, sonuçlar reciprocal rank fusion ile birleştirilir.
+Kullanan sınıf self.lexical_index (None olabilir), similarity_search ve asimilarity_search sağlar.
+
+Deterministik parça id'leriyle (ingest_pipeline.chunk_id) yeniden indeksleme için
+existing_ids/delete_stale de buradadır; kullanan sınıf _existing_vector_ids,
+_delete_stale_vectors ve _duplicate_groups sağlar.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from app.services.retrieval_cache import retrieval_cache
+
+# Senkron hibrit aramada sözlüksel arama bu havuzda, vektör aramasıyla paralel çalışır
+_lexical_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lexical-search")
+
+
+class HybridSearchMixin:
+    lexical_index: Optional[LexicalIndex] = None
+
+    def lexical_ready(self, collection_name: str, user_id: str) -> bool:
+        """Sözlüksel indeks yoksa veya repo indekste varsa True."""
+        return self.lexical_index is None or self.lexical_index.has_collection(collection_name, user_id)
+
+    def _lexical_add(self, texts: List[str], metadatas: Optional[List[dict]], ids: Optional[List[str]] = None):
+        # Vektörler yazıldıktan sonra çağrılır; iki indeks aynı parçaları içerir
+        if self.lexical_index is not None and metadatas:
+            self.lexical_index.add(texts, metadatas, ids)
+
+    def _lexical_delete(self, collection_name: str, user_id: str, sources: Optional[List[str]] = None):
+        if self.lexical_index is None:
+            return
+        if sources is None:
+            self.lexical_index.delete_collection(collection_name, user_id)
+        else:
+            self.lexical_index.delete_sources(collection_name, user_id, sources)
+
+    def existing_ids(self, collection_name: str, user_id: str, ids: List[str]) -> Set[str]:
+        """Verilen id'lerden depoda (sözlüksel indeks varsa ikisinde de) bulunanlar."""
+        found = self._existing_vector_ids(collection_name, user_id, ids)
+        if found and self.lexical_index is not None:
+            found &= self.lexical_index.existing_ids(collection_name, user_id, list(found))
+        return found
+
+    def delete_stale(
+        self,
+        collection_name: str,
+        user_id: str,
+        keep_ids: Iterable[str],
+        sources: Optional[List[str]] = None,
+    ) -> int:
+        """
+        Repoda id'si keep_ids'te olmayan satırları tek seferde siler (küme farkı).
+        sources verilirse sadece o dosyalara bakılır (artımlı indeksleme). Silinen vektör sayısını döner.
+        """
+        keep_ids = list(keep_ids)
+        try:
+            deleted = self._delete_stale_vectors(collection_name, user_id, keep_ids, sources)
+            if self.lexical_index is not None:
+                self.lexical_index.delete_stale(collection_name, user_id, keep_ids, sources)
+        finally:
+            # Silmeden sonra: arada gelen sorgu eski satırları yeni sürümle önbelleğe yazamaz
+            retrieval_cache.invalidate(collection_name, user_id)
+        return deleted
+
+    def representative_sources(self, collection_name: str, user_id: str) -> Set[str]:
+        """Kopyası kayıtlı (duplicate_sources dolu) temsilci parçaların dosyaları."""
+        return {source for source, _ in self._duplicate_groups(collection_name, user_id)}
+
+    def linked_sources(self, collection_name: str, user_id: str, sources: Iterable[str]) -> Set[str]:
+        """
+        Verilen dosyalarla yakın kopya kümesi paylaşan diğer dosyalar. Artımlı indekslemede
+        temsilcinin dosyası değişirse kopyaları da yeniden işlenir (yoksa içerikleri kaybolur);
+        kopya dosya değişirse temsilcinin duplicate_sources listesi güncellenir.
+        """
+        targets = set(sources)
+        linked: Set[str] = set()
+        for source, duplicates in self._duplicate_groups(collection_name, user_id):
+            group = {source, *duplicates}
+            if targets & group:
+                linked |= group
+        return linked - targets
+
+    def _lexical_search(self, query: str, k: int, filter: Dict[str, Any] | None) -> List[Document]:
+        filter = filter or {}
+        if self.lexical_index is None or set(filter) != {"collection_name", "user_id"}:
+            return []
+        results = self.lexical_index.search(query, filter["collection_name"], filter["user_id"], k)
+        return [doc for doc, _ in results]
+
+    def hybrid_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Dict[str, Any] | None = None,
+        candidates: int | None = None,
+    ) -> List[Document]:
+        """Vektör ve BM25 sonuçlarını (her biri candidates kadar) RRF ile birleştirip ilk k'yı döner."""
+        candidates = max(k, candidates or settings.HYBRID_CANDIDATES)
+        lexical = _lexical_executor.submit(self._lexical_search, query, candidates, filter)
+        vector = self.similarity_search(query, candidates, filter)
+        return reciprocal_rank_fusion([vector, lexical.result()], k=settings.RRF_K)[:k]
+
+    async def ahybrid_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Dict[str, Any] | None = None,
+        candidates: int | None = None,
+    ) -> List[Document]:
+        candidates = max(k, candidates or settings.HYBRID_CANDIDATES)
+        # Vektör araması native async (embedding + RPC); yerel SQLite araması thread'de
+        vector, lexical = await asyncio.gather(
+            self.asimilarity_search(query, candidates, filter),
+            asyncio.to_thread(self._lexical_search, query, candidates, filter),
+        )
+        return reciprocal_rank_fusion([vector, lexical], k=settings.RRF_K)[:k]
@@ -0,0 +1,506 @@
+"""
+Arka plan indeksleme kuyruğu: /repo/index isteği işi kuyruğa alıp hemen döner,
+worker havuzu işleri kendi event loop'larında çalıştırır.
+Kullanıcılar arasında round-robin ile adil sıra uygulanır.
+
+İşler aynı makinedeki tüm uvicorn/gunicorn worker'larının paylaştığı SQLite dosyasında
+(JobStore) tutulur: durum sorgusu, iptal ve kullanıcı limiti hangi worker'a gelirse gelsin
+çalışır, işleri boştaki herhangi bir worker sahiplenir. Çalışan işin ilerlemesi ve kalp
+atışı periyodik olarak yazılır; kalp atışı kesilen iş (worker çöktü/yeniden başlatıldı)
+tekrar kuyruğa alınır, kapanışta yarıda kalan işler de kuyruğa geri döner.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.services.metrics import INDEX_JOBS, StageTimings, record_stage
+
+
+class JobCancelled(Exception):
+    """İş kullanıcı tarafından iptal edildiğinde fırlatılır."""
+
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    ACTIVE = (QUEUED, RUNNING)
+
+
+@dataclass
+class IndexJob:
+    """Tek bir indeksleme işinin durumu ve ilerlemesi."""
+
+    user_id: str
+    repo_url: str
+    repo_name: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = JobStatus.QUEUED
+    progress: Dict[str, int] = field(default_factory=lambda: {
+        "files_read": 0,
+        "chunks_total": 0,
+        "chunks_embedded": 0,
+        "chunks_uploaded": 0,
+    })
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # Aşama → toplam saniye (clone, walk, split, embed, upload, user_repos...); iş sürerken de dolar
+    timings: StageTimings = field(default_factory=StageTimings, repr=False)
+    _cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    # Kapanış yüzünden durdurulan iş iptal sayılmaz, kuyruğa geri döner
+    _interrupted: bool = field(default=False, repr=False)
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in JobStatus.ACTIVE
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        """İptal istenmişse JobCancelled fırlatır. Uzun işlemlerin ara noktalarında çağrılır."""
+        if self._cancel_event.is_set():
+            raise JobCancelled(f"{self.repo_name} indekslemesi iptal edildi.")
+
+    def advance(self, **counts: int):
+        """İlerleme sayaçlarını artırır (ör. advance(files_read=1))."""
+        for key, value in counts.items():
+            self.progress[key] = self.progress.get(key, 0) + value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "repo_name": self.repo_name,
+            "repo_url": self.repo_url,
+            "status": self.status,
+            "progress": dict(self.progress),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "timings": self.timings.as_dict(),
+        }
+
+
+_COLUMNS = (
+    "id, user_id, repo_url, repo_name, status, progress, result, error, timings,"
+    " created_at, started_at, finished_at"
+)
+
+
+class JobStore:
+    """
+    index_jobs tablosu (SQLite, WAL). Durum değiştiren her işlem tek bir `begin immediate`
+    işlemidir; iş sahiplenme ve kullanıcı başına eşzamanlılık kontrolü süreçler arasında atomiktir.
+    path=":memory:" süreç içi (testler) kullanım içindir.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.RLock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # fork sonrası (gunicorn --preload) ebeveynin bağlantısı kullanılmaz
+        if self._conn is None or self._pid != os.getpid():
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("pragma synchronous=normal")
+            conn.execute(
+                "create table if not exists index_jobs ("
+                " id text primary key, user_id text not null, repo_url text not null,"
+                " repo_name text not null, status text not null, progress text not null,"
+                " result text, error text, timings text,"
+                " cancel_requested integer not null default 0, attempts integer not null default 0,"
+                " owner text, heartbeat real,"
+                " created_at real not null, started_at real, finished_at real)"
+            )
+            conn.execute("create index if not exists index_jobs_user_idx on index_jobs (user_id, status)")
+            conn.execute("create index if not exists index_jobs_status_idx on index_jobs (status, created_at)")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("begin immediate")
+            try:
+                yield conn
+                conn.execute("commit")
+            except BaseException:
+                conn.execute("rollback")
+                raise
+
+    @staticmethod
+    def _job(row) -> IndexJob:
+        job = IndexJob(
+            id=row[0], user_id=row[1], repo_url=row[2], repo_name=row[3], status=row[4],
+            progress=json.loads(row[5]), result=json.loads(row[6]) if row[6] else None, error=row[7],
+            created_at=row[9], started_at=row[10], finished_at=row[11],
+        )
+        for stage, seconds in json.loads(row[8] or "{}").items():
+            job.timings.add(stage, seconds)
+        return job
+
+    def _select(self, conn: sqlite3.Connection, where: str, params: tuple) -> List[IndexJob]:
+        rows = conn.execute(f"select {_COLUMNS} from index_jobs where {where}", params).fetchall()
+        return [self._job(row) for row in rows]
+
+    def insert_unless_active(self, job: IndexJob) -> IndexJob:
+        """Aynı repo için aktif iş varsa onu, yoksa eklenen işi döner."""
+        with self._transaction() as conn:
+            active = self._select(
+                conn, "user_id = ? and repo_name = ? and status in ('queued', 'running')",
+                (job.user_id, job.repo_name),
+            )
+            if active:
+                return active[0]
+            conn.execute(
+                "insert into index_jobs (id, user_id, repo_url, repo_name, status, progress, created_at)"
+                " values (?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.user_id, job.repo_url, job.repo_name, job.status, json.dumps(job.progress),
+                 job.created_at),
+            )
+            return job
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        with self._lock:
+            jobs = self._select(self._connection(), "id = ?", (job_id,))
+        return jobs[0] if jobs else None
+
+    def list_for_user(self, user_id: str, limit: int) -> List[IndexJob]:
+        with self._lock:
+            return self._select(
+                self._connection(), "user_id = ? order by created_at desc, rowid desc limit ?", (user_id, limit)
+            )
+
+    def find_active(self, user_id: str, repo_name: Optional[str] = None) -> List[IndexJob]:
+        where, params = "user_id = ? and status in ('queued', 'running')", (user_id,)
+        if repo_name is not None:
+            where, params = where + " and repo_name = ?", params + (repo_name,)
+        with self._lock:
+            return self._select(self._connection(), where + " order by created_at", params)
+
+    def request_cancel(self, job_id: str) -> Optional[IndexJob]:
+        """Kuyruktaki işi hemen iptal eder, çalışan işe iptal bayrağı koyar."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "update index_jobs set cancel_requested = 1,"
+                " status = case when status = 'queued' then 'cancelled' else status end,"
+                " finished_at = case when status = 'queued' then ? else finished_at end"
+                " where id = ? and status in ('queued', 'running')",
+                (now, job_id),
+            )
+            jobs = self._select(conn, "id = ?", (job_id,))
+        return jobs[0] if jobs else None
+
+    def claim(self, owner: str, per_user_concurrency: int, stale_after: float, max_attempts: int) -> Optional[IndexJob]:
+        """
+        Kalp atışı kesilmiş işleri kuyruğa geri alır (deneme hakkı bittiyse başarısız sayar),
+        sonra eşzamanlı iş limiti dolmamış, en uzun süredir iş başlatılmamış kullanıcının
+        en eski işini sahiplenir (round-robin).
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "update index_jobs set status = case when attempts >= ? then 'failed' else 'queued' end,"
+                " error = case when attempts >= ? then ? else error end,"
+                " finished_at = case when attempts >= ? then ? else null end,"
+                " owner = null, started_at = null"
+                " where status = 'running' and heartbeat < ?",
+                (max_attempts, max_attempts, "İndeksleme yarıda kaldı (sunucu yeniden başlatıldı).",
+                 max_attempts, now, now - stale_after),
+            )
+            row = conn.execute(
+                "select j.id from index_jobs j where j.status = 'queued'"
+                " and (select count(*) from index_jobs r where r.user_id = j.user_id and r.status = 'running') < ?"
+                " order by coalesce((select max(s.started_at) from index_jobs s where s.user_id = j.user_id), 0),"
+                " j.created_at, j.rowid limit 1",
+                (per_user_concurrency,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "update index_jobs set status = 'running', owner = ?, heartbeat = ?, started_at = ?,"
+                " attempts = attempts + 1, progress = ?, timings = null where id = ?",
+                (owner, now, now, json.dumps(IndexJob("", "", "").progress), row[0]),
+            )
+            return self._select(conn, "id = ?", (row[0],))[0]
+
+    def heartbeat(self, jobs: List[IndexJob]) -> List[str]:
+        """Çalışan işlerin ilerlemesini yazar; iptal istenmiş olanların id'lerini döner."""
+        now = time.time()
+        with self._transaction() as conn:
+            for job in jobs:
+                conn.execute(
+                    "update index_jobs set heartbeat = ?, progress = ?, timings = ? where id = ? and status = 'running'",
+                    (now, json.dumps(job.progress), json.dumps(job.timings.as_dict()), job.id),
+                )
+            if not jobs:
+                return []
+            marks = ",".join("?" * len(jobs))
+            rows = conn.execute(
+                f"select id from index_jobs where cancel_requested = 1 and id in ({marks})",
+                tuple(job.id for job in jobs),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def finish(self, job: IndexJob):
+        with self._transaction() as conn:
+            conn.execute(
+                "update index_jobs set status = ?, result = ?, error = ?, progress = ?, timings = ?,"
+                " finished_at = ?, owner = null where id = ?",
+                (job.status, json.dumps(job.result, default=str) if job.result is not None else None, job.error,
+                 json.dumps(job.progress), json.dumps(job.timings.as_dict()), job.finished_at, job.id),
+            )
+
+    def requeue(self, job: IndexJob):
+        """Kapanışta yarıda kalan iş: deneme sayılmaz, başka bir worker baştan alır (iptal istenmediyse)."""
+        with self._transaction() as conn:
+            conn.execute(
+                "update index_jobs set status = case when cancel_requested = 1 then 'cancelled' else 'queued' end,"
+                " finished_at = case when cancel_requested = 1 then ? else null end,"
+                " owner = null, started_at = null, attempts = max(0, attempts - 1)"
+                " where id = ? and status = 'running'",
+                (time.time(), job.id),
+            )
+
+    def prune(self, history_size: int):
+        """Bitmiş işlerin en eskilerini history_size sınırına kadar siler."""
+        with self._transaction() as conn:
+            conn.execute(
+                "delete from index_jobs where status not in ('queued', 'running') and id not in ("
+                " select id from index_jobs where status not in ('queued', 'running')"
+                " order by finished_at desc limit ?)",
+                (history_size,),
+            )
+
+
+class IndexJobQueue:
+    """
+    Thread tabanlı worker havuzu. Her worker kendi event loop'unu açar, böylece
+    klonlama ve embedding gibi bloklayan işler API'nin event loop'unu durdurmaz.
+    Boştaki worker'lar ortak depoyu poll_interval aralıklarla yoklar (başka süreçte
+    kuyruğa alınan işler için); bu süreçte eklenen işler hemen uyandırır.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[IndexJob], Awaitable[Dict[str, Any]]],
+        worker_count: int = 2,
+        per_user_concurrency: int = 1,
+        history_size: int = 200,
+        store: Optional[JobStore] = None,
+        poll_interval: float = 1.0,
+        heartbeat_interval: float = 2.0,
+        stale_after: float = 60.0,
+        max_attempts: int = 3,
+    ):
+        self._runner = runner
+        self.worker_count = max(1, worker_count)
+        self.per_user_concurrency = max(1, per_user_concurrency)
+        self.history_size = history_size
+        self.store = store or JobStore()
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        # Bu süreçte çalışan işler (ilerleme bellekte güncellenir, kalp atışıyla depoya yazılır)
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self._cond = threading.Condition()
+        self._local: Dict[str, IndexJob] = {}
+        self._workers: List[threading.Thread] = []
+        self._monitor: Optional[threading.Thread] = None
+        self._stopping = False
+
+    # --- Kuyruk işlemleri ---
+
+    def start(self):
+        """Worker'ları başlatır; yeniden başlatmadan önce kuyruğa alınmış işler de alınır."""
+        with self._cond:
+            self._ensure_workers()
+
+    def submit(self, user_id: str, repo_url: str, repo_name: str) -> IndexJob:
+        """İşi kuyruğa ekler. Aynı repo için aktif bir iş varsa onu döner."""
+        job = self.store.insert_unless_active(IndexJob(user_id=user_id, repo_url=repo_url, repo_name=repo_name))
+        with self._cond:
+            self._ensure_workers()
+            self._cond.notify()
+        if job.status == JobStatus.QUEUED:
+            self.store.prune(self.history_size)
+        return self._local.get(job.id, job)
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        return self._local.get(job_id) or self.store.get(job_id)
+
+    def list_for_user(self, user_id: str) -> List[IndexJob]:
+        return [self._local.get(job.id, job) for job in self.store.list_for_user(user_id, self.history_size)]
+
+    def find_active(self, user_id: str, repo_name: str) -> Optional[IndexJob]:
+        active = self.store.find_active(user_id, repo_name)
+        return self._local.get(active[0].id, active[0]) if active else None
+
+    def active_repo_names(self, user_id: str) -> set:
+        """Kullanıcının kuyrukta bekleyen veya çalışan işlerinin repo adları."""
+        return {job.repo_name for job in self.store.find_active(user_id)}
+
+    def cancel(self, job_id: str) -> Optional[IndexJob]:
+        """Kuyruktaki işi hemen iptal eder; çalışan işe (hangi süreçte olursa) iptal sinyali gönderir."""
+        job = self.store.request_cancel(job_id)
+        local = self._local.get(job_id)
+        if local is not None:
+            local._cancel_event.set()
+            return local
+        return job
+
+    def shutdown(self, timeout: float = 10.0):
+        """Bu süreçte çalışan işleri durdurur ve kuyruğa geri alır; bekleyen işler depoda kalır."""
+        with self._cond:
+            self._stopping = True
+            for job in self._local.values():
+                job._interrupted = True
+                job._cancel_event.set()
+            self._cond.notify_all()
+            threads = list(self._workers) + ([self._monitor] if self._monitor else [])
+
+        deadline = time.time() + timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.time()))
+
+        with self._cond:
+            self._workers = [w for w in self._workers if w.is_alive()]
+            if self._monitor is not None and not self._monitor.is_alive():
+                self._monitor = None
+            self._stopping = False
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[IndexJob]:
+        """İş bitene kadar bekler (test ve script'ler için)."""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or not job.is_active:
+                return job
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return job
+            with self._cond:
+                self._cond.wait(min(self.poll_interval, remaining) if remaining is not None else self.poll_interval)
+
+    # --- Worker tarafı ---
+
+    def _ensure_workers(self):
+        # _cond tutulurken çağrılır
+        self._workers = [w for w in self._workers if w.is_alive()]
+        while len(self._workers) < self.worker_count:
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"index-worker-{len(self._workers) + 1}",
+                daemon=True,
+            )
+            self._workers.append(worker)
+            worker.start()
+        if self._monitor is None or not self._monitor.is_alive():
+            self._monitor = threading.Thread(target=self._monitor_loop, name="index-heartbeat", daemon=True)
+            self._monitor.start()
+
+    def _take_next(self) -> Optional[IndexJob]:
+        """Ortak depodan sıradaki işi sahiplenir; iş yoksa bekler (durdurulunca None)."""
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return None
+            try:
+                job = self.store.claim(self.owner, self.per_user_concurrency, self.stale_after, self.max_attempts)
+            except sqlite3.Error as e:
+                print(f"İş kuyruğu okunamadı: {e}")
+                job = None
+            with self._cond:
+                if job is not None:
+                    if self._stopping:
+                        self.store.requeue(job)
+                        return None
+                    self._local[job.id] = job
+                    return job
+                if self._stopping:
+                    return None
+                self._cond.wait(self.poll_interval)
+
+    def _worker_loop(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            while True:
+                job = self._take_next()
+                if job is None:
+                    return
+                self._run_job(loop, job)
+        finally:
+            loop.close()
+
+    def _monitor_loop(self):
+        """Çalışan işlerin kalp atışını ve ilerlemesini yazar, başka süreçten gelen iptalleri uygular."""
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                self._cond.wait(self.heartbeat_interval)
+                jobs = list(self._local.values())
+            try:
+                for job_id in self.store.heartbeat(jobs):
+                    job = self._local.get(job_id)
+                    if job is not None:
+                        job._cancel_event.set()
+            except sqlite3.Error as e:
+                print(f"İş kalp atışı yazılamadı: {e}")
+
+    def _run_job(self, loop: asyncio.AbstractEventLoop, job: IndexJob):
+        status, result, error = JobStatus.SUCCEEDED, None, None
+        try:
+            job.check_cancelled()
+            result = loop.run_until_complete(self._runner(job))
+        except JobCancelled:
+            status = JobStatus.CANCELLED
+        except HTTPException as he:
+            status, error = JobStatus.FAILED, str(he.detail)
+        except Exception as e:
+            print(f"İndeksleme işi hatası ({job.repo_name}): {e}")
+            status = JobStatus.FAILED
+            error = str(e) if settings.DEBUG else "Repo indekslenirken bir hata oluştu."
+
+        INDEX_JOBS.inc(status=status)
+        record_stage("index_job", time.time() - job.started_at)
+        if status == JobStatus.CANCELLED and job._interrupted:
+            # Kapanış: iş kaybolmaz, bir sonraki (veya başka bir) worker baştan alır
+            self.store.requeue(job)
+            job.status = JobStatus.QUEUED
+        else:
+            job.status, job.result, job.error = status, result, error
+            job.finished_at = time.time()
+            self.store.finish(job)
+        with self._cond:
+            self._local.pop(job.id, None)
+            self._cond.notify_all()
@@ -0,0 +1,445 @@
+"""
+Akışlı indeksleme hattı: tarama → okuma + parçalama (süreç havuzu) → embedding + yükleme.
+Aşamalar sınırlı kuyruklarla birbirine bağlanır; bellek kullanımı repo boyutundan
+bağımsız kalır ve ilk vektörler tarama bitmeden depoya yazılır.
+Yakın kopya eleme açıksa karşılaştırılabilir parçalar tarama bitince kümelenip yazılır.
+"""
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config import INDEXABLE_EXTENSIONS, SKIPPED_DIRS
+from app.services.file_filter import ContentHeuristics, FileFilter, SkippedFile
+from app.services.metrics import INDEX_BYTES, INDEX_CHUNKS, record_stage, stage_timer
+from app.services.near_duplicates import MinHasher, NearDuplicateIndex
+from app.services.upload_engine import AdaptiveTokenBucket, UploadEngine
+
+# Kuyruğun bittiğini bildiren işaret
+_DONE = object()
+
+# Süreç havuzu verilmezse (testler, script'ler) okuma + parçalama tek thread'de sırayla yapılır:
+# CPython 3.11'de eşzamanlı ast.parse "AST constructor recursion depth mismatch" SystemError'ı
+# verebilir; GIL yüzünden thread'ler zaten paralel parçalamaz
+_SERIAL_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-split")
+
+# Parça id'leri bu isim alanında uuid5 ile türetilir (değiştirilirse tüm repolar yeniden yazılır)
+_CHUNK_ID_NAMESPACE = uuid.UUID("6f1d3c9e-2b47-4f0a-9a51-3e8c7d2b1f64")
+
+
+def chunk_id(metadata: Dict[str, Any], content: str) -> str:
+    """
+    (user_id, collection_name, source, içerik hash'i, satır aralığı) → deterministik UUID.
+    Aynı dosyadaki aynı parça her indekslemede aynı id'yi alır; yazmalar upsert olur.
+    Satır aralığı da id'ye girer: üstüne satır eklenen parça, metadata'sında eski
+    start_line/end_line ile atlanmaz, yeniden yazılır (bağlam paketleyici bunlara güvenir).
+    Yakın kopya kümesinin temsilcisinde kopya dosyalar da id'ye girer: küme değişince
+    satır yeniden yazılır ve metadata.duplicate_sources güncel kalır.
+    """
+    digest = hashlib.sha256(content.replace("\r\n", "\n").encode("utf-8")).hexdigest()
+    parts = [
+        str(metadata.get("user_id", "")),
+        str(metadata.get("collection_name", "")),
+        str(metadata.get("source", "")),
+        digest,
+    ]
+    if metadata.get("start_line") is not None:
+        parts += [str(metadata.get("start_line")), str(metadata.get("end_line"))]
+    parts += metadata.get("duplicate_sources") or []
+    name = "\0".join(parts)
+    return str(uuid.uuid5(_CHUNK_ID_NAMESPACE, name))
+
+
+def is_indexable_path(relative_path: str) -> bool:
+    """Göreli yol ('/' ayraçlı) indekslenecek bir dosyaya mı ait?"""
+    parts = relative_path.replace(os.sep, "/").split("/")
+    return parts[-1].endswith(INDEXABLE_EXTENSIONS) and not SKIPPED_DIRS.intersection(parts[:-1])
+
+
+def _walk_order(relative_path: str) -> List[Tuple[int, str]]:
+    """Sıralı os.walk sırası: bir dizinde önce dosyalar, sonra alt dizinler (alfabetik)."""
+    parts = relative_path.split("/")
+    return [(1, part) for part in parts[:-1]] + [(0, parts[-1])]
+
+
+def iter_source_files(
+    root: str,
+    paths: Optional[Iterable[str]] = None,
+    file_filter: Optional[FileFilter] = None,
+) -> Iterator[Tuple[str, str]]:
+    """
+    İndekslenebilir dosyaları (mutlak yol, göreli yol) olarak tek tek üretir.
+    paths verilirse (artımlı indeksleme) sadece o dosyalar taranır.
+    file_filter verilirse yol kurallarına takılan dosyalar/dizinler atlanıp raporlanır.
+    """
+    if paths is not None:
+        # Tam taramayla aynı sıra: yakın kopya temsilcisi tarama sırasında ilk görülen parçadır
+        for relative_path in sorted(paths, key=_walk_order):
+            file_path = os.path.join(root, *relative_path.split("/"))
+            if is_indexable_path(relative_path) and os.path.isfile(file_path):
+                if file_filter is None or file_filter.check(file_path, relative_path) is None:
+                    yield file_path, relative_path
+        return
+
+    for current, dirs, files in os.walk(root):
+        relative_dir = os.path.relpath(current, root).replace(os.sep, "/")
+        relative_dir = "" if relative_dir == "." else relative_dir + "/"
+        kept = []
+        for d in dirs:
+            if d in SKIPPED_DIRS:
+                continue
+            reason = file_filter.skip_dir(relative_dir + d) if file_filter else None
+            if reason:
+                file_filter.record_dir(os.path.join(current, d), relative_dir + d, reason)
+                continue
+            kept.append(d)
+        dirs[:] = sorted(kept)
+        for file in sorted(files):
+            if file.endswith(INDEXABLE_EXTENSIONS):
+                file_path = os.path.join(current, file)
+                if file_filter is None or file_filter.check(file_path, relative_dir + file) is None:
+                    yield file_path, relative_dir + file
+
+
+def read_source_file(file_path: str, relative_path: str, base_metadata: Dict[str, Any]) -> Optional[Document]:
+    """Dosyayı okuyup Document döner; boş veya okunamayan dosyalar için None."""
+    try:
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+            content = f.read()
+    except Exception as e:
+        print(f"Dosya okuma hatası ({relative_path}): {e}")
+        return None
+    if not content.strip():
+        return None
+    return Document(
+        page_content=content,
+        metadata={
+            "source": relative_path,
+            "file_name": os.path.basename(relative_path),
+            **base_metadata,
+        },
+    )
+
+
+@dataclass
+class FileChunks:
+    """Bir dosyanın parçaları; hasher verilmişse parça başına MinHash imzası (kısa parçalarda None)."""
+
+    chunks: List[Document]
+    signatures: List[Optional[np.ndarray]] = field(default_factory=list)
+
+
+def process_files(
+    files: List[Tuple[str, str]],
+    base_metadata: Dict[str, Any],
+    text_splitter,
+    heuristics: Optional[ContentHeuristics] = None,
+    hasher: Optional[MinHasher] = None,
+) -> List[Union[None, FileChunks, SkippedFile]]:
+    """
+    Hattın CPU aşaması; süreç havuzunda çalışır (modül seviyesinde olmalı, pickle edilir).
+    Her dosya için okuma (UTF-8 çözme), parçalama, parça id'leri ve MinHash imzaları; sonuçlar
+    dosya sırasıyla, boş veya okunamayan dosyalar için None, içerik sezgilerine takılanlar için
+    SkippedFile.
+    """
+    results: List[Union[None, FileChunks, SkippedFile]] = []
+    for file_path, relative_path in files:
+        doc = read_source_file(file_path, relative_path, base_metadata)
+        if doc is None:
+            results.append(None)
+            continue
+        reason = heuristics.reason(relative_path, doc.page_content) if heuristics else None
+        if reason:
+            results.append(SkippedFile(relative_path, reason, len(doc.page_content.encode("utf-8"))))
+            continue
+        chunks = text_splitter.split_documents([doc])
+        for chunk in chunks:
+            chunk.id = chunk_id(chunk.metadata, chunk.page_content)
+        signatures = [hasher.signature(chunk.page_content) for chunk in chunks] if hasher else []
+        results.append(FileChunks(chunks, signatures))
+    return results
+
+
+@dataclass
+class IngestStats:
+    files_read: int = 0
+    chunks: int = 0
+    batches: int = 0
+    retries: int = 0
+    # Depoda zaten bulunduğu için embedding'i ve yüklemesi atlanan parçalar
+    skipped: int = 0
+    # Başka bir dosyadaki parçanın yakın kopyası olduğu için yazılmayan parçalar
+    duplicates: int = 0
+
+
+class IngestPipeline:
+    """
+    Üç aşamalı akış. Her aşama ayrı bir task'tır; kuyruklar dolduğunda üst aşama bekler.
+    Okuma, parçalama ve hash'leme dosya batch'leri halinde executor'a (API'de süreç havuzu)
+    gönderilir; en fazla max_in_flight batch aynı anda işlenir, sonuçlar sırayla alınır.
+    executor verilmezse batch'ler tek bir thread'de sırayla işlenir.
+    Son aşama batch'leri UploadEngine ile eşzamanlı ve hız sınırlı yükler.
+
+    Parçalar deterministik id alır (chunk_id); depo existing_ids sağlıyorsa zaten
+    yazılmış parçalar atlanır, böylece yarıda kalan bir indeksleme kaldığı yerden sürer.
+    Üretilen tüm id'ler chunk_ids'te toplanır (eski satırları silmek için).
+
+    file_filter verilirse yol kuralları taramada, içerik sezgileri okuma sırasında uygulanır;
+    atlanan dosyalar file_filter.report'ta toplanır.
+
+    deduplicator verilirse MinHash imzası olan parçalar geldikçe artımlı LSH'ye eklenir: önceki
+    bir temsilciye benzemeyen parça hemen yüklenir, kopyalar yazılmaz. Kopyası sonradan bulunan
+    temsilci tarama bitince duplicate_sources ile (yeni id'siyle) bir kez daha yazılır, eski
+    satırı delete_stale'de silinir. Önceki indekslemede kopyası olan temsilciler (depodaki
+    kümeler) sona kadar bekletilir; değişmeyen repoda id'leri aynı kalır, yeniden embed edilmez.
+    """
+
+    def __init__(
+        self,
+        vector_store,
+        text_splitter,
+        batch_size: int = 25,
+        queue_size: int = 8,
+        concurrency: int = 4,
+        rate_limiter: Optional[AdaptiveTokenBucket] = None,
+        max_retries: int = 6,
+        base_sleep_seconds: float = 2,
+        job=None,
+        executor: Optional[Executor] = None,
+        file_batch_size: int = 16,
+        max_in_flight: int = 4,
+        file_filter: Optional[FileFilter] = None,
+        deduplicator: Optional[NearDuplicateIndex] = None,
+        hasher: Optional[MinHasher] = None,
+    ):
+        self.vector_store = vector_store
+        self.text_splitter = text_splitter
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.concurrency = concurrency
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.base_sleep_seconds = base_sleep_seconds
+        self.job = job
+        self.executor = executor
+        self.file_batch_size = file_batch_size
+        self.max_in_flight = max_in_flight
+        self.file_filter = file_filter
+        self.deduplicator = deduplicator
+        self.hasher = (hasher or MinHasher.from_settings()) if deduplicator else None
+        # Önceki indekslemede kopyası olan temsilcilerin dosyaları ve kümesi tamamlanana kadar
+        # bekletilen parçaları (id → parça)
+        self._known_representatives: Set[str] = set()
+        self._held: Dict[str, Document] = {}
+        self._dedup_seconds = 0.0
+        self.stats = IngestStats()
+        self.chunk_ids: Set[str] = set()
+
+    async def run(
+        self,
+        root: str,
+        base_metadata: Dict[str, Any],
+        paths: Optional[List[str]] = None,
+    ) -> IngestStats:
+        paths_q: asyncio.Queue = asyncio.Queue(max(self.queue_size, self.file_batch_size))
+        chunks_q: asyncio.Queue = asyncio.Queue(self.batch_size * 2)
+
+        tasks = [
+            asyncio.create_task(self._walk(root, paths, paths_q)),
+            asyncio.create_task(self._process(paths_q, chunks_q, base_metadata)),
+            asyncio.create_task(self._upload(chunks_q)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Bir aşama çökerse diğerleri dolu/boş kuyrukta asılı kalmasın
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return self.stats
+
+    def _check_cancelled(self):
+        if self.job:
+            self.job.check_cancelled()
+
+    async def _walk(self, root: str, paths: Optional[List[str]], out: asyncio.Queue):
+        files = iter_source_files(root, paths, self.file_filter)
+        # Tarama süresi (kuyruk beklemesi hariç) iş başına tek ölçüm olarak kaydedilir
+        walk_seconds = 0.0
+        while True:
+            started = time.perf_counter()
+            item = await asyncio.to_thread(next, files, _DONE)
+            walk_seconds += time.perf_counter() - started
+            if item is _DONE:
+                break
+            self._check_cancelled()
+            await out.put(item)
+        record_stage("walk", walk_seconds)
+        await out.put(_DONE)
+
+    async def _next_files(self, inp: asyncio.Queue) -> Tuple[List[Tuple[str, str]], bool]:
+        """Kuyrukta hazır olan en fazla file_batch_size dosyayı alır; ilk dosyayı bekler."""
+        files: List[Tuple[str, str]] = []
+        item = await inp.get()
+        while item is not _DONE:
+            files.append(item)
+            if len(files) >= self.file_batch_size or inp.empty():
+                return files, False
+            item = inp.get_nowait()
+        return files, True
+
+    async def _process(self, inp: asyncio.Queue, out: asyncio.Queue, base_metadata: Dict[str, Any]):
+        loop = asyncio.get_running_loop()
+        pending: deque = deque()
+        heuristics = self.file_filter.heuristics if self.file_filter else None
+        if self.deduplicator:
+            self._known_representatives = await asyncio.to_thread(self._representative_sources, base_metadata)
+        done = False
+        while not done or pending:
+            # Havuzu dolu tut; sonuçları gönderim sırasıyla tüket
+            while not done and len(pending) < self.max_in_flight:
+                files, done = await self._next_files(inp)
+                if files:
+                    # Okuma + parçalama (havuzda bekleme dahil); sonuç sırası beklemesi sayılmaz
+                    started = time.perf_counter()
+                    future = loop.run_in_executor(
+                        self.executor or _SERIAL_EXECUTOR,
+                        process_files, files, base_metadata, self.text_splitter, heuristics, self.hasher,
+                    )
+                    future.add_done_callback(
+                        lambda _, started=started: record_stage("split", time.perf_counter() - started)
+                    )
+                    pending.append(future)
+            if pending:
+                for result in await pending.popleft():
+                    await self._emit(result, out)
+        if self.deduplicator:
+            await self._emit_representatives(out)
+        await out.put(_DONE)
+
+    async def _emit(self, result: Union[None, FileChunks, SkippedFile], out: asyncio.Queue):
+        if result is None:
+            return
+        if isinstance(result, SkippedFile):
+            self.file_filter.report.add(result)
+            return
+        self.stats.files_read += 1
+        # Aynı dosyada birebir aynı içerikli parçalar tek satır olur (id çakışması)
+        unique = []
+        duplicates = 0
+        started = time.perf_counter()
+        for i, chunk in enumerate(result.chunks):
+            if chunk.id in self.chunk_ids:
+                continue
+            self.chunk_ids.add(chunk.id)
+            signature = result.signatures[i] if result.signatures else None
+            if signature is None:
+                unique.append(chunk)
+            elif self.deduplicator.add(chunk, signature) is not None:
+                # Yakın kopya: yazılmaz, dosyası temsilcinin duplicate_sources listesine girer
+                self.chunk_ids.discard(chunk.id)
+                duplicates += 1
+            elif chunk.metadata.get("source") in self._known_representatives:
+                self._held[chunk.id] = chunk
+            else:
+                unique.append(chunk)
+        if self.deduplicator:
+            self._dedup_seconds += time.perf_counter() - started
+        if duplicates:
+            self.stats.duplicates += duplicates
+            INDEX_CHUNKS.inc(duplicates, result="deduplicated")
+        if self.job:
+            self.job.advance(files_read=1, chunks_total=len(unique))
+        for chunk in unique:
+            await out.put(chunk)
+
+    async def _emit_representatives(self, out: asyncio.Queue):
+        """Tarama bitince kopyası bulunan temsilcileri duplicate_sources ve güncel id'leriyle yükler."""
+        chunks = []
+        for chunk, sources in self.deduplicator.duplicate_sources():
+            self.chunk_ids.discard(chunk.id)
+            if self._held.pop(chunk.id, None) is None:
+                # Kopyasız id'siyle zaten yüklendi (yükleme kuyruğunda da olabilir): kopyası yazılır
+                chunk = Document(page_content=chunk.page_content, metadata=dict(chunk.metadata))
+            chunk.metadata["duplicate_sources"] = sources
+            chunk.id = chunk_id(chunk.metadata, chunk.page_content)
+            self.chunk_ids.add(chunk.id)
+            chunks.append(chunk)
+        # Bu sefer kopyası çıkmayan bekletilmiş temsilciler kopyasız id'leriyle yazılır
+        chunks.extend(self._held.values())
+        self._held = {}
+        record_stage("dedup", self._dedup_seconds)
+        if self.job:
+            self.job.advance(chunks_total=len(chunks))
+        for chunk in chunks:
+            await out.put(chunk)
+
+    def _representative_sources(self, base_metadata: Dict[str, Any]) -> Set[str]:
+        """Depoda kopyası kayıtlı temsilcilerin dosyaları (depo desteklemiyorsa boş)."""
+        representative_sources = getattr(self.vector_store, "representative_sources", None)
+        if representative_sources is None:
+            return set()
+        return representative_sources(base_metadata.get("collection_name"), base_metadata.get("user_id"))
+
+    async def _upload(self, inp: asyncio.Queue):
+        engine = UploadEngine(
+            self.vector_store,
+            self.rate_limiter,
+            concurrency=self.concurrency,
+            max_retries=self.max_retries,
+            base_sleep_seconds=self.base_sleep_seconds,
+            on_uploaded=self._on_uploaded,
+        )
+        try:
+            batch: List[Document] = []
+            while (chunk := await inp.get()) is not _DONE:
+                batch.append(chunk)
+                if len(batch) >= self.batch_size:
+                    await self._submit(engine, batch)
+                    batch = []
+            if batch:
+                await self._submit(engine, batch)
+            await engine.drain()
+        finally:
+            await engine.cancel()
+            self.stats.retries = engine.retries
+
+    async def _submit(self, engine: UploadEngine, batch: List[Document]):
+        self._check_cancelled()
+        existing = await asyncio.to_thread(self._existing_ids, batch)
+        if existing:
+            self.stats.skipped += len(existing)
+            INDEX_CHUNKS.inc(len(existing), result="skipped")
+            if self.job:
+                self.job.advance(chunks_embedded=len(existing), chunks_uploaded=len(existing))
+            batch = [chunk for chunk in batch if chunk.id not in existing]
+        if batch:
+            await engine.submit(batch)
+
+    def _existing_ids(self, batch: List[Document]) -> Set[str]:
+        existing_ids = getattr(self.vector_store, "existing_ids", None)
+        if existing_ids is None:
+            return set()
+        metadata = batch[0].metadata
+        with stage_timer("lookup"):
+            return existing_ids(
+                metadata.get("collection_name"), metadata.get("user_id"), [chunk.id for chunk in batch]
+            )
+
+    def _on_uploaded(self, batch: List[Document]):
+        self.stats.chunks += len(batch)
+        self.stats.batches += 1
+        INDEX_CHUNKS.inc(len(batch), result="uploaded")
+        INDEX_BYTES.inc(sum(len(chunk.page_content.encode("utf-8")) for chunk in batch))
+        if self.job:
+            # add_documents embedding ve yüklemeyi birlikte yapar
+            self.job.advance(chunks_embedded=len(batch), chunks_uploaded=len(batch))
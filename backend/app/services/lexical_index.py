@@ -0,0 +1,262 @@
+"""
+Tanımlayıcı farkındalıklı BM25 ters indeksi. İndeksleme sırasında her parça
+(collection_name, user_id) bazında yerel SQLite dosyasına yazılır; sorguda
+`get_current_user`, `REPO_PROCESSING_LOCK` gibi tam isimler vektör aramasının
+kaçırdığı parçaları bulur. Sonuçlar vektör aramasıyla RRF ile birleştirilir.
+"""
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+from langchain_core.documents import Document
+
+# Unicode harf/rakam/alt çizgi; rakamla başlayan sayılar tek başına terim olmaz
+_IDENTIFIER = re.compile(r"[^\W\d]\w*")
+_CAMEL_PARTS = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+_LOOKUP_BATCH = 500
+
+
+def tokenize_code(text: str) -> List[str]:
+    """
+    Tanımlayıcıyı hem bütün hem parçalarıyla döner:
+    getCurrentUser → getcurrentuser, get, current, user;
+    REPO_PROCESSING_LOCK → repo_processing_lock, repo, processing, lock.
+    """
+    terms = []
+    for identifier in _IDENTIFIER.findall(text):
+        whole = identifier.lower()
+        terms.append(whole)
+        parts = [p.lower() for chunk in identifier.split("_") for p in _CAMEL_PARTS.findall(chunk)]
+        if len(parts) > 1:
+            terms.extend(p for p in parts if len(p) > 1)
+    return terms
+
+
+def reciprocal_rank_fusion(
+    result_lists: Sequence[Sequence[Document]],
+    k: int = 60,
+    key: Optional[Callable[[Document], Hashable]] = None,
+) -> List[Document]:
+    """Her listedeki sıraya göre 1/(k + sıra) puanlarını toplar; puanı yüksek olan önce gelir."""
+    key = key or (lambda doc: (doc.metadata.get("source"), doc.page_content))
+    scores: Dict[Hashable, float] = {}
+    docs: Dict[Hashable, Document] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            doc_key = key(doc)
+            scores[doc_key] = scores.get(doc_key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(doc_key, doc)
+    return [docs[doc_key] for doc_key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class LexicalIndex:
+    """
+    SQLite tabanlı BM25 indeksi (WAL). Tablolar:
+    chunks (parça içeriği, uzunluğu ve vektör deposundaki id'si), postings (terim → parça, tf),
+    collections (hazır repolar).
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("pragma synchronous=normal")
+            conn.execute(
+                "create table if not exists chunks ("
+                " id integer primary key, user_id text not null, collection text not null,"
+                " source text, content text not null, metadata text not null, length integer not null)"
+            )
+            # Eski indeks dosyalarında doc_id kolonu yoktur; bu satırlar ilk yeniden indekslemede silinir
+            columns = {row[1] for row in conn.execute("pragma table_info(chunks)")}
+            if "doc_id" not in columns:
+                conn.execute("alter table chunks add column doc_id text")
+            conn.execute("create index if not exists chunks_source on chunks(user_id, collection, source)")
+            conn.execute("create unique index if not exists chunks_doc_id on chunks(user_id, collection, doc_id)")
+            conn.execute(
+                "create table if not exists postings ("
+                " user_id text not null, collection text not null, term text not null,"
+                " chunk_id integer not null, tf integer not null,"
+                " primary key (user_id, collection, term, chunk_id)) without rowid"
+            )
+            conn.execute(
+                "create table if not exists collections ("
+                " user_id text not null, collection text not null, primary key (user_id, collection))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def add(self, texts: Iterable[str], metadatas: Iterable[dict], ids: Optional[Iterable[str]] = None):
+        """
+        Parçaları indekse ekler; metadata'da collection_name ve user_id olmalıdır.
+        id'si repoda zaten bulunan parça atlanır (id içerikten türetildiği için içerik aynıdır).
+        """
+        texts, metadatas = list(texts), list(metadatas)
+        ids = list(ids) if ids is not None else [None] * len(texts)
+        rows = []
+        for text, metadata, doc_id in zip(texts, metadatas, ids):
+            collection, user_id = metadata.get("collection_name"), metadata.get("user_id")
+            if not collection or not user_id:
+                continue
+            rows.append((user_id, collection, doc_id, text, metadata, Counter(tokenize_code(text))))
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connection()
+            conn.execute("begin")
+            try:
+                for user_id, collection, doc_id, text, metadata, tfs in rows:
+                    cursor = conn.execute(
+                        "insert or ignore into chunks (user_id, collection, doc_id, source, content, metadata, length)"
+                        " values (?, ?, ?, ?, ?, ?, ?)",
+                        (user_id, collection, doc_id, metadata.get("source"), text,
+                         json.dumps(metadata, ensure_ascii=False), sum(tfs.values())),
+                    )
+                    if not cursor.rowcount:
+                        continue
+                    chunk_id = cursor.lastrowid
+                    conn.executemany(
+                        "insert or replace into postings values (?, ?, ?, ?, ?)",
+                        [(user_id, collection, term, chunk_id, tf) for term, tf in tfs.items()],
+                    )
+                    conn.execute("insert or ignore into collections values (?, ?)", (user_id, collection))
+                conn.execute("commit")
+            except Exception:
+                conn.execute("rollback")
+                raise
+
+    def has_collection(self, collection: str, user_id: str) -> bool:
+        with self._lock:
+            row = self._connection().execute(
+                "select 1 from collections where user_id = ? and collection = ?", (user_id, collection)
+            ).fetchone()
+        return row is not None
+
+    def _delete_chunks(self, conn: sqlite3.Connection, where: str, params: list):
+        conn.execute(
+            f"delete from postings where chunk_id in (select id from chunks where {where})", params
+        )
+        conn.execute(f"delete from chunks where {where}", params)
+
+    def delete_collection(self, collection: str, user_id: str):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("begin")
+            self._delete_chunks(conn, "user_id = ? and collection = ?", [user_id, collection])
+            conn.execute("delete from collections where user_id = ? and collection = ?", (user_id, collection))
+            conn.execute("commit")
+
+    def delete_sources(self, collection: str, user_id: str, sources: List[str]):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("begin")
+            for i in range(0, len(sources), _LOOKUP_BATCH):
+                chunk = sources[i:i + _LOOKUP_BATCH]
+                self._delete_chunks(
+                    conn,
+                    f"user_id = ? and collection = ? and source in ({','.join('?' * len(chunk))})",
+                    [user_id, collection, *chunk],
+                )
+            conn.execute("commit")
+
+    def existing_ids(self, collection: str, user_id: str, ids: List[str]) -> Set[str]:
+        found = set()
+        with self._lock:
+            conn = self._connection()
+            for i in range(0, len(ids), _LOOKUP_BATCH):
+                batch = ids[i:i + _LOOKUP_BATCH]
+                found.update(row[0] for row in conn.execute(
+                    "select doc_id from chunks where user_id = ? and collection = ?"
+                    f" and doc_id in ({','.join('?' * len(batch))})",
+                    [user_id, collection, *batch],
+                ))
+        return found
+
+    def delete_stale(self, collection: str, user_id: str, keep_ids: Iterable[str], sources: Optional[List[str]] = None):
+        """id'si keep_ids'te olmayan (veya id'siz eski) parçaları siler; sources verilirse sadece o dosyalarda."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("begin")
+            try:
+                conn.execute("create temp table if not exists keep_ids (doc_id text primary key)")
+                conn.execute("delete from temp.keep_ids")
+                conn.executemany("insert or ignore into temp.keep_ids values (?)", ((i,) for i in keep_ids))
+                stale = "user_id = ? and collection = ? and (doc_id is null or doc_id not in (select doc_id from temp.keep_ids))"
+                if sources is None:
+                    self._delete_chunks(conn, stale, [user_id, collection])
+                else:
+                    for i in range(0, len(sources), _LOOKUP_BATCH):
+                        chunk = sources[i:i + _LOOKUP_BATCH]
+                        self._delete_chunks(
+                            conn,
+                            f"{stale} and source in ({','.join('?' * len(chunk))})",
+                            [user_id, collection, *chunk],
+                        )
+                conn.execute("delete from temp.keep_ids")
+                conn.execute("commit")
+            except Exception:
+                conn.execute("rollback")
+                raise
+
+    def search(self, query: str, collection: str, user_id: str, k: int = 20) -> List[Tuple[Document, float]]:
+        """Sorgu terimleriyle BM25 puanına göre en iyi k parçayı döner."""
+        terms = list(dict.fromkeys(tokenize_code(query)))[:_LOOKUP_BATCH]
+        if not terms:
+            return []
+        with self._lock:
+            conn = self._connection()
+            doc_count, avg_length = conn.execute(
+                "select count(*), coalesce(avg(length), 0) from chunks where user_id = ? and collection = ?",
+                (user_id, collection),
+            ).fetchone()
+            if not doc_count:
+                return []
+            postings = conn.execute(
+                "select term, chunk_id, tf from postings where user_id = ? and collection = ?"
+                f" and term in ({','.join('?' * len(terms))})",
+                [user_id, collection, *terms],
+            ).fetchall()
+            if not postings:
+                return []
+            chunk_ids = list({chunk_id for _, chunk_id, _ in postings})
+            lengths = {}
+            for i in range(0, len(chunk_ids), _LOOKUP_BATCH):
+                batch = chunk_ids[i:i + _LOOKUP_BATCH]
+                lengths.update(conn.execute(
+                    f"select id, length from chunks where id in ({','.join('?' * len(batch))})", batch
+                ).fetchall())
+
+            df = Counter(term for term, _, _ in postings)
+            scores: Dict[int, float] = {}
+            for term, chunk_id, tf in postings:
+                idf = math.log(1 + (doc_count - df[term] + 0.5) / (df[term] + 0.5))
+                norm = 1 - self.b + self.b * lengths.get(chunk_id, 0) / (avg_length or 1)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+
+            top = sorted(scores, key=scores.get, reverse=True)[:k]
+            rows = conn.execute(
+                f"select id, content, metadata from chunks where id in ({','.join('?' * len(top))})", top
+            ).fetchall()
+        by_id = {chunk_id: (content, metadata) for chunk_id, content, metadata in rows}
+        return [
+            (Document(page_content=by_id[cid][0], metadata=json.loads(by_id[cid][1])), scores[cid])
+            for cid in top if cid in by_id
+        ]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
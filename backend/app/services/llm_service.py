@@ -1,16 +1,27 @@
 """
 Google Gemini LLM ve embedding modelleri.
 LangChain üzerinden RAG zinciri için kullanılır.
+Doküman embedding'leri içerik adresli önbellekten geçer (EMBEDDING_CACHE_ENABLED).
 """
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 
 from app.core.config import settings
+from app.services.embedding_cache import CachedEmbeddings, EmbeddingCacheStore
 
-embeddings = GoogleGenerativeAIEmbeddings(
+gemini_embeddings = GoogleGenerativeAIEmbeddings(
     model=settings.EMBEDDING_MODEL,
     google_api_key=settings.GOOGLE_API_KEY,
 )
 
+if settings.EMBEDDING_CACHE_ENABLED:
+    embeddings = CachedEmbeddings(
+        gemini_embeddings,
+        EmbeddingCacheStore(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_MB * 1024 * 1024),
+        namespace=settings.EMBEDDING_MODEL,
+    )
+else:
+    embeddings = gemini_embeddings
+
 llm = ChatGoogleGenerativeAI(
     model=settings.LLM_MODEL,
     temperature=0.7,
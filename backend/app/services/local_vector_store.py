@@ -0,0 +1,400 @@
+"""
+Yerel vektör deposu (VECTOR_BACKEND=local). Her repo (collection_name + user_id) için
+normalize edilmiş vektörler tek bir memory-mapped float16/float32 matriste, içerik ve
+metadata (ve parça id'si) yan dosyada (JSON lines) tutulur. Arama NumPy ile vektörize kosinüs benzerliği
+ve argpartition'dır; veritabanı çağrısı yoktur.
+
+Dizin yapısı: <root>/<hash>/{header.json, vectors.<n>.bin, records.<n>.jsonl, alive.<n>.npy}
+header.json'daki generation (n) hangi dosyaların, count (ve records_bytes) ne kadarının
+görünür olduğunu belirler ve her yazmanın en son adımında atomik olarak değiştirilir;
+yarıda kalan bir eklemenin artıkları sonraki eklemede kesilir. Sıkıştırma yeni bir nesil
+yazar ve header'ı en son değiştirir; yarıda kalırsa eski nesil geçerli kalır, artıklar
+sonraki yazmada silinir. generation 0 eski dosya adlarıdır (vectors.bin ...).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from app.services.hybrid_search import HybridSearchMixin
+from app.services.lexical_index import LexicalIndex
+from app.services.metrics import stage_timer
+from app.services.retrieval_cache import retrieval_cache
+
+# Silinmiş satır oranı bunu aşınca matris yeniden yazılır (sıkıştırma)
+_COMPACT_RATIO = 0.25
+_SCORE_BLOCK_ROWS = 16384
+_GENERATION_FILE = re.compile(r"^(vectors|records|alive)(\.\d+)?\.(bin|jsonl|npy)$")
+
+
+def _files(path: str, generation: int) -> Tuple[str, str, str]:
+    """Bir neslin (vectors, records, alive) dosya yolları."""
+    suffix = f".{generation}" if generation else ""
+    return (
+        os.path.join(path, f"vectors{suffix}.bin"),
+        os.path.join(path, f"records{suffix}.jsonl"),
+        os.path.join(path, f"alive{suffix}.npy"),
+    )
+
+
+def _save_alive(alive_path: str, alive: np.ndarray):
+    # Yerinde yazma yarıda kalırsa header'ın gösterdiği dosya bozulmasın
+    tmp = f"{alive_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, alive)
+    os.replace(tmp, alive_path)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _cosine_scores(matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Satırlar normalize olduğundan kosinüs = nokta çarpım. float16 blok blok float32'ye
+    çevrilir (NumPy'da float16 matris çarpımı BLAS kullanmaz)."""
+    if matrix.dtype == np.float32:
+        return matrix @ query
+    scores = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), _SCORE_BLOCK_ROWS):
+        block = matrix[start:start + _SCORE_BLOCK_ROWS]
+        scores[start:start + len(block)] = block.astype(np.float32) @ query
+    return scores
+
+
+class _Collection:
+    """Diskteki bir koleksiyonun salt okunur görünümü."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "header.json"), encoding="utf-8") as f:
+            header = json.load(f)
+        self.dim = header["dim"]
+        self.count = header["count"]
+        self.dtype = np.dtype(header["dtype"])
+        self.records_bytes = header["records_bytes"]
+        self.generation = header.get("generation", 0)
+        vectors_path, records_path, alive_path = _files(path, self.generation)
+        if self.count:
+            self.matrix = np.memmap(vectors_path, dtype=self.dtype, mode="r", shape=(self.count, self.dim))
+        else:
+            self.matrix = np.empty((0, self.dim), dtype=self.dtype)
+        with open(records_path, encoding="utf-8") as f:
+            self.records = [json.loads(line) for _, line in zip(range(self.count), f)]
+        alive = np.load(alive_path) if os.path.exists(alive_path) else np.ones(0, dtype=bool)
+        self.alive = np.concatenate([alive[:self.count], np.ones(max(0, self.count - len(alive)), dtype=bool)])
+
+
+class LocalVectorStore(HybridSearchMixin, VectorStore):
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        directory: str,
+        dtype: str = "float16",
+        lexical_index: Optional[LexicalIndex] = None,
+    ):
+        self._embedding = embeddings
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.lexical_index = lexical_index
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[int, _Collection]] = {}
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def _path(self, collection_name: str, user_id: str) -> str:
+        digest = hashlib.sha1(f"{user_id}\0{collection_name}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:24])
+
+    def _load(self, path: str) -> Optional[_Collection]:
+        """Koleksiyonu okur; header değişmediyse bellekteki görünüm kullanılır."""
+        try:
+            mtime = os.stat(os.path.join(path, "header.json")).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = self._cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        collection = _Collection(path)
+        self._cache[path] = (mtime, collection)
+        return collection
+
+    def _write_header(
+        self, path: str, dim: int, count: int, dtype: np.dtype, records_bytes: int, generation: int = 0
+    ):
+        tmp = os.path.join(path, f"header.{uuid.uuid4().hex}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "dim": dim, "count": count, "dtype": dtype.name, "records_bytes": records_bytes,
+                "generation": generation,
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(path, "header.json"))
+        self._cache.pop(path, None)
+
+    def _remove_stale_files(self, path: str, generation: int):
+        """Geçerli nesil dışındaki veri dosyalarını ve yarım kalmış .tmp dosyalarını siler (kilit altında)."""
+        current = {os.path.basename(p) for p in _files(path, generation)}
+        for name in os.listdir(path):
+            if name in current or not (name.endswith(".tmp") or _GENERATION_FILE.match(name)):
+                continue
+            try:
+                os.remove(os.path.join(path, name))
+            except OSError:
+                pass  # Windows'ta açık memmap silmeyi engelleyebilir; sonraki yazmada tekrar denenir
+
+    def _append(self, path: str, vectors: np.ndarray, records: List[dict]):
+        """Satırları ekler; aynı id'li canlı satırlar silinmiş işaretlenir (upsert)."""
+        os.makedirs(path, exist_ok=True)
+        current = self._load(path)
+        dim = vectors.shape[1]
+        count, records_bytes, generation = 0, 0, 0
+        dtype = self.dtype
+        if current is not None:
+            generation = current.generation
+            if current.dim != dim:
+                raise ValueError(f"Embedding boyutu uyuşmuyor: {dim} (koleksiyon: {current.dim})")
+            count, dtype, records_bytes = current.count, current.dtype, current.records_bytes
+            alive = current.alive
+            replaced = {r["id"] for r in records if r.get("id")}
+            if replaced:
+                alive = alive & ~np.fromiter(
+                    (r.get("id") in replaced for r in current.records), dtype=bool, count=count
+                )
+        else:
+            alive = np.ones(0, dtype=bool)
+
+        vectors_path, records_path, alive_path = _files(path, generation)
+        # Yarıda kalmış eski bir eklemenin (veya sıkıştırmanın) artıkları kesilir/silinir, sonra eklenir
+        self._remove_stale_files(path, generation)
+        with open(vectors_path, "ab") as f:
+            f.truncate(count * dim * dtype.itemsize)
+            f.write(_normalize(vectors).astype(dtype).tobytes())
+        payload = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+        with open(records_path, "ab") as f:
+            f.truncate(records_bytes)
+            f.write(payload)
+        _save_alive(alive_path, np.concatenate([alive, np.ones(len(records), dtype=bool)]))
+        self._write_header(path, dim, count + len(records), dtype, records_bytes + len(payload), generation)
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        with stage_timer("embed"):
+            vectors = np.asarray(self._embedding.embed_documents(texts), dtype=np.float32)
+
+        groups: Dict[str, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            path = self._path(metadata.get("collection_name", ""), metadata.get("user_id", ""))
+            groups.setdefault(path, []).append(i)
+
+        with stage_timer("upload"), self._lock:
+            for path, rows in groups.items():
+                records = [{"id": ids[i], "content": texts[i], "metadata": metadatas[i]} for i in rows]
+                self._append(path, vectors[rows], records)
+        with stage_timer("lexical"):
+            self._lexical_add(texts, metadatas, ids)
+        return ids
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas)
+        return store
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter, **kwargs)]
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        embedding = retrieval_cache.get_query_embedding(query, self._embedding.embed_query)
+        return self.similarity_search_by_vector_with_relevance_scores(embedding, k, filter, **kwargs)
+
+    async def asimilarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k, filter, **kwargs)]
+
+    async def asimilarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        # Ağ çağrısı (sorgu embedding'i) async; puanlama disk/CPU işi olduğundan thread'de
+        embedding = await retrieval_cache.aget_query_embedding(query, self._embedding.aembed_query)
+        return await asyncio.to_thread(
+            self.similarity_search_by_vector_with_relevance_scores, embedding, k, filter, **kwargs
+        )
+
+    def similarity_search_by_vector_with_relevance_scores(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        """Filtrede collection_name ve user_id zorunludur; diğer anahtarlar metadata ile eşleştirilir."""
+        filter = dict(filter or {})
+        collection_name, user_id = filter.pop("collection_name", None), filter.pop("user_id", None)
+        if collection_name is None or user_id is None:
+            return []
+        collection = self._load(self._path(collection_name, user_id))
+        if collection is None or not collection.count:
+            return []
+
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        scores = _cosine_scores(collection.matrix, query)
+        valid = collection.alive.copy()
+        if filter:
+            valid &= np.fromiter(
+                (all(r["metadata"].get(key) == value for key, value in filter.items()) for r in collection.records),
+                dtype=bool,
+                count=collection.count,
+            )
+        threshold = kwargs.get("score_threshold")
+        if threshold is not None:
+            valid &= scores >= threshold
+        candidates = int(valid.sum())
+        if not candidates:
+            return []
+
+        scores = np.where(valid, scores, -np.inf)
+        k = min(k, candidates)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (
+                Document(page_content=collection.records[i]["content"], metadata=collection.records[i]["metadata"]),
+                float(scores[i]),
+            )
+            for i in top
+        ]
+
+    def delete_collection(self, collection_name: str, user_id: str):
+        path = self._path(collection_name, user_id)
+        try:
+            with self._lock:
+                self._cache.pop(path, None)
+                shutil.rmtree(path, ignore_errors=True)
+            self._lexical_delete(collection_name, user_id)
+        finally:
+            retrieval_cache.invalidate(collection_name, user_id)
+
+    def delete_sources(self, collection_name: str, user_id: str, sources: List[str], batch_size: int = 100):
+        """Dosyalara ait satırları siler (işaretler); silinenler çoğalınca matris sıkıştırılır."""
+        targets = set(sources)
+        try:
+            self._remove_where(collection_name, user_id, lambda r: r["metadata"].get("source") in targets)
+            self._lexical_delete(collection_name, user_id, sources)
+        finally:
+            retrieval_cache.invalidate(collection_name, user_id)
+
+    def _existing_vector_ids(self, collection_name: str, user_id: str, ids: List[str]) -> Set[str]:
+        collection = self._load(self._path(collection_name, user_id))
+        if collection is None:
+            return set()
+        wanted = set(ids)
+        return {
+            r["id"] for r, alive in zip(collection.records, collection.alive) if alive and r.get("id") in wanted
+        }
+
+    def _duplicate_groups(self, collection_name: str, user_id: str) -> List[Tuple[str, List[str]]]:
+        collection = self._load(self._path(collection_name, user_id))
+        if collection is None:
+            return []
+        return [
+            (r["metadata"].get("source"), r["metadata"]["duplicate_sources"])
+            for r, alive in zip(collection.records, collection.alive)
+            if alive and r["metadata"].get("duplicate_sources")
+        ]
+
+    def _delete_stale_vectors(
+        self, collection_name: str, user_id: str, keep_ids: List[str], sources: Optional[List[str]]
+    ) -> int:
+        keep = set(keep_ids)
+        targets = set(sources) if sources is not None else None
+        return self._remove_where(
+            collection_name,
+            user_id,
+            lambda r: r.get("id") not in keep and (targets is None or r["metadata"].get("source") in targets),
+        )
+
+    def _remove_where(self, collection_name: str, user_id: str, predicate: Callable[[dict], bool]) -> int:
+        """predicate'i sağlayan canlı satırları silinmiş işaretler; silinen sayısını döner."""
+        path = self._path(collection_name, user_id)
+        with self._lock:
+            collection = self._load(path)
+            if collection is None or not collection.count:
+                return 0
+            removed = collection.alive & np.fromiter(
+                (predicate(r) for r in collection.records), dtype=bool, count=collection.count
+            )
+            if not removed.any():
+                return 0
+            alive = collection.alive & ~removed
+            if (~alive).sum() > _COMPACT_RATIO * collection.count:
+                self._compact(path, collection, alive)
+            else:
+                _save_alive(_files(path, collection.generation)[2], alive)
+                self._write_header(
+                    path, collection.dim, collection.count, collection.dtype, collection.records_bytes,
+                    collection.generation,
+                )
+        return int(removed.sum())
+
+    def _compact(self, path: str, collection: _Collection, alive: np.ndarray):
+        """Canlı satırları yeni nesle yazar; header değişene kadar eski nesil geçerlidir."""
+        keep = np.flatnonzero(alive)
+        generation = collection.generation + 1
+        self._remove_stale_files(path, collection.generation)
+        vectors_path, records_path, alive_path = _files(path, generation)
+        payload = "".join(json.dumps(collection.records[i], ensure_ascii=False) + "\n" for i in keep).encode("utf-8")
+        for file_path, data in (
+            (vectors_path, np.asarray(collection.matrix[keep]).tobytes()),
+            (records_path, payload),
+        ):
+            with open(file_path, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        _save_alive(alive_path, np.ones(len(keep), dtype=bool))
+        self._write_header(path, collection.dim, len(keep), collection.dtype, len(payload), generation)
+        # Açık memmap Windows'ta eski dosyanın silinmesini engeller
+        del collection.matrix
+        self._remove_stale_files(path, generation)
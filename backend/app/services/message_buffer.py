@@ -0,0 +1,209 @@
+"""
+Sohbet mesajları için write-behind tampon: /chat/save, /chat/save/batch ve /chat/ask
+mesajları kuyruğa alır, arka plan thread'i istekler arası biriken satırları tek bir
+toplu insert ile chat_messages tablosuna yazar. Yazma en geç flush_interval saniye
+gecikir; batch_size dolunca beklemeden, kapanışta ve geçmiş okunmadan önce hemen yapılır.
+
+Toplu insert üst üste hata verirse satırlar tek tek denenir: aynı turda başka satır yazılabildiyse
+(veritabanı erişilebilir) reddedilen satır kalıcı hatalıdır ve dead_letters'a alınır, kuyruğu
+tıkamaz. Hiçbiri yazılamazsa satırlar kuyruğa döner ve worker üstel artan sürelerle bekler.
+"""
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.resources import resources
+
+
+class MessageWriteBuffer:
+    def __init__(
+        self,
+        write: Callable[[List[Dict[str, str]]], None],
+        flush_interval: float = 1.0,
+        batch_size: int = 100,
+        max_pending: int = 10000,
+        max_backoff: float = 60.0,
+    ):
+        self.write = write
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_backoff = max_backoff
+        self.written = 0
+        self.dropped = 0
+        # Veritabanı erişilebilirken reddedilen son mesajlar, inceleme için
+        self.dead_letters: Deque[Dict[str, Any]] = deque(maxlen=100)
+        self.dead_lettered = 0
+        # Art arda başarısız flush sayısı; worker'ın bekleme süresini belirler
+        self._failures = 0
+        self._pending: Deque[Dict[str, str]] = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def add(self, user_id: str, repo_name: str, role: str, content: str):
+        """
+        Mesajı kuyruğa alır. created_at burada atanır: aynı toplu insert'teki
+        mesajlar da gönderildikleri sırayla okunur.
+        """
+        self.add_many([{"user_id": user_id, "repo_name": repo_name, "role": role, "content": content}])
+
+    def add_many(self, messages: List[Dict[str, str]]):
+        now = datetime.now(timezone.utc)
+        with self._cond:
+            for offset, message in enumerate(messages):
+                # Aynı anda gelen mesajlar mikro saniye farkıyla sıralı kalır
+                created_at = now.timestamp() + offset / 1_000_000
+                self._pending.append({
+                    # Postgres text kolonları NUL karakterini kabul etmez
+                    **{k: v.replace("\x00", "") if isinstance(v, str) else v for k, v in message.items()},
+                    "created_at": datetime.fromtimestamp(created_at, timezone.utc).isoformat(),
+                })
+            self._trim()
+            self._ensure_worker()
+            self._cond.notify()
+
+    def has_pending(self, user_id: str, repo_name: str) -> bool:
+        with self._cond:
+            return any(m["user_id"] == user_id and m["repo_name"] == repo_name for m in self._pending)
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def flush(self):
+        """Bekleyen tüm mesajları batch_size'lık toplu insert'lerle yazar."""
+        # Aynı anda iki flush satırları farklı sırayla yazmasın
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                if not batch:
+                    return
+                try:
+                    self.write(batch)
+                    self.written += len(batch)
+                    self._failures = 0
+                except Exception as e:
+                    print(f"Mesaj toplu kayıt hatası ({len(batch)} mesaj): {e}")
+                    # İlk hata geçici sayılır (batch bütün olarak tekrar denenir); üst üste
+                    # ikinci hatada satırlar tek tek yazılarak bozuk satır ayıklanır
+                    if not self._failures:
+                        self._failures = 1
+                        self._requeue(batch)
+                        return
+                    if not self._write_one_by_one(batch):
+                        self._failures += 1
+                        return
+                    self._failures = 0
+
+    def _write_one_by_one(self, batch: List[Dict[str, str]]) -> bool:
+        """
+        Satırları tek tek yazar; en az biri yazıldıysa (veritabanı erişilebilir) reddedilenler
+        dead letter olur ve True döner. Hiçbiri yazılamadıysa hepsi kuyruğa döner.
+        """
+        failed = []
+        for message in batch:
+            try:
+                self.write([message])
+                self.written += 1
+            except Exception as e:
+                failed.append((message, e))
+        if len(failed) == len(batch):
+            # Tek başına kalan bozuk satır da burada bekler; yeni mesajlarla aynı batch'e
+            # düştüğünde diğerleri yazılınca ayıklanır
+            self._requeue(batch)
+            return False
+        for message, error in failed:
+            self._dead_letter(message, error)
+        return True
+
+    def _dead_letter(self, message: Dict[str, str], error: Exception):
+        self.dead_lettered += 1
+        self.dead_letters.append({**message, "error": str(error)})
+        print(f"Mesaj kaydedilemedi, atlanıyor ({message.get('user_id')}/{message.get('repo_name')}): {error}")
+
+    def _requeue(self, batch: List[Dict[str, str]]):
+        # Başarısız satırlar başa döner; tampon sınırı aşılırsa en eski mesajlar atılır
+        with self._cond:
+            self._pending.extendleft(reversed(batch))
+            self._trim()
+
+    def backoff_seconds(self) -> float:
+        """Art arda başarısız flush'lardan sonra bir sonraki denemeye kadar beklenecek süre."""
+        if not self._failures:
+            return 0.0
+        return min(self.max_backoff, max(self.flush_interval, 0.1) * 2 ** (self._failures - 1))
+
+    def _trim(self):
+        # _cond tutulurken çağrılır; veritabanı uzun süre erişilemezse bellek sınırlı kalır
+        while len(self._pending) > self.max_pending:
+            self._pending.popleft()
+            self.dropped += 1
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._stopping = False
+            self._worker = threading.Thread(target=self._run, name="chat-message-writer", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # Boşken süresiz bekler; ilk mesajdan itibaren en fazla flush_interval bekler
+                while not self._stopping and not self._pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.flush_interval
+                while not self._stopping and len(self._pending) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                # Veritabanı erişilemiyorsa dolu kuyruk da bekler (sıkı yeniden deneme döngüsü olmaz)
+                backoff_deadline = time.monotonic() + self.backoff_seconds()
+                while not self._stopping:
+                    remaining = backoff_deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+    def shutdown(self, timeout: float = 10.0):
+        """Worker'ı durdurur ve kalan mesajları yazar."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
+        self.flush()
+        with self._cond:
+            self._worker = None
+            self._stopping = False
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self.pending_count(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "dead_lettered": self.dead_lettered,
+        }
+
+
+def _insert_messages(rows: List[Dict[str, str]]):
+    resources.supabase.table("chat_messages").insert(rows).execute()
+
+
+message_buffer = MessageWriteBuffer(
+    _insert_messages,
+    flush_interval=settings.CHAT_SAVE_FLUSH_SECONDS,
+    batch_size=settings.CHAT_SAVE_BATCH_SIZE,
+    max_pending=settings.CHAT_SAVE_MAX_PENDING,
+)
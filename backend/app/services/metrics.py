@@ -0,0 +1,230 @@
+"""
+Süreç içi metrikler: aşama süreleri (histogram) ve sayaçlar, Prometheus metin formatında
+/metrics'ten okunur. stage_timer ile ölçülen her aşama ayrıca o anki toplayıcıya
+(StageTimings) eklenir: HTTP isteğinde Server-Timing başlığına, indeksleme işinde
+sonuçtaki "timings" alanına yazılır. Toplayıcı contextvar'dadır; asyncio task'ları ve
+asyncio.to_thread ile açılan thread'ler onu devralır.
+Her worker kendi metriklerini tutar (gunicorn'da worker başına ayrı değerler).
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Saniye; indeksleme aşamaları dakikalar sürebilir
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self.samples()])
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_labels(self.labelnames, key)} {value}" for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # etiketler → (kova sayaçları, toplam, adet)
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            counts, _, _ = state = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels: str) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    le = _labels(self.labelnames, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {bucket_count}")
+                le = _labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Değeri okuma anında fonksiyondan alınır (kuyruk uzunluğu, önbellek boyutu)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.read = read
+
+    def samples(self) -> List[str]:
+        try:
+            return [f"{self.name} {float(self.read())}"]
+        except Exception:
+            return []
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        # Aynı isim tekrar kaydedilirse (modül yeniden yüklenmesi) mevcut metrik döner
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), **kwargs) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(name, documentation, read))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "repo_analyst_stage_duration_seconds", "Aşama süresi (auth, retrieval, clone, embed, upload...).", ("stage",)
+)
+HTTP_SECONDS = registry.histogram(
+    "repo_analyst_http_request_duration_seconds",
+    "Yanıt başlıkları gönderilene kadar geçen süre.",
+    ("method", "route", "status"),
+)
+INDEX_CHUNKS = registry.counter(
+    "repo_analyst_index_chunks_total", "İndekslenen parçalar (uploaded, skipped, deleted).", ("result",)
+)
+INDEX_BYTES = registry.counter("repo_analyst_index_bytes_total", "Embedding'e gönderilen parça baytları.")
+INDEX_SKIPPED_FILES = registry.counter(
+    "repo_analyst_index_skipped_files_total", "Dosya filtresine takılan dosyalar.", ("reason",)
+)
+INDEX_SKIPPED_BYTES = registry.counter(
+    "repo_analyst_index_skipped_bytes_total", "Dosya filtresi sayesinde okunmayan/gönderilmeyen baytlar.", ("reason",)
+)
+INDEX_JOBS = registry.counter("repo_analyst_index_jobs_total", "Biten indeksleme işleri.", ("status",))
+EMBED_RETRIES = registry.counter("repo_analyst_embedding_retries_total", "Tekrar denenen embedding batch'leri.")
+EMBED_THROTTLED = registry.counter("repo_analyst_embedding_throttled_total", "Gemini 429/RESOURCE_EXHAUSTED yanıtları.")
+ANSWER_CACHE = registry.counter("repo_analyst_answer_cache_total", "Cevap önbelleği sonuçları (hit, miss).", ("result",))
+
+
+class StageTimings:
+    """Bir istek veya iş boyunca aşama başına toplam süre ve çağrı sayısı."""
+
+    def __init__(self):
+        self._stages: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            entry = self._stages.setdefault(stage, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def as_dict(self) -> Dict[str, float]:
+        """Aşama → toplam saniye (eşzamanlı aşamalarda toplam duvar saatini aşabilir)."""
+        with self._lock:
+            return {stage: round(seconds, 4) for stage, (seconds, _) in self._stages.items()}
+
+    def header(self, total: Optional[float] = None) -> str:
+        """Server-Timing başlık değeri (ms)."""
+        with self._lock:
+            parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, (seconds, _) in self._stages.items()]
+        if total is not None:
+            parts.append(f"app;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current_timings: ContextVar[Optional[StageTimings]] = ContextVar("stage_timings", default=None)
+
+
+def record_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Bloğun süresini histogram'a ve varsa geçerli toplayıcıya ekler (hata olsa da)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+@contextmanager
+def collect_timings(timings: Optional[StageTimings] = None) -> Iterator[StageTimings]:
+    """Blok içinde (ve içinde açılan task/thread'lerde) ölçülen aşamaları toplar."""
+    timings = timings if timings is not None else StageTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
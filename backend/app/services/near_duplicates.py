@@ -0,0 +1,139 @@
+"""
+Yakın kopya parçaların indeksleme sırasında elenmesi: lisans başlıkları, kopyalanmış
+modüller, vendored kopyalar ve üretilmiş kalıp kod her dosyada ayrı ayrı embed edilmez.
+
+Her parçanın kelime shingle'larından MinHash imzası çıkarılır (süreç havuzunda, parçalamayla
+birlikte); imzalar LSH bantlarıyla kovalanır ve aynı kovaya düşen adayların tahmini Jaccard
+benzerliği eşiği geçerse parça kümenin temsilcisine bağlanır. Küme başına tek parça
+(tarama sırasında ilk görülen; tarama sıralı olduğundan her indekslemede aynısı) yazılır;
+diğer dosyalar temsilcinin metadata.duplicate_sources listesinde tutulur.
+"""
+import re
+import zlib
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config import settings
+
+_TOKEN = re.compile(r"\w+")
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+_LOW_29_BITS = np.uint64((1 << 29) - 1)
+
+
+@lru_cache(maxsize=4)
+def _permutations(num_perm: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(a, b) katsayıları; h(x) = (a·x + b) mod p. Her süreçte aynı seed ile aynı değerler."""
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def _hash_values(a: np.ndarray, b: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+    """(a·x + b) mod p, uint64 taşması olmadan (a, b < p = 2^61 - 1; x < 2^32).
+
+    a, 32 bitlik yarılara ayrılır: a_lo·x < 2^64 ve a_hi·x < 2^61 taşmaz. a_hi·x·2^32 terimi
+    2^61 ≡ 1 (mod p) eşitliğiyle indirgenir: t = t_hi·2^29 + t_lo ise t·2^32 ≡ t_hi + t_lo·2^32.
+    """
+    x = hashes[None, :]
+    low = (a & _MAX_HASH)[:, None] * x % _MERSENNE_PRIME
+    t = (a >> np.uint64(32))[:, None] * x
+    high = (t >> np.uint64(29)) + ((t & _LOW_29_BITS) << np.uint64(32))
+    return (low + high + b[:, None]) % _MERSENNE_PRIME
+
+
+@dataclass(frozen=True)
+class MinHasher:
+    """Parça metninden MinHash imzası; süreç havuzuna pickle edilerek gönderilir."""
+
+    num_perm: int = 128
+    shingle_size: int = 5
+    min_tokens: int = 30
+    seed: int = 1
+
+    @classmethod
+    def from_settings(cls) -> "MinHasher":
+        return cls(num_perm=settings.DEDUP_NUM_PERM, min_tokens=settings.DEDUP_MIN_TOKENS)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """Kısa parçalar (min_tokens altı) için None: az shingle'la benzerlik tahmini güvenilmez."""
+        tokens = _TOKEN.findall(text.lower())
+        if len(tokens) < max(self.min_tokens, self.shingle_size):
+            return None
+        size = self.shingle_size
+        shingles = {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        a, b = _permutations(self.num_perm, self.seed)
+        values = _hash_values(a, b, hashes) & _MAX_HASH
+        return values.min(axis=1).astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    """
+    Artımlı LSH: imza bands parçaya bölünür, herhangi bir bandı aynı olan temsilciler adaydır.
+    Sadece temsilciler kovalara eklenir; kümeler temsilci etrafında yıldız biçimindedir.
+    Aynı dosyadaki benzer parçalar (ör. birbirine benzeyen fonksiyonlar) birleştirilmez.
+    Parçalar geldikçe eklenir (add); önceki bir temsilciye benzemeyen parça hemen
+    temsilci olur, böylece indeksleme tarama bitmeden yüklemeye başlayabilir.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError("num_perm, bands'e tam bölünmelidir.")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._representatives: List[Document] = []
+        self._signatures: List[np.ndarray] = []
+        self._duplicate_sources: List[set] = []
+
+    @classmethod
+    def from_settings(cls) -> "NearDuplicateIndex":
+        return cls(
+            threshold=settings.DEDUP_THRESHOLD, num_perm=settings.DEDUP_NUM_PERM, bands=settings.DEDUP_BANDS
+        )
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, chunk: Document, signature: np.ndarray) -> Optional[Document]:
+        """
+        Parça daha önce eklenmiş bir temsilcinin yakın kopyasıysa o temsilciyi döner (kopyanın
+        kaynağı temsilcinin kümesine yazılır); değilse parça temsilci olur ve None döner.
+        """
+        source = chunk.metadata.get("source")
+        keys = self._band_keys(signature)
+        candidates = {rep for band, key in enumerate(keys) for rep in self._buckets[band].get(key, ())}
+        best, best_score = None, 0.0
+        for rep in sorted(candidates):
+            if self._representatives[rep].metadata.get("source") == source:
+                continue
+            score = float(np.mean(self._signatures[rep] == signature))
+            if score >= self.threshold and score > best_score:
+                best, best_score = rep, score
+        if best is not None:
+            self._duplicate_sources[best].add(source)
+            return self._representatives[best]
+        index = len(self._representatives)
+        self._representatives.append(chunk)
+        self._signatures.append(signature)
+        self._duplicate_sources.append(set())
+        for band, key in enumerate(keys):
+            self._buckets[band].setdefault(key, []).append(index)
+        return None
+
+    def duplicate_sources(self) -> List[Tuple[Document, List[str]]]:
+        """Kopyası bulunan temsilciler ve kopya dosyaları (sıralı)."""
+        return [
+            (chunk, sorted(sources))
+            for chunk, sources in zip(self._representatives, self._duplicate_sources)
+            if sources
+        ]
@@ -4,27 +4,39 @@ RAG servisi: Repo clone, kod parçalama, embedding, Supabase'e yükleme.
 import os
 import shutil
 import time
-from git import Repo
-from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from supabase import create_client, Client
+import uuid
+from supabase import Client
 
 from app.core.config import settings
-from app.services.custom_supabase import CustomSupabaseVectorStore
-from app.services.llm_service import embeddings
+from app.services.code_chunker import CodeChunker
+from app.services.file_filter import FileFilter
+from app.services.git_service import GitService
+from app.services.ingest_pipeline import IngestPipeline
+from app.services.metrics import INDEX_CHUNKS, stage_timer
+from app.services.near_duplicates import NearDuplicateIndex
+from app.services.resources import is_missing_column, resources
+from app.services.upload_engine import AdaptiveTokenBucket
 from fastapi import HTTPException
 
 
 class RAGService:
     def __init__(self):
-        self.supabase: Client = create_client(
-            settings.SUPABASE_URL, 
-            settings.SUPABASE_SERVICE_ROLE_KEY
-        )
-        self.vector_store = CustomSupabaseVectorStore(
-            embeddings=embeddings
+        # Gemini kotası API anahtarı başına; eşzamanlı tüm indeksleme işleri aynı bucket'ı kullanır
+        self.embedding_rate_limiter = AdaptiveTokenBucket(
+            rate=settings.EMBED_RATE_PER_SEC,
+            min_rate=settings.EMBED_RATE_MIN,
+            max_rate=settings.EMBED_RATE_MAX,
+            increase=settings.EMBED_RATE_INCREASE,
         )
 
+    @property
+    def supabase(self) -> Client:
+        return resources.supabase
+
+    @property
+    def vector_store(self):
+        return resources.vector_store
+
     def cleanup_temp_repo(self, repo_path: str):
         """Geçici repo dizinini siler. Windows salt-okunur dosyalar için retry kullanır."""
         if not os.path.exists(repo_path):
@@ -51,131 +63,179 @@ class RAGService:
                 else:
                     print(f"⚠️ UYARI: Dosya kilitli kaldı, silinemedi. Sorun yok, devam ediliyor. Hata: {e}")
 
-    async def index_repository(self, repo_url: str, user_id: str):
+    def get_indexed_repo(self, user_id: str, repo_name: str):
+        """user_repos kaydını (indexed_commit dahil) döner; yoksa None."""
+        with stage_timer("user_repos"):
+            existing = self.supabase.table("user_repos").select("*").match({
+                "user_id": user_id,
+                "repo_name": repo_name
+            }).execute()
+        return existing.data[0] if existing.data else None
+
+    def save_indexed_repo(self, user_id: str, repo_name: str, repo_url: str, commit, exists: bool):
+        """
+        user_repos kaydını oluşturur veya indexed_commit'i günceller.
+        indexed_commit kolonu yoksa (migrations/001 çalıştırılmamış) kayıt kolonsuz oluşturulur;
+        repo listede görünür ama her indeksleme tam yapılır.
+        """
+        row = {"user_id": user_id, "repo_name": repo_name}
+        with stage_timer("user_repos"):
+            try:
+                if exists:
+                    self.supabase.table("user_repos").update({"indexed_commit": commit}).match(row).execute()
+                else:
+                    self.supabase.table("user_repos").insert({
+                        **row, "repo_url": repo_url, "indexed_commit": commit
+                    }).execute()
+            except Exception as e:
+                if not is_missing_column(e, "indexed_commit"):
+                    raise
+                print(
+                    "⚠️ UYARI: user_repos.indexed_commit kolonu yok, artımlı indeksleme kapalı. "
+                    "supabase/migrations/001_user_repos_indexed_commit.sql çalıştırılmalı."
+                )
+                if not exists:
+                    self.supabase.table("user_repos").insert({**row, "repo_url": repo_url}).execute()
+
+    async def index_repository(self, repo_url: str, user_id: str, job=None):
         """
         GitHub reposunu indirir, parçalar ve Supabase'e yükler.
+        Repo daha önce indekslendiyse sadece son indekslenen commit'ten bu yana değişen
+        dosyalar yeniden işlenir (artımlı indeksleme).
+        job verilirse ilerleme sayaçları güncellenir ve iptal istekleri kontrol edilir.
         """
         repo_name = repo_url.split("/")[-1].replace(".git", "")
-        temp_dir = os.path.join(settings.TEMP_REPO_DIR, repo_name)
+        # Eşzamanlı işler (aynı isimli farklı repolar) çakışmasın diye benzersiz dizin
+        temp_dir = os.path.join(settings.TEMP_REPO_DIR, f"{repo_name}-{uuid.uuid4().hex[:8]}")
         
         # Temizlik
         self.cleanup_temp_repo(temp_dir)
 
         try:
-            Repo.clone_from(repo_url, temp_dir)
+            record = self.get_indexed_repo(user_id, repo_name)
+            previous_commit = record.get("indexed_commit") if record else None
+            if previous_commit and not self.vector_store.lexical_ready(repo_name, user_id):
+                # BM25 indeksi henüz yok (eski kayıt): bir kez tam indeksle, embedding'ler önbellekten gelir
+                previous_commit = None
+
+            with stage_timer("clone"):
+                clone = GitService.clone_repository(repo_url, temp_dir)
+            print(
+                f"--- Klonlandı: {repo_name} ({clone.file_count} dosya, "
+                f"{clone.bytes_transferred / 1024:.0f} KB indirildi, {clone.duration_seconds:.2f}s) ---"
+            )
+            if job:
+                job.check_cancelled()
 
-            docs = []
-            
-            for root, dirs, files in os.walk(temp_dir):
-                if '.git' in dirs: dirs.remove('.git')
-                if '.github' in dirs: dirs.remove('.github')
-                if '__pycache__' in dirs: dirs.remove('__pycache__')
-                
-                for file in files:
-                    if file.endswith(('.py', '.js', '.ts', '.tsx', '.java', '.cpp', '.h', '.cs', '.php', '.html', '.css', '.md', '.json')):
-                        file_path = os.path.join(root, file)
-                        try:
-                            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                                content = f.read()
-                                if not content.strip():
-                                    continue
-                                    
-                                relative_path = os.path.relpath(file_path, temp_dir)
-                                
-                                docs.append(Document(
-                                    page_content=content,
-                                    metadata={
-                                        "source": relative_path,
-                                        "file_name": file,
-                                        "collection_name": repo_name,
-                                        "user_id": user_id 
-                                    }
-                                ))
-                        except Exception as e:
-                            print(f"Dosya okuma hatası ({file}): {e}")
-
-            # Kodları anlamlı parçalara böl
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=2000,
-                chunk_overlap=200
+            result = {
+                "status": "success",
+                "repo_name": repo_name,
+                "commit": clone.commit,
+                "clone": clone.to_dict(),
+            }
+
+            if previous_commit == clone.commit:
+                return {
+                    **result,
+                    "message": f"{repo_name} zaten güncel.",
+                    "mode": "unchanged",
+                    "total_chunks": 0,
+                }
+
+            diff = None
+            if previous_commit:
+                try:
+                    with stage_timer("diff"):
+                        diff = GitService.diff_commits(temp_dir, previous_commit, clone.commit)
+                except Exception as e:
+                    print(f"Artımlı indeksleme yapılamadı, tam indekslemeye geçiliyor: {e}")
+            if diff is not None and diff.rules_changed and settings.INDEX_FILE_FILTER_ENABLED:
+                # Değişmeyen dosyalar da artık atlanabilir (veya tersi): seçim baştan yapılır
+                print("--- .gitignore/.gitattributes değişti, tam indekslemeye geçiliyor ---")
+                diff = None
+            incremental = diff is not None
+            paths = sources = None
+            if incremental:
+                paths, sources = list(diff.upserted), diff.touched
+                if settings.DEDUP_ENABLED:
+                    # Değişen dosyalarla yakın kopya kümesi paylaşan dosyalar da yeniden kümelenir
+                    linked = sorted(self.vector_store.linked_sources(repo_name, user_id, sources))
+                    paths += linked
+                    sources = sorted(set(sources) | set(linked))
+
+            # Eski satırlar önceden silinmez: parça id'leri deterministik olduğundan değişmeyen
+            # parçalar atlanır, kalanlar upsert edilir ve sonda eskiler tek seferde silinir.
+            if not incremental and record and record.get("indexed_commit"):
+                # Tam indeksleme yarıda kalırsa sonraki deneme artımlı sanmasın
+                self.save_indexed_repo(user_id, repo_name, repo_url, None, exists=True)
+
+            # Kodları sözdizimi sınırlarında, token bütçesiyle parçala
+            text_splitter = CodeChunker(
+                max_tokens=settings.CHUNK_MAX_TOKENS,
+                overlap_tokens=settings.CHUNK_OVERLAP_TOKENS,
+                encoding_name=settings.TOKENIZER_ENCODING,
             )
-            splits = text_splitter.split_documents(docs)
 
-            # Aynı repo için önceki vektörleri temizle
-            try:
-                self.supabase.table("documents").delete().match({
-                    "metadata->>collection_name": repo_name,
-                    "metadata->>user_id": user_id 
-                }).execute()
-            except Exception as e:
-                print(f"Temizlik uyarısı: {e}")
-
-            # Batch yükleme: Gemini rate limit'e takılmamak için küçük parçalarla
-            batch_size = 25
-            max_retries = 6
-            base_sleep_seconds = 2
-
-            def is_quota_error(err: Exception) -> bool:
-                msg = str(err)
-                return (
-                    "RESOURCE_EXHAUSTED" in msg
-                    or "429" in msg
-                    or "quota" in msg.lower()
-                    or "rate limit" in msg.lower()
+            # Lock, vendored, minified ve üretilmiş dosyalar embedding'e gönderilmez
+            file_filter = FileFilter(temp_dir) if settings.INDEX_FILE_FILTER_ENABLED else None
+
+            # Tarama, okuma + parçalama (süreç havuzu) ve yükleme sınırlı kuyruklarla eşzamanlı ilerler
+            pipeline = IngestPipeline(
+                self.vector_store,
+                text_splitter,
+                batch_size=settings.INGEST_BATCH_SIZE,
+                queue_size=settings.INGEST_QUEUE_SIZE,
+                concurrency=settings.EMBED_CONCURRENCY,
+                rate_limiter=self.embedding_rate_limiter,
+                job=job,
+                executor=resources.cpu_pool,
+                file_batch_size=settings.INDEX_FILE_BATCH_SIZE,
+                max_in_flight=resources.cpu_workers * 2,
+                file_filter=file_filter,
+                deduplicator=NearDuplicateIndex.from_settings() if settings.DEDUP_ENABLED else None,
+            )
+            stats = await pipeline.run(
+                temp_dir,
+                {"collection_name": repo_name, "user_id": user_id},
+                paths=paths,
+            )
+
+            # Bu indekslemede üretilmeyen parçalar (değişen/silinen dosyalar, eski id'ler) silinir.
+            # Önbellekteki ara sonuçlar da burada geçersiz olur.
+            with stage_timer("delete_stale"):
+                stale = self.vector_store.delete_stale(
+                    repo_name, user_id, pipeline.chunk_ids, sources=sources
                 )
+            INDEX_CHUNKS.inc(stale, result="deleted")
 
-            for i in range(0, len(splits), batch_size):
-                batch = splits[i:i+batch_size]
-                attempt = 0
-                while True:
-                    try:
-                        self.vector_store.add_documents(batch)
-                        break
-                    except Exception as e:
-                        attempt += 1
-                        if is_quota_error(e) and attempt < max_retries:
-                            sleep_s = min(60, base_sleep_seconds * (2 ** (attempt - 1)))
-                            print(
-                                f"⚠️ Gemini kota/rate limit (429). {sleep_s}s beklenip tekrar denenecek... "
-                                f"(deneme {attempt}/{max_retries-1})"
-                            )
-                            time.sleep(sleep_s)
-                            continue
-                        raise
-
-            # user_repos tablosuna kayıt
+            # user_repos tablosuna kayıt (indekslenen commit ile)
             try:
-                existing = self.supabase.table("user_repos").select("*").match({
-                    "user_id": user_id, 
-                    "repo_name": repo_name
-                }).execute()
-                
-                if not existing.data:
-                    self.supabase.table("user_repos").insert({
-                        "user_id": user_id,
-                        "repo_name": repo_name,
-                        "repo_url": repo_url
-                    }).execute()
+                self.save_indexed_repo(user_id, repo_name, repo_url, clone.commit, exists=bool(record))
             except Exception as e:
                 print(f"Tablo kayıt hatası: {e}")
 
-            return {
-                "status": "success",
+            result.update({
                 "message": f"{repo_name} başarıyla indekslendi.",
-                "total_chunks": len(splits),
-                "repo_name": repo_name
-            }
+                "mode": "incremental" if incremental else "full",
+                "total_chunks": stats.chunks + stats.skipped,
+                "skipped_chunks": stats.skipped,
+                "deleted_chunks": stale,
+                "duplicate_chunks": stats.duplicates,
+            })
+            if file_filter is not None:
+                skipped = file_filter.report.to_dict()
+                result["skipped_files"] = skipped
+                if skipped["files"]:
+                    print(f"--- Atlanan dosyalar: {skipped['files']} ({skipped['bytes'] / 1024:.0f} KB) ---")
+            if incremental:
+                result["changed_files"] = len(diff.upserted)
+                result["deleted_files"] = len(diff.deleted)
+            return result
 
         except Exception as e:
             print(f"Indeksleme hatası: {str(e)}")
-            # Hata durumunda kısmi verileri temizle
-            try:
-                self.supabase.table("documents").delete().match({
-                    "metadata->>collection_name": repo_name,
-                    "metadata->>user_id": user_id,
-                }).execute()
-            except Exception:
-                pass
+            # Kısmi veri silinmez: eski satırlar hâlâ geçerlidir ve yazılan parçalar
+            # sonraki denemede (aynı id'lerle) atlanır; indeksleme kaldığı yerden sürer.
 
             msg = str(e)
             if "RESOURCE_EXHAUSTED" in msg or "429" in msg:
@@ -190,4 +250,4 @@ class RAGService:
             raise
             
         finally:
-            self.cleanup_temp_repo(temp_dir)
\ No newline at end of file
+            self.cleanup_temp_repo(temp_dir)
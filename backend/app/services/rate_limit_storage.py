@@ -0,0 +1,159 @@
+"""
+slowapi/limits için SQLite depolama (sqlite:///yol/dosya.sqlite3). Aynı makinedeki tüm
+uvicorn/gunicorn worker'ları tek dosyayı paylaşır; sayaçlar süreç başına değil, ortaktır.
+Her kontrol tek bir `begin immediate` işlemidir: oku-karar ver-artır adımları süreçler
+arasında atomiktir. Sliding window counter (önceki pencere ağırlıklı + mevcut pencere)
+ve fixed window stratejilerini destekler.
+
+Birden fazla makine için aynı arayüzü limits'in Redis depolaması sağlar (redis://, Lua ile atomik).
+"""
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+
+# Süresi dolmuş sayaçlar bu kadar yazmada bir silinir
+_PURGE_EVERY = 500
+
+
+def _path_from_uri(uri: str) -> str:
+    path = uri.split("://", 1)[1]
+    # sqlite:///C:/... → C:/...
+    if re.match(r"^/[A-Za-z]:", path):
+        path = path[1:]
+    return path
+
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        self.path = _path_from_uri(uri)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self) -> sqlite3.Connection:
+        # fork sonrası (gunicorn --preload) ebeveynin bağlantısı kullanılmaz
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("pragma synchronous=normal")
+            conn.execute(
+                "create table if not exists counters ("
+                " key text primary key, count integer not null, expires_at real not null)"
+            )
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("begin immediate")
+            try:
+                yield conn
+                conn.execute("commit")
+            except BaseException:
+                conn.execute("rollback")
+                raise
+
+    @staticmethod
+    def _count(conn: sqlite3.Connection, key: str, now: float) -> Tuple[int, float]:
+        row = conn.execute(
+            "select count, expires_at from counters where key = ? and expires_at > ?", (key, now)
+        ).fetchone()
+        return (row[0], row[1]) if row else (0, now)
+
+    def _incr(self, conn: sqlite3.Connection, key: str, expiry: float, amount: int, now: float) -> int:
+        # Süresi dolmuş sayaç sıfırdan başlar; süre sadece sayaç oluşurken belirlenir
+        conn.execute(
+            "insert into counters (key, count, expires_at) values (?, ?, ?)"
+            " on conflict(key) do update set"
+            " count = case when counters.expires_at > ? then counters.count + excluded.count else excluded.count end,"
+            " expires_at = case when counters.expires_at > ? then counters.expires_at else excluded.expires_at end",
+            (key, amount, now + expiry, now, now),
+        )
+        self._writes += 1
+        if self._writes % _PURGE_EVERY == 0:
+            conn.execute("delete from counters where expires_at <= ?", (now,))
+        return self._count(conn, key, now)[0]
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        with self._transaction() as conn:
+            return self._incr(conn, key, expiry, amount, time.time())
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            return self._count(self._connection(), key, time.time())[0]
+
+    def get_expiry(self, key: str) -> float:
+        with self._lock:
+            return self._count(self._connection(), key, time.time())[1]
+
+    def check(self) -> bool:
+        try:
+            with self._lock:
+                self._connection().execute("select 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        with self._transaction() as conn:
+            return conn.execute("delete from counters").rowcount
+
+    def clear(self, key: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("delete from counters where key = ?", (key,))
+
+    def _window(self, conn: sqlite3.Connection, key: str, expiry: int, now: float) -> Tuple[int, float, int, float]:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count = self._count(conn, previous_key, now)[0]
+        current_count = self._count(conn, current_key, now)[0]
+        # Önceki pencerenin ağırlığı, kayan pencerede kalan kısmıyla orantılıdır
+        previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry if previous_count else 0.0
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+        now = time.time()
+        with self._transaction() as conn:
+            previous_count, previous_ttl, current_count, _ = self._window(conn, key, expiry, now)
+            if math.floor(previous_count * previous_ttl / expiry + current_count) + amount > limit:
+                return False
+            # Mevcut pencere bir sonraki pencerede "önceki" olarak okunacağı için 2 × süre
+            _, current_key = self.sliding_window_keys(key, expiry, now)
+            self._incr(conn, current_key, 2 * expiry, amount, now)
+            return True
+
+    def get_sliding_window(self, key: str, expiry: int) -> Tuple[int, float, int, float]:
+        with self._lock:
+            return self._window(self._connection(), key, expiry, time.time())
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        with self._transaction() as conn:
+            conn.execute("delete from counters where key in (?, ?)", (previous_key, current_key))
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,171 @@
+"""
+Süreç genelinde paylaşılan kaynaklar: havuzlanmış HTTP bağlantıları (keep-alive, HTTP/2),
+Supabase istemcileri (senkron ve async), vektör deposu, prompt, sohbet zinciri ve
+indekslemenin CPU aşaması için süreç havuzu.
+FastAPI lifespan ile açılıp kapanır; lifespan çalışmazsa (ör. testler) ilk erişimde oluşturulur.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
+
+import httpx
+from supabase import Client, create_client
+
+from app.core.config import settings
+
+# shutdown() sırasında sıfırlanan tembel alanlar
+_LAZY_ATTRS = (
+    "http_client", "async_http_client", "supabase", "supabase_auth", "supabase_async",
+    "lexical_index", "vector_store", "prompt", "chat_chain", "cpu_pool",
+)
+
+
+class ResourceRegistry:
+    """Her kaynak bir kez oluşturulur ve tüm istekler tarafından paylaşılır."""
+
+    @staticmethod
+    def _http_options() -> dict:
+        return dict(
+            http2=settings.HTTP2,
+            timeout=settings.HTTP_TIMEOUT_SECONDS,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_POOL_SIZE,
+                max_keepalive_connections=settings.HTTP_POOL_SIZE,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_SECONDS,
+            ),
+        )
+
+    @cached_property
+    def http_client(self) -> httpx.Client:
+        # Tüm Supabase istemcileri aynı bağlantı havuzunu kullanır; başlıklar istek başına gönderilir
+        return httpx.Client(**self._http_options())
+
+    @cached_property
+    def async_http_client(self) -> httpx.AsyncClient:
+        """Event loop'u bloklamayan istekler (sohbet araması) için ayrı havuz."""
+        return httpx.AsyncClient(**self._http_options())
+
+    def _create_supabase(self, key: str) -> Client:
+        from supabase.lib.client_options import SyncClientOptions
+
+        return create_client(
+            settings.SUPABASE_URL,
+            key,
+            options=SyncClientOptions(httpx_client=self.http_client),
+        )
+
+    @cached_property
+    def supabase(self) -> Client:
+        """Service role istemcisi (veritabanı işlemleri)."""
+        return self._create_supabase(settings.SUPABASE_SERVICE_ROLE_KEY)
+
+    @cached_property
+    def supabase_auth(self) -> Client:
+        """Anon key istemcisi (kullanıcı token doğrulama)."""
+        return self._create_supabase(settings.SUPABASE_KEY)
+
+    @cached_property
+    def supabase_async(self):
+        """Service role async istemcisi; /chat/ask'taki match_documents çağrıları için."""
+        from supabase import AsyncClient
+        from supabase.lib.client_options import AsyncClientOptions
+
+        return AsyncClient(
+            settings.SUPABASE_URL,
+            settings.SUPABASE_SERVICE_ROLE_KEY,
+            options=AsyncClientOptions(httpx_client=self.async_http_client),
+        )
+
+    @cached_property
+    def lexical_index(self):
+        if not settings.LEXICAL_INDEX_ENABLED:
+            return None
+        from app.services.lexical_index import LexicalIndex
+
+        return LexicalIndex(settings.LEXICAL_INDEX_PATH)
+
+    @cached_property
+    def vector_store(self):
+        """VECTOR_BACKEND ayarına göre Supabase (pgvector) veya yerel NumPy deposu."""
+        from app.services.llm_service import embeddings
+
+        if settings.VECTOR_BACKEND == "local":
+            from app.services.local_vector_store import LocalVectorStore
+
+            return LocalVectorStore(
+                embeddings,
+                settings.LOCAL_VECTOR_DIR,
+                dtype=settings.LOCAL_VECTOR_DTYPE,
+                lexical_index=self.lexical_index,
+            )
+
+        from app.services.custom_supabase import CustomSupabaseVectorStore
+
+        return CustomSupabaseVectorStore(
+            embeddings=embeddings,
+            client=self.supabase,
+            async_client=self.supabase_async,
+            lexical_index=self.lexical_index,
+        )
+
+    @cached_property
+    def prompt(self):
+        from app.services.chat_chain import build_prompt
+
+        return build_prompt()
+
+    @cached_property
+    def chat_chain(self):
+        from app.services.chat_chain import build_chat_chain
+        from app.services.llm_service import llm
+
+        return build_chat_chain(self.vector_store, self.prompt, llm)
+
+    @property
+    def cpu_workers(self) -> int:
+        return settings.INDEX_CPU_WORKERS or min(8, os.cpu_count() or 1)
+
+    @cached_property
+    def cpu_pool(self) -> ProcessPoolExecutor:
+        """
+        Dosya okuma/parçalama/hash'leme havuzu; indeksleme API sürecinin GIL'ini tutmaz.
+        spawn: thread'li (httpx, event loop) süreci fork'lamak güvenli değildir.
+        """
+        return ProcessPoolExecutor(max_workers=self.cpu_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def startup(self):
+        """Kaynakları önceden oluşturur; ilk isteğin gecikmesine eklenmez."""
+        for name in _LAZY_ATTRS:
+            getattr(self, name)
+
+    def shutdown(self):
+        """Bağlantı havuzunu kapatır ve kaynakları sıfırlar."""
+        client = self.__dict__.get("http_client")
+        lexical_index = self.__dict__.get("lexical_index")
+        cpu_pool = self.__dict__.get("cpu_pool")
+        for name in _LAZY_ATTRS:
+            self.__dict__.pop(name, None)
+        if client is not None:
+            client.close()
+        if lexical_index is not None:
+            lexical_index.close()
+        if cpu_pool is not None:
+            cpu_pool.shutdown(wait=False, cancel_futures=True)
+
+    async def ashutdown(self):
+        """Async havuz açıldığı event loop'ta kapatılmalıdır; ardından shutdown()."""
+        client = self.__dict__.get("async_http_client")
+        if client is not None:
+            await client.aclose()
+        self.shutdown()
+
+
+def is_missing_column(error: Exception, column: str) -> bool:
+    """PostgREST/Postgres "kolon yok" hatası mı (ilgili migration henüz çalıştırılmamış)."""
+    text = f"{getattr(error, 'message', None) or ''} {error}"
+    return getattr(error, "code", None) in ("PGRST204", "42703") and column in text
+
+
+resources = ResourceRegistry()
@@ -0,0 +1,103 @@
+"""
+/chat/ask için üç seviyeli bellek içi önbellek:
+1) normalize edilmiş soru → sorgu embedding'i
+2) (collection_name, user_id, embedding hash, k) → bulunan dokümanlar
+3) (collection_name, user_id) + benzer soru embedding'i → üretilmiş cevap (answer_cache)
+Repo yeniden indekslendiğinde veya silindiğinde ilgili sonuçlar ve cevaplar geçersiz kılınır;
+sonuç anahtarları ortak repo sürümünü (RepoVersions) içerdiğinden diğer worker'lar da bayat
+sonuç dönmez.
+"""
+import hashlib
+import re
+from array import array
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.cache_versions import RepoVersions
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Büyük/küçük harf, boşluk ve sondaki noktalama farklarını yok sayar."""
+    return _WHITESPACE.sub(" ", question.strip().lower()).rstrip(" ?.!")
+
+
+def embedding_hash(embedding: List[float]) -> str:
+    return hashlib.sha1(array("f", embedding).tobytes()).hexdigest()
+
+
+class RetrievalCache:
+    def __init__(
+        self,
+        query_maxsize: int,
+        query_ttl: float,
+        result_maxsize: int,
+        result_ttl: float,
+        answers: Optional[SemanticAnswerCache] = None,
+        versions: Optional[RepoVersions] = None,
+    ):
+        self.query_embeddings = TTLCache(query_maxsize, query_ttl)
+        self.results = TTLCache(result_maxsize, result_ttl)
+        self.answers = answers
+        self.versions = versions or (answers.versions if answers is not None else RepoVersions())
+
+    def get_query_embedding(self, question: str, embed: Callable[[str], List[float]]) -> List[float]:
+        key = normalize_question(question)
+        embedding = self.query_embeddings.get(key)
+        if embedding is None:
+            embedding = embed(question)
+            self.query_embeddings.set(key, embedding)
+        return embedding
+
+    async def aget_query_embedding(self, question: str, aembed: Callable[[str], Awaitable[List[float]]]) -> List[float]:
+        key = normalize_question(question)
+        embedding = self.query_embeddings.get(key)
+        if embedding is None:
+            embedding = await aembed(question)
+            self.query_embeddings.set(key, embedding)
+        return embedding
+
+    def result_key(
+        self, embedding: List[float], k: int, filter: Optional[Dict[str, Any]], threshold: float
+    ) -> Optional[tuple]:
+        """Sadece collection_name + user_id ile filtrelenmiş aramalar önbelleğe alınır."""
+        filter = filter or {}
+        if set(filter) != {"collection_name", "user_id"}:
+            return None
+        collection_name, user_id = filter["collection_name"], filter["user_id"]
+        version = self.versions.get(collection_name, user_id)
+        return (collection_name, user_id, version, embedding_hash(embedding), k, threshold)
+
+    def invalidate(self, collection_name: str, user_id: str) -> int:
+        # Sürüm tek sefer artar (cevap önbelleği aynı RepoVersions'ı kullanır)
+        if self.answers is not None:
+            self.answers.invalidate(collection_name, user_id)
+        else:
+            self.versions.bump(collection_name, user_id)
+        return self.results.pop_where(lambda key: key[0] == collection_name and key[1] == user_id)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        body = {"query_embeddings": self.query_embeddings.stats(), "results": self.results.stats()}
+        if self.answers is not None:
+            body["answers"] = self.answers.stats()
+        return body
+
+
+# Süreç başına tek örnek; geçersiz kılma ortak sürüm dosyası üzerinden tüm worker'lara yayılır
+_versions = RepoVersions(settings.CACHE_VERSIONS_PATH)
+retrieval_cache = RetrievalCache(
+    query_maxsize=settings.QUERY_EMBEDDING_CACHE_SIZE,
+    query_ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+    result_maxsize=settings.RETRIEVAL_CACHE_SIZE,
+    result_ttl=settings.RETRIEVAL_CACHE_TTL,
+    answers=SemanticAnswerCache(
+        threshold=settings.ANSWER_CACHE_THRESHOLD,
+        maxsize=settings.ANSWER_CACHE_SIZE,
+        ttl=settings.ANSWER_CACHE_TTL,
+        versions=_versions,
+    ) if settings.ANSWER_CACHE_ENABLED else None,
+    versions=_versions,
+)
@@ -0,0 +1,181 @@
+"""
+Eşzamanlı embedding + yükleme motoru. Aynı anda birden fazla batch uçuşta olur;
+gönderim hızı 429/RESOURCE_EXHAUSTED yanıtlarına göre kendini ayarlayan (AIMD)
+bir token bucket ile sınırlanır. Bekleme her zaman asyncio.sleep ile yapılır,
+event loop hiç bloklanmaz.
+"""
+import asyncio
+import threading
+import time
+from typing import Callable, List, Optional, Set
+
+from langchain_core.documents import Document
+
+from app.services.metrics import EMBED_RETRIES, EMBED_THROTTLED
+
+
+def is_quota_error(err: Exception) -> bool:
+    msg = str(err)
+    return (
+        "RESOURCE_EXHAUSTED" in msg
+        or "429" in msg
+        or "quota" in msg.lower()
+        or "rate limit" in msg.lower()
+    )
+
+
+class AdaptiveTokenBucket:
+    """
+    Token bucket; bir token bir embedding isteği (parça) demektir.
+    Başarılı her batch'te hız toplamsal artar, kota hatasında çarpımsal düşer (AIMD).
+    Böylece hız sağlayıcının gerçek kotası etrafında dengelenir.
+
+    Rezervasyon modeli: acquire token'ı hemen düşer (gerekirse borca girer) ve borç
+    kapanana kadar asyncio.sleep ile bekler. Durum threading.Lock ile korunduğundan
+    tek bir bucket farklı worker thread'lerinin event loop'ları arasında paylaşılabilir.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        min_rate: float,
+        max_rate: float,
+        increase: float,
+        decrease_factor: float = 0.5,
+    ):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.tokens = rate
+        self.throttled = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        # Kapasite bir saniyelik hız kadardır
+        self.tokens = min(self.rate, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens: float) -> float:
+        """Token'ları düşer ve beklenmesi gereken süreyi (saniye) döner."""
+        with self._lock:
+            self._refill()
+            self.tokens -= tokens
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    async def acquire(self, tokens: float = 1):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        with self._lock:
+            self._refill()
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            # Birikmiş tokenlar silinir; yeni hız hemen uygulanır
+            self.tokens = min(self.tokens, 0)
+
+
+class UploadEngine:
+    """
+    Batch'leri vector_store.add_documents ile (thread'de) eşzamanlı yükler.
+    submit() uçuştaki batch sayısı concurrency'ye ulaşınca bekler (geri basınç).
+    bucket verilmezse hız sınırı uygulanmaz, sadece 429'da geri çekilinir.
+    """
+
+    def __init__(
+        self,
+        vector_store,
+        bucket: Optional[AdaptiveTokenBucket] = None,
+        concurrency: int = 4,
+        max_retries: int = 6,
+        base_sleep_seconds: float = 2,
+        on_uploaded: Optional[Callable[[List[Document]], None]] = None,
+    ):
+        self.vector_store = vector_store
+        self.bucket = bucket
+        self.max_retries = max_retries
+        self.base_sleep_seconds = base_sleep_seconds
+        self.on_uploaded = on_uploaded
+        self.retries = 0
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._tasks: Set[asyncio.Task] = set()
+        self._error: Optional[BaseException] = None
+
+    def _cost(self, batch: List[Document]) -> int:
+        """Önbellekte olan parçalar ağa çıkmayacağı için kotadan düşülmez."""
+        embeddings = getattr(self.vector_store, "embeddings", None)
+        missing_count = getattr(embeddings, "missing_count", None)
+        if missing_count is None:
+            return len(batch)
+        return missing_count([doc.page_content for doc in batch])
+
+    async def submit(self, batch: List[Document]):
+        self._raise_if_failed()
+        await self._slots.acquire()
+        self._raise_if_failed()
+        task = asyncio.create_task(self._upload(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        self._slots.release()
+        if not task.cancelled() and task.exception() is not None and self._error is None:
+            self._error = task.exception()
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise self._error
+
+    async def _upload(self, batch: List[Document]):
+        cost = await asyncio.to_thread(self._cost, batch) if self.bucket else 0
+        attempt = 0
+        while True:
+            if cost:
+                await self.bucket.acquire(cost)
+            try:
+                await asyncio.to_thread(self.vector_store.add_documents, batch)
+            except Exception as e:
+                attempt += 1
+                if is_quota_error(e):
+                    EMBED_THROTTLED.inc()
+                if is_quota_error(e) and attempt < self.max_retries:
+                    self.retries += 1
+                    EMBED_RETRIES.inc()
+                    sleep_s = min(60, self.base_sleep_seconds * (2 ** (attempt - 1)))
+                    if self.bucket:
+                        self.bucket.on_throttle()
+                        print(f"⚠️ Gemini kota/rate limit (429). Hız {self.bucket.rate:.1f} parça/s'ye düşürüldü.")
+                    print(
+                        f"⚠️ {sleep_s}s beklenip tekrar denenecek... (deneme {attempt}/{self.max_retries-1})"
+                    )
+                    await asyncio.sleep(sleep_s)
+                    continue
+                raise
+            if cost:
+                self.bucket.on_success()
+            if self.on_uploaded:
+                self.on_uploaded(batch)
+            return
+
+    async def drain(self):
+        """Uçuştaki tüm batch'leri bekler; biri hata verdiyse onu fırlatır."""
+        while self._tasks:
+            await asyncio.wait(set(self._tasks))
+        self._raise_if_failed()
+
+    async def cancel(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,28 @@
+"""
+Çevrimdışı performans ölçümleri: indeksleme hattı ve /chat/ask.
+Gemini (embedding + LLM) ve Supabase (documents tablosu, match_documents RPC) deterministik
+sahte sürümlerle değiştirilir; ağ, API anahtarı veya veritabanı gerekmez.
+Sonuçlar JSON olarak yazılır; iki commit'in çıktısı `compare` ile karşılaştırılır.
+
+Çalıştırma: cd backend && python -m benchmarks run --sizes 50 200 1000 --output bench.json
+            python -m benchmarks compare eski.json yeni.json
+"""
+import os
+import tempfile
+
+# app.core.config import edilmeden önce: zorunlu ayarlar ve diske yazan yollar geçici dizine
+_DATA_DIR = tempfile.mkdtemp(prefix="repo-analyst-bench-")
+for _name, _value in {
+    "SUPABASE_URL": "https://benchmark.supabase.co",
+    "SUPABASE_KEY": "benchmark",
+    "SUPABASE_JWT_SECRET": "benchmark",
+    "SUPABASE_SERVICE_ROLE_KEY": "benchmark",
+    "GOOGLE_API_KEY": "benchmark",
+    "EMBEDDING_CACHE_ENABLED": "false",
+    "EMBEDDING_CACHE_PATH": os.path.join(_DATA_DIR, "embedding_cache.sqlite3"),
+    "LEXICAL_INDEX_PATH": os.path.join(_DATA_DIR, "lexical_index.sqlite3"),
+    "LOCAL_VECTOR_DIR": os.path.join(_DATA_DIR, "vectors"),
+    "TEMP_REPO_DIR": os.path.join(_DATA_DIR, "temp_repos"),
+    "RATE_LIMIT_STORAGE_URI": "memory://",
+}.items():
+    os.environ.setdefault(_name, _value)
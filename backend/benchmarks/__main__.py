@@ -0,0 +1,192 @@
+"""
+Benchmark komut satırı.
+
+Çalıştırma: cd backend && python -m benchmarks run --sizes 50 200 1000 --output bench.json
+            python -m benchmarks compare eski.json yeni.json --fail-on-regression 10
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, Tuple
+
+from benchmarks import scenarios
+
+# Karşılaştırılan metrikler ve yönü (True: büyük olan iyi)
+INDEX_METRICS = {
+    "files_per_s": True,
+    "chunks_per_s": True,
+    "seconds": False,
+    "reindex_seconds": False,
+    "peak_rss_mb.self": False,
+}
+CHAT_METRICS = {
+    "ttfb_ms.p50": False,
+    "ttfb_ms.p95": False,
+    "total_ms.p50": False,
+    "total_ms.p95": False,
+}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def run(args: argparse.Namespace) -> None:
+    options = {
+        "seed": args.seed,
+        "embed_dims": args.embed_dims,
+        "embed_latency": args.embed_latency,
+        "throttle_every": args.throttle_every,
+        "embed_rate": args.embed_rate,
+        "retry_sleep": args.retry_sleep,
+        "cpu_workers": args.cpu_workers,
+        "db_latency": args.db_latency,
+        "llm_first_token": args.llm_first_token,
+        "llm_token_latency": args.llm_token_latency,
+        "answer_tokens": args.answer_tokens,
+        "chat_requests": args.chat_requests,
+        "duplicate_ratio": args.duplicate_ratio,
+    }
+    execute = scenarios.run_isolated if not args.in_process else (lambda fn, *a: fn(*a))
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "options": options,
+        },
+        "index": [],
+        "chat": [],
+    }
+    for size in args.sizes:
+        if not args.skip_index:
+            print(f"index: {size} dosya...", file=sys.stderr)
+            result = execute(scenarios.run_index, size, options)
+            print(
+                f"  {result['files_per_s']} dosya/s, {result['chunks_per_s']} parça/s, "
+                f"tepe RSS {result['peak_rss_mb']['self']} MB",
+                file=sys.stderr,
+            )
+            report["index"].append(result)
+        if not args.skip_chat:
+            print(f"chat: {size} dosya, {args.chat_requests} soru...", file=sys.stderr)
+            result = execute(scenarios.run_chat, size, options)
+            print(
+                f"  TTFB p50 soğuk {result['cold']['ttfb_ms']['p50']} ms, "
+                f"önbellekli {result['cached']['ttfb_ms']['p50']} ms",
+                file=sys.stderr,
+            )
+            report["chat"].append(result)
+
+    body = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(body + "\n")
+        print(f"Sonuçlar yazıldı: {args.output}", file=sys.stderr)
+    else:
+        print(body)
+
+
+def _lookup(row: dict, path: str):
+    value = row
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def flatten(report: dict) -> Dict[str, Tuple[float, bool]]:
+    """Rapordaki metrikleri 'index[200].files_per_s' gibi anahtarlara açar."""
+    metrics = {}
+    for row in report.get("index", []):
+        for path, higher_is_better in INDEX_METRICS.items():
+            value = _lookup(row, path)
+            if value is not None:
+                metrics[f"index[{row['files']}].{path}"] = (value, higher_is_better)
+    for row in report.get("chat", []):
+        for mode in ("cold", "cached"):
+            for path, higher_is_better in CHAT_METRICS.items():
+                value = _lookup(row.get(mode, {}), path)
+                if value is not None:
+                    metrics[f"chat[{row['files']}].{mode}.{path}"] = (value, higher_is_better)
+    return metrics
+
+
+def compare(args: argparse.Namespace) -> None:
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    base_metrics, new_metrics = flatten(base), flatten(new)
+    print(f"{'metrik':44} {base['meta']['commit']:>12} {new['meta']['commit']:>12} {'fark':>9}")
+    regressions = 0
+    for key, (value, higher_is_better) in new_metrics.items():
+        if key not in base_metrics:
+            continue
+        old = base_metrics[key][0]
+        change = (value - old) / old * 100 if old else 0.0
+        worse = -change if higher_is_better else change
+        flag = ""
+        if args.fail_on_regression is not None and worse > args.fail_on_regression:
+            regressions += 1
+            flag = "  ⚠️"
+        print(f"{key:44} {old:>12} {value:>12} {change:>+8.1f}%{flag}")
+    if regressions:
+        raise SystemExit(f"{regressions} metrikte %{args.fail_on_regression}'den fazla gerileme var.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Benchmark'ları çalıştır ve JSON üret")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000], help="Sentetik repo dosya sayıları")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", help="JSON dosyası (verilmezse stdout)")
+    run_parser.add_argument("--skip-index", action="store_true")
+    run_parser.add_argument("--skip-chat", action="store_true")
+    run_parser.add_argument("--in-process", action="store_true", help="Senaryoları ayrı süreçte çalıştırma (hata ayıklama)")
+    run_parser.add_argument(
+        "--duplicate-ratio", type=float, default=0.0, help="Önceki bir dosyanın kopyası olan dosya oranı (index)"
+    )
+    run_parser.add_argument("--embed-dims", type=int, default=768)
+    run_parser.add_argument("--embed-latency", type=float, default=0.05, help="Embedding çağrısı başına saniye")
+    run_parser.add_argument("--throttle-every", type=int, default=0, help="Her N. embedding çağrısı 429 döner (0: hiç)")
+    run_parser.add_argument("--embed-rate", type=float, default=0, help="AdaptiveTokenBucket başlangıç hızı (0: sınırsız)")
+    run_parser.add_argument("--retry-sleep", type=float, default=0.1, help="429 sonrası ilk bekleme (API'de 2s)")
+    run_parser.add_argument("--cpu-workers", type=int, default=min(8, os.cpu_count() or 1), help="0: süreç havuzu yok")
+    run_parser.add_argument("--db-latency", type=float, default=0.0, help="Supabase isteği başına saniye")
+    run_parser.add_argument("--llm-first-token", type=float, default=0.4)
+    run_parser.add_argument("--llm-token-latency", type=float, default=0.01)
+    run_parser.add_argument("--answer-tokens", type=int, default=150)
+    run_parser.add_argument("--chat-requests", type=int, default=20)
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="İki JSON sonucunu karşılaştır")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument(
+        "--fail-on-regression", type=float, metavar="YÜZDE",
+        help="Bu yüzdeden fazla kötüleşen metrik varsa hata koduyla çık",
+    )
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
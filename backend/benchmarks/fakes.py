@@ -0,0 +1,359 @@
+"""
+Gemini ve Supabase'in deterministik sahte sürümleri.
+- FakeEmbeddings: kelime hash'lerinden (feature hashing) vektör; sabit gecikme, her N. çağrıda 429.
+- FakeChatModel: sabit ilk token gecikmesi ve token başına gecikmeyle cevap akıtır.
+- InMemorySupabase / AsyncInMemorySupabase: documents tablosu (upsert/select/delete),
+  match_documents ve delete_stale_documents RPC'leri (migrations/002-005 davranışı).
+"""
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_TOKEN = re.compile(r"\w+")
+
+
+class FakeQuotaError(Exception):
+    """upload_engine.is_quota_error bunu Gemini'nin 429'u gibi tanır."""
+
+
+class FakeEmbeddings(Embeddings):
+    def __init__(self, dims: int = 768, latency: float = 0.05, per_text_latency: float = 0.0, throttle_every: int = 0):
+        self.dims = dims
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.throttle_every = throttle_every
+        self.calls = 0
+        self.texts = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dims, dtype=np.float32)
+        for token in _TOKEN.findall(text.lower()):
+            h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[h % self.dims] += 1.0 if h >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def _call(self, count: int) -> float:
+        """Çağrıyı sayar, sıra gelmişse 429 fırlatır; beklenecek süreyi döner."""
+        with self._lock:
+            self.calls += 1
+            if self.throttle_every and self.calls % self.throttle_every == 0:
+                self.throttled += 1
+                raise FakeQuotaError("429 RESOURCE_EXHAUSTED (benchmark)")
+            self.texts += count
+        return self.latency + self.per_text_latency * count
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self._call(len(texts)))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self._call(1))
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self._call(len(texts)))
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self._call(1))
+        return self._vector(text)
+
+
+class FakeChatModel(BaseChatModel):
+    first_token_latency: float = 0.4
+    token_latency: float = 0.01
+    answer_tokens: int = 150
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake"
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        # Cevap prompt'a bağlıdır (aynı bağlam → aynı cevap)
+        seed = hashlib.sha1("".join(str(m.content) for m in messages).encode("utf-8")).hexdigest()
+        return [f"{seed[i % len(seed)]}kelime{i} " for i in range(self.answer_tokens)]
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self.calls += 1
+        tokens = self._tokens(messages)
+        time.sleep(self.first_token_latency + self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        self.calls += 1
+        await asyncio.sleep(self.first_token_latency)
+        for token in self._tokens(messages):
+            await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+def _column(row: Dict[str, Any], name: str) -> Any:
+    # documents'taki kiracı kolonları metadata'dan türetilir (migrations/002)
+    if name in row:
+        return row[name]
+    if "->" in name:
+        column, key = name.split("->", 1)
+        return (row.get(column) or {}).get(key)
+    return (row.get("metadata") or {}).get(name)
+
+
+class InMemoryDatabase:
+    """Tablolar: isim → (id → satır). Vektörler numpy olarak, filtre başına matris önbelleğiyle tutulur."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.requests = 0
+        self._matrices: Dict[str, tuple] = {}
+        self._lock = threading.RLock()
+
+    def write(self, table: str, rows: List[Dict[str, Any]], upsert: bool) -> List[Dict[str, Any]]:
+        with self._lock:
+            data = self.tables.setdefault(table, {})
+            written = []
+            for row in rows:
+                row = dict(row)
+                row.setdefault("id", str(uuid.uuid4()))
+                if "embedding" in row:
+                    row["embedding"] = np.asarray(row["embedding"], dtype=np.float32)
+                if not upsert and row["id"] in data:
+                    raise Exception(f"duplicate key value violates unique constraint ({table}.id)")
+                data[str(row["id"])] = row
+                written.append({k: v for k, v in row.items() if k != "embedding"})
+            self._matrices.clear()
+            return written
+
+    def delete(self, table: str, ids: List[str]) -> int:
+        with self._lock:
+            data = self.tables.get(table, {})
+            for row_id in ids:
+                data.pop(row_id, None)
+            self._matrices.clear()
+            return len(ids)
+
+    def match_documents(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        filt = params.get("filter") or {}
+        key = json.dumps(filt, sort_keys=True)
+        with self._lock:
+            cached = self._matrices.get(key)
+            if cached is None:
+                rows = [
+                    row for row in self.tables.get("documents", {}).values()
+                    if all(_column(row, k) == v for k, v in filt.items())
+                ]
+                matrix = np.stack([row["embedding"] for row in rows]) if rows else np.zeros((0, 1), np.float32)
+                cached = self._matrices[key] = (rows, matrix)
+        rows, matrix = cached
+        if not rows:
+            return []
+        query = np.asarray(params["query_embedding"], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        scores = (matrix @ query) / np.where(norms == 0, 1.0, norms)
+        k = min(int(params.get("match_count", 10)), len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        threshold = float(params.get("match_threshold", 0.0))
+        return [
+            {
+                "id": rows[i]["id"],
+                "content": rows[i]["content"],
+                "metadata": rows[i]["metadata"],
+                "similarity": float(scores[i]),
+            }
+            for i in top if scores[i] > threshold
+        ]
+
+    def delete_stale_documents(self, params: Dict[str, Any]) -> int:
+        keep = set(params.get("keep_ids") or [])
+        sources = params.get("p_sources")
+        with self._lock:
+            stale = [
+                row_id for row_id, row in self.tables.get("documents", {}).items()
+                if _column(row, "user_id") == params["p_user_id"]
+                and _column(row, "collection_name") == params["p_collection_name"]
+                and row_id not in keep
+                and (sources is None or _column(row, "source") in sources)
+            ]
+            return self.delete("documents", stale)
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> Any:
+        if name == "match_documents":
+            return self.match_documents(params)
+        if name == "delete_stale_documents":
+            return self.delete_stale_documents(params)
+        raise Exception(f"function public.{name} does not exist")
+
+
+class _Query:
+    """supabase-py sorgu oluşturucusunun benchmark'ta kullanılan alt kümesi."""
+
+    def __init__(self, db: InMemoryDatabase, table: str):
+        self.db = db
+        self.table = table
+        self.op = "select"
+        self.payload: Any = None
+        self.filters: List[tuple] = []
+        self.row_offset = 0
+        self.row_limit: Optional[int] = None
+        self._negate = False
+
+    def select(self, *_, **__):
+        self.op = "select"
+        return self
+
+    def insert(self, rows, **__):
+        self.op, self.payload = "insert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, **__):
+        self.op, self.payload = "upsert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def update(self, values, **__):
+        self.op, self.payload = "update", values
+        return self
+
+    def delete(self, **__):
+        self.op = "delete"
+        return self
+
+    def eq(self, column: str, value: Any):
+        self.filters.append((column, lambda v, value=value: v == value))
+        return self
+
+    def in_(self, column: str, values: List[Any]):
+        values = set(values)
+        self.filters.append((column, lambda v: v in values))
+        return self
+
+    @property
+    def not_(self):
+        self._negate = True
+        return self
+
+    def is_(self, column: str, value: Any):
+        negate, self._negate = self._negate, False
+        expected = None if value in ("null", None) else value
+        self.filters.append((column, lambda v: (v == expected) != negate))
+        return self
+
+    def match(self, query: Dict[str, Any]):
+        for column, value in query.items():
+            self.eq(column, value)
+        return self
+
+    def order(self, *_, **__):
+        return self
+
+    def limit(self, count: int, **__):
+        self.row_limit = count
+        return self
+
+    def range(self, start: int, end: int):
+        self.row_offset, self.row_limit = start, end - start + 1
+        return self
+
+    def _rows(self) -> List[Dict[str, Any]]:
+        rows = [
+            row for row in self.db.tables.get(self.table, {}).values()
+            if all(check(_column(row, column)) for column, check in self.filters)
+        ]
+        rows = rows[self.row_offset:]
+        return rows[: self.row_limit] if self.row_limit is not None else rows
+
+    def _run(self) -> SimpleNamespace:
+        self.db.requests += 1
+        with self.db._lock:
+            if self.op in ("insert", "upsert"):
+                return SimpleNamespace(data=self.db.write(self.table, self.payload, upsert=self.op == "upsert"))
+            rows = self._rows()
+            if self.op == "delete":
+                self.db.delete(self.table, [str(row["id"]) for row in rows])
+            elif self.op == "update":
+                for row in rows:
+                    row.update(self.payload)
+            return SimpleNamespace(data=[{k: v for k, v in row.items() if k != "embedding"} for row in rows])
+
+    def execute(self) -> SimpleNamespace:
+        time.sleep(self.db.latency)
+        return self._run()
+
+
+class _Rpc:
+    def __init__(self, db: InMemoryDatabase, name: str, params: Dict[str, Any]):
+        self.db, self.name, self.params = db, name, params
+
+    def execute(self) -> SimpleNamespace:
+        time.sleep(self.db.latency)
+        self.db.requests += 1
+        return SimpleNamespace(data=self.db.rpc(self.name, self.params))
+
+
+class InMemorySupabase:
+    def __init__(self, db: Optional[InMemoryDatabase] = None):
+        self.db = db or InMemoryDatabase()
+
+    def table(self, name: str) -> _Query:
+        return _Query(self.db, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> _Rpc:
+        return _Rpc(self.db, name, params)
+
+
+class _AsyncQuery(_Query):
+    async def execute(self) -> SimpleNamespace:
+        await asyncio.sleep(self.db.latency)
+        return self._run()
+
+
+class _AsyncRpc(_Rpc):
+    async def execute(self) -> SimpleNamespace:
+        await asyncio.sleep(self.db.latency)
+        self.db.requests += 1
+        return SimpleNamespace(data=self.db.rpc(self.name, self.params))
+
+
+class AsyncInMemorySupabase:
+    """Aynı veritabanını paylaşan async istemci (resources.supabase_async yerine)."""
+
+    def __init__(self, db: InMemoryDatabase):
+        self.db = db
+
+    def table(self, name: str) -> _AsyncQuery:
+        return _AsyncQuery(self.db, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> _AsyncRpc:
+        return _AsyncRpc(self.db, name, params)
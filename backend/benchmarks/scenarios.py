@@ -0,0 +1,273 @@
+"""
+Ölçüm senaryoları. Her senaryo ayrı (spawn) bir süreçte çalışır: tepe RSS o senaryoya aittir
+ve bir senaryonun önbellekleri diğerini etkilemez.
+- index: sentetik repo gerçek IngestPipeline + CustomSupabaseVectorStore + LexicalIndex ile
+  indekslenir (files/s, chunks/s, tepe RSS), ardından değişmeden yeniden indekslenir.
+- chat: indekslenen repoya gerçek uygulama (uvicorn, lifespan dahil) üzerinden /chat/ask
+  istekleri atılır; ilk bayta kadar geçen süre (TTFB) ve toplam süre ölçülür.
+"""
+import asyncio
+import contextlib
+import logging
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.fakes import AsyncInMemorySupabase, FakeChatModel, FakeEmbeddings, InMemoryDatabase, InMemorySupabase
+from benchmarks.synthetic_repo import generate_repo, questions
+
+REPO = "bench-repo"
+USER = "bench-user"
+
+
+def peak_rss_mb() -> Dict[str, Optional[float]]:
+    """Bu süreç ve beklenmiş alt süreçleri (parçalama havuzu) için tepe RSS; Windows'ta None."""
+    try:
+        import resource
+    except ImportError:
+        return {"self": None, "children": None}
+    # Linux'ta KB, macOS'ta bayt
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return {
+        "p50": round(statistics.median(ordered), 2),
+        "p95": round(p95, 2),
+        "mean": round(statistics.fmean(ordered), 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def _build_store(db: InMemoryDatabase, embeddings: FakeEmbeddings, workdir: str):
+    from app.services.custom_supabase import CustomSupabaseVectorStore
+    from app.services.lexical_index import LexicalIndex
+
+    return CustomSupabaseVectorStore(
+        embeddings=embeddings,
+        client=InMemorySupabase(db),
+        async_client=AsyncInMemorySupabase(db),
+        lexical_index=LexicalIndex(os.path.join(workdir, "lexical_index.sqlite3")),
+    )
+
+
+def _embeddings(options: Dict[str, Any]) -> FakeEmbeddings:
+    return FakeEmbeddings(
+        dims=options["embed_dims"],
+        latency=options["embed_latency"],
+        throttle_every=options["throttle_every"],
+    )
+
+
+async def _index(store, root: str, options: Dict[str, Any], executor) -> Dict[str, Any]:
+    """rag_service.index_repository'nin klon sonrası adımları: hat + eski parçaların silinmesi."""
+    from app.core.config import settings
+    from app.services.code_chunker import CodeChunker
+    from app.services.file_filter import FileFilter
+    from app.services.ingest_pipeline import IngestPipeline
+    from app.services.near_duplicates import NearDuplicateIndex
+    from app.services.upload_engine import AdaptiveTokenBucket
+
+    bucket = None
+    if options["embed_rate"]:
+        bucket = AdaptiveTokenBucket(
+            rate=options["embed_rate"],
+            min_rate=settings.EMBED_RATE_MIN,
+            max_rate=settings.EMBED_RATE_MAX,
+            increase=settings.EMBED_RATE_INCREASE,
+        )
+    file_filter = FileFilter(root)
+    pipeline = IngestPipeline(
+        store,
+        CodeChunker(
+            max_tokens=settings.CHUNK_MAX_TOKENS,
+            overlap_tokens=settings.CHUNK_OVERLAP_TOKENS,
+            encoding_name=settings.TOKENIZER_ENCODING,
+        ),
+        batch_size=settings.INGEST_BATCH_SIZE,
+        queue_size=settings.INGEST_QUEUE_SIZE,
+        concurrency=settings.EMBED_CONCURRENCY,
+        rate_limiter=bucket,
+        base_sleep_seconds=options["retry_sleep"],
+        executor=executor,
+        file_batch_size=settings.INDEX_FILE_BATCH_SIZE,
+        max_in_flight=max(1, options["cpu_workers"]) * 2,
+        file_filter=file_filter,
+        deduplicator=NearDuplicateIndex.from_settings() if settings.DEDUP_ENABLED else None,
+    )
+    started = time.perf_counter()
+    stats = await pipeline.run(root, {"collection_name": REPO, "user_id": USER})
+    deleted = store.delete_stale(REPO, USER, pipeline.chunk_ids)
+    return {
+        "seconds": time.perf_counter() - started,
+        "files": stats.files_read,
+        "chunks": stats.chunks,
+        "skipped": stats.skipped,
+        "duplicates": stats.duplicates,
+        "retries": stats.retries,
+        "deleted": deleted,
+        "skipped_files": file_filter.report.to_dict(),
+    }
+
+
+def _cpu_pool(options: Dict[str, Any]) -> Optional[ProcessPoolExecutor]:
+    if not options["cpu_workers"]:
+        return None
+    return ProcessPoolExecutor(max_workers=options["cpu_workers"], mp_context=multiprocessing.get_context("spawn"))
+
+
+def run_index(files: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="bench-index-") as workdir:
+        root = os.path.join(workdir, "repo")
+        repo = generate_repo(root, files, seed=options["seed"], duplicate_ratio=options.get("duplicate_ratio", 0.0))
+        db = InMemoryDatabase(latency=options["db_latency"])
+        embeddings = _embeddings(options)
+        store = _build_store(db, embeddings, workdir)
+        executor = _cpu_pool(options)
+        try:
+            first = asyncio.run(_index(store, root, options, executor))
+            # Değişmeyen repo: tüm parçalar id ile atlanmalı, embedding çağrılmamalı
+            embedded_before = embeddings.texts
+            second = asyncio.run(_index(store, root, options, executor))
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+            store.lexical_index.close()
+        return {
+            "files": files,
+            "bytes": repo["bytes"],
+            "chunks": first["chunks"],
+            "seconds": round(first["seconds"], 3),
+            "files_per_s": round(first["files"] / first["seconds"], 1),
+            "chunks_per_s": round(first["chunks"] / first["seconds"], 1),
+            "embed_calls": embeddings.calls,
+            "throttled": embeddings.throttled,
+            "retries": first["retries"],
+            "deduplicated": first["duplicates"],
+            "skipped_files": first["skipped_files"]["files"],
+            "skipped_bytes": first["skipped_files"]["bytes"],
+            "reindex_seconds": round(second["seconds"], 3),
+            "reindex_skipped": second["skipped"],
+            "reindex_embedded": embeddings.texts - embedded_before,
+            "rows": len(db.tables.get("documents", {})),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+
+def _timed_ask(http, url: str, question: str) -> Dict[str, float]:
+    payload = {"collection_name": REPO, "question": question, "user_id": USER}
+    started = time.perf_counter()
+    ttfb = None
+    with http.stream("POST", url, json=payload) as response:
+        response.raise_for_status()
+        for chunk in response.iter_raw():
+            if ttfb is None and chunk:
+                ttfb = time.perf_counter() - started
+    total = time.perf_counter() - started
+    return {"ttfb_ms": (ttfb if ttfb is not None else total) * 1000, "total_ms": total * 1000}
+
+
+def run_chat(files: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    import httpx
+    import uvicorn
+
+    from app.deps import get_current_user
+    from app.limiter import limiter
+    from app.main import app
+    from app.services.chat_chain import build_chat_chain, build_prompt
+    from app.services.resources import resources
+    from app.services.retrieval_cache import retrieval_cache
+
+    with tempfile.TemporaryDirectory(prefix="bench-chat-") as workdir:
+        root = os.path.join(workdir, "repo")
+        generate_repo(root, files, seed=options["seed"])
+        db = InMemoryDatabase(latency=options["db_latency"])
+        embeddings = _embeddings({**options, "throttle_every": 0})
+        store = _build_store(db, embeddings, workdir)
+        asyncio.run(_index(store, root, {**options, "cpu_workers": 0}, None))
+
+        llm = FakeChatModel(
+            first_token_latency=options["llm_first_token"],
+            token_latency=options["llm_token_latency"],
+            answer_tokens=options["answer_tokens"],
+        )
+        prompt = build_prompt()
+        # Lifespan'deki resources.startup() bu hazır kaynakları kullanır
+        resources.__dict__.update(
+            supabase=InMemorySupabase(db),
+            supabase_auth=InMemorySupabase(db),
+            supabase_async=AsyncInMemorySupabase(db),
+            lexical_index=store.lexical_index,
+            vector_store=store,
+            prompt=prompt,
+            chat_chain=build_chat_chain(store, prompt, llm),
+        )
+        app.dependency_overrides[get_current_user] = lambda: USER
+        # İstek başına log satırları ölçülen süreye ve çıktıya karışmasın
+        logging.getLogger().setLevel(logging.WARNING)
+        # Günlük 5 soru limiti ölçümü durdurmasın
+        limiter.enabled = False
+
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            if not thread.is_alive():
+                raise RuntimeError("Benchmark sunucusu başlatılamadı.")
+            time.sleep(0.01)
+        port = server.servers[0].sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}/api/v1/chat/ask"
+
+        try:
+            retrieval_cache.query_embeddings.clear()
+            retrieval_cache.results.clear()
+            if retrieval_cache.answers is not None:
+                retrieval_cache.answers.clear()
+            asked = questions(options["chat_requests"], seed=options["seed"])
+            results = {}
+            with httpx.Client(timeout=120) as http:
+                # Isınma (bağlantı, tiktoken, ilk import'lar); ölçüme girmez
+                _timed_ask(http, url, "benchmark ısınma sorusu")
+                for mode in ("cold", "cached"):
+                    calls_before = llm.calls
+                    timings = [_timed_ask(http, url, question) for question in asked]
+                    results[mode] = {
+                        "requests": len(timings),
+                        "llm_calls": llm.calls - calls_before,
+                        "ttfb_ms": latency_summary([t["ttfb_ms"] for t in timings]),
+                        "total_ms": latency_summary([t["total_ms"] for t in timings]),
+                    }
+        finally:
+            server.should_exit = True
+            thread.join(timeout=30)
+        return {
+            "files": files,
+            "chunks": len(db.tables.get("documents", {})),
+            "answer_cache": retrieval_cache.answers is not None,
+            **results,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+
+def _quiet(fn: Callable[..., Dict[str, Any]], *args) -> Dict[str, Any]:
+    # Uygulamanın print çıktıları stdout'taki JSON'u bozmasın
+    with contextlib.redirect_stdout(sys.stderr):
+        return fn(*args)
+
+
+def run_isolated(fn: Callable[..., Dict[str, Any]], *args) -> Dict[str, Any]:
+    """Senaryoyu taze bir spawn sürecinde çalıştırır."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_quiet, fn, *args).result()
@@ -0,0 +1,121 @@
+"""
+Deterministik sentetik repo üretici. Aynı (dosya sayısı, seed) her zaman aynı ağacı üretir;
+dosyalar gerçek projelere benzer dağılımdadır (çoğu Python, bir kısmı TS/JS, Markdown, JSON)
+ve taramada atlanması gereken dizinler (.git, __pycache__) ile dosya filtresine takılması
+gereken dosyalar (.gitignore'daki build/, node_modules, lock ve minified dosyalar) de içerir.
+"""
+import json
+import os
+import random
+from typing import Dict, List
+
+WORDS = [
+    "user", "repo", "index", "chunk", "embedding", "query", "cache", "token", "session", "config",
+    "request", "response", "handler", "router", "model", "schema", "vector", "search", "upload",
+    "parser", "client", "buffer", "stream", "metric", "limit", "queue", "worker", "job", "commit",
+    "history", "message", "auth", "storage", "lexical", "rank", "filter", "batch", "retry", "pool",
+]
+
+# (uzantı, oran)
+_KINDS = [(".py", 0.65), (".ts", 0.15), (".js", 0.05), (".md", 0.10), (".json", 0.05)]
+
+
+def _name(rng: random.Random, parts: int = 2) -> str:
+    return "_".join(rng.choice(WORDS) for _ in range(parts))
+
+
+def _python_file(rng: random.Random) -> str:
+    lines = [f'"""{_name(rng, 3).replace("_", " ").capitalize()} modülü."""', "import os", ""]
+    for _ in range(rng.randint(1, 3)):
+        cls = _name(rng).title().replace("_", "")
+        lines += [f"class {cls}:", f'    """{cls} için {rng.choice(WORDS)} yönetimi."""', ""]
+        for _ in range(rng.randint(2, 6)):
+            fn = _name(rng)
+            lines += [f"    def {fn}(self, {rng.choice(WORDS)}, limit=10):"]
+            for j in range(rng.randint(3, 12)):
+                lines.append(f"        {rng.choice(WORDS)}_{j} = self.{_name(rng)}({rng.choice(WORDS)}, limit + {j})")
+            lines += [f"        return {rng.choice(WORDS)}_0", ""]
+    for _ in range(rng.randint(1, 4)):
+        fn = _name(rng)
+        lines += [f"def {fn}({rng.choice(WORDS)}):", f'    """{fn.replace("_", " ")} hesaplar."""']
+        lines += [f"    if {rng.choice(WORDS)} is None:", "        return None"]
+        lines += [f"    return os.path.join(str({rng.choice(WORDS)}), '{rng.choice(WORDS)}')", ""]
+    return "\n".join(lines) + "\n"
+
+
+def _ts_file(rng: random.Random) -> str:
+    lines = []
+    for _ in range(rng.randint(2, 6)):
+        fn = _name(rng).replace("_", "")
+        lines += [f"export async function {fn}({rng.choice(WORDS)}: string): Promise<number> {{"]
+        for j in range(rng.randint(2, 10)):
+            lines.append(f"  const {rng.choice(WORDS)}{j} = await fetch(`/api/{rng.choice(WORDS)}/${{{j}}}`);")
+        lines += ["  return 0;", "}", ""]
+    return "\n".join(lines) + "\n"
+
+
+def _markdown_file(rng: random.Random) -> str:
+    lines = [f"# {_name(rng, 2).replace('_', ' ').title()}", ""]
+    for _ in range(rng.randint(2, 6)):
+        lines += [f"## {rng.choice(WORDS).title()}", " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 80))), ""]
+    return "\n".join(lines) + "\n"
+
+
+def _json_file(rng: random.Random) -> str:
+    return json.dumps({rng.choice(WORDS): {w: rng.randint(0, 100) for w in rng.sample(WORDS, 5)} for _ in range(8)}, indent=2)
+
+
+_COMMENT = {".py": "# kopya {}\n", ".ts": "// kopya {}\n", ".js": "// kopya {}\n", ".md": "\nkopya {}\n"}
+_WRITERS = {".py": _python_file, ".ts": _ts_file, ".js": _ts_file, ".md": _markdown_file, ".json": _json_file}
+
+
+def generate_repo(root: str, files: int, seed: int = 0, duplicate_ratio: float = 0.0) -> Dict[str, int]:
+    """
+    root altında files adet indekslenebilir dosya üretir; dosya ve bayt sayısını döner.
+    duplicate_ratio oranındaki dosyalar önceki bir dosyanın küçük farklı kopyasıdır (kopyala-yapıştır).
+    """
+    rng = random.Random(seed)
+    extensions = [ext for ext, _ in _KINDS]
+    weights = [weight for _, weight in _KINDS]
+    total_bytes = 0
+    written: Dict[str, List[str]] = {}
+    for i in range(files):
+        ext = rng.choices(extensions, weights)[0]
+        directory = os.path.join(root, f"pkg{i % 20}", f"{rng.choice(WORDS)}{i % 5}")
+        os.makedirs(directory, exist_ok=True)
+        # Oran 0 iken rng'ye dokunulmaz: varsayılan repo önceki sürümlerle aynı kalır
+        if duplicate_ratio and written.get(ext) and ext != ".json" and rng.random() < duplicate_ratio:
+            content = rng.choice(written[ext]) + _COMMENT[ext].format(i)
+        else:
+            content = _WRITERS[ext](rng)
+            written.setdefault(ext, []).append(content)
+        with open(os.path.join(directory, f"{_name(rng)}_{i}{ext}"), "w", encoding="utf-8") as f:
+            f.write(content)
+        total_bytes += len(content.encode("utf-8"))
+    # Atlanması gereken dizinler
+    for skipped in (".git", "__pycache__"):
+        os.makedirs(os.path.join(root, skipped), exist_ok=True)
+        with open(os.path.join(root, skipped, "ignored.py"), "w", encoding="utf-8") as f:
+            f.write("ignored = True\n")
+    # Dosya filtresine takılması gerekenler (indekslenebilir uzantılı, sayıma girmez)
+    filtered = {
+        ".gitignore": "build/\n*.log\n",
+        "build/generated_api.py": _python_file(rng),
+        "node_modules/lib/index.js": _ts_file(rng),
+        "package-lock.json": _json_file(rng),
+        "static/app.min.js": ";".join(_ts_file(rng).splitlines()),
+    }
+    for relative_path, content in filtered.items():
+        path = os.path.join(root, *relative_path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+    return {"files": files, "bytes": total_bytes}
+
+
+def questions(count: int, seed: int = 0) -> List[str]:
+    """Birbirinden farklı (cevap önbelleğine takılmayan) deterministik sorular."""
+    rng = random.Random(seed)
+    pairs = [(a, b) for a in WORDS for b in WORDS if a != b]
+    rng.shuffle(pairs)
+    return [f"{a} ve {b} nasıl birlikte kullanılıyor?" for a, b in pairs[:count]]
@@ -0,0 +1,7 @@
+-- Artımlı indeksleme: user_repos tablosu son indekslenen commit SHA'sını tutar.
+-- Yeniden indekslemede sadece bu commit ile yeni HEAD arasındaki değişen dosyalar işlenir.
+-- NULL değer "tam indeksleme gerekli" anlamına gelir.
+-- Supabase SQL Editor'da çalıştırılmalıdır.
+
+alter table public.user_repos
+  add column if not exists indexed_commit text;
@@ -0,0 +1,19 @@
+-- documents tablosunda kiracı filtreleri gerçek kolonlara taşınır: user_id, collection_name
+-- ve source, metadata'dan türetilen (generated stored) kolonlardır ve birlikte indekslenir.
+-- Uygulama sadece metadata yazmaya devam eder; kolonlar otomatik dolar.
+-- Tablo yeniden yazılır; büyük tablolarda trafiğin az olduğu bir zamanda çalıştırın.
+-- Supabase SQL Editor'da çalıştırılmalıdır.
+
+alter table public.documents
+  add column if not exists user_id text
+    generated always as (metadata->>'user_id') stored,
+  add column if not exists collection_name text
+    generated always as (metadata->>'collection_name') stored,
+  add column if not exists source text
+    generated always as (metadata->>'source') stored;
+
+-- Repo araması (user_id, collection_name) ve dosya bazlı silme (+ source) aynı indeksi kullanır
+create index if not exists documents_tenant_source_idx
+  on public.documents (user_id, collection_name, source);
+
+analyze public.documents;
@@ -0,0 +1,20 @@
+-- Yaklaşık en yakın komşu (HNSW) indeksi; match_documents (004) repo filtresiyle birlikte kullanır.
+-- gemini-embedding-001 3072 boyutludur. pgvector'da vector tipi HNSW için 2000 boyutla
+-- sınırlı olduğundan indeks halfvec (float16) ifadesi üzerine kurulur (pgvector >= 0.7).
+-- İndeks ifadesi boyutu kendisi belirttiği için embedding kolonunun tipi değiştirilmez;
+-- tabloda farklı boyutlu satır varsa indeks kurulamaz, migration açık bir hatayla durur.
+-- Farklı boyutlu bir embedding modeli kullanılıyorsa 3072 değerlerini değiştirin.
+-- Supabase SQL Editor'da çalıştırılmalıdır.
+
+do $$
+begin
+  if exists (select 1 from public.documents where vector_dims(embedding) <> 3072 limit 1) then
+    raise exception 'documents tablosunda 3072 boyutlu olmayan embedding var; eski model satırlarını silip repoları yeniden indeksleyin.';
+  end if;
+end;
+$$;
+
+create index if not exists documents_embedding_hnsw_idx
+  on public.documents
+  using hnsw ((embedding::halfvec(3072)) halfvec_cosine_ops)
+  with (m = 16, ef_construction = 64);
@@ -0,0 +1,70 @@
+-- match_documents kiracı filtresini ANN aramasıyla aynı sorguda uygular.
+-- collection_name + user_id verildiğinde (uygulamanın tek kullanım şekli) HNSW indeksi (003)
+-- iterative scan ile taranır: filtreyi geçmeyen adaylar atlanır ve k sonuç bulunana kadar
+-- tarama sürer (pgvector >= 0.8). Planlayıcı küçük repolarda documents_tenant_source_idx
+-- ile satırları seçip kesin sıralamayı tercih edebilir; iki plan da sadece o reponun
+-- parçalarını döner. Aday listesi kesin kosinüs mesafesiyle yeniden sıralanır
+-- (relaxed_order ve halfvec yuvarlaması sırayı hafifçe bozabilir).
+-- İmza değişmedi; uygulama kodu aynı RPC'yi çağırır.
+-- Supabase SQL Editor'da çalıştırılmalıdır.
+
+create or replace function public.match_documents(
+  query_embedding vector,
+  match_threshold float,
+  match_count int,
+  filter jsonb default '{}'::jsonb
+)
+returns table (
+  id uuid,
+  content text,
+  metadata jsonb,
+  similarity float
+)
+language plpgsql
+stable
+set hnsw.iterative_scan = relaxed_order
+set hnsw.ef_search = 100
+as $$
+#variable_conflict use_column
+begin
+  if filter ? 'user_id' and filter ? 'collection_name' then
+    -- ORDER BY ifadesi indeks ifadesiyle birebir aynı olmalı ki HNSW kullanılsın
+    return query
+      select
+        c.id,
+        c.content,
+        c.metadata,
+        1 - (c.embedding <=> query_embedding) as similarity
+      from (
+        select d.id, d.content, d.metadata, d.embedding
+        from public.documents d
+        where
+          d.user_id = filter->>'user_id'
+          and d.collection_name = filter->>'collection_name'
+          and d.metadata @> filter
+        order by d.embedding::halfvec(3072) <=> query_embedding::halfvec(3072)
+        limit match_count * 4
+      ) c
+      where 1 - (c.embedding <=> query_embedding) > match_threshold
+      order by c.embedding <=> query_embedding
+      limit match_count;
+  else
+    return query
+      select
+        c.id,
+        c.content,
+        c.metadata,
+        1 - (c.embedding <=> query_embedding) as similarity
+      from (
+        select d.id, d.content, d.metadata, d.embedding
+        from public.documents d
+        where filter = '{}'::jsonb or d.metadata @> filter
+        order by d.embedding::halfvec(3072) <=> query_embedding::halfvec(3072)
+        limit match_count * 4
+      ) c
+      where 1 - (c.embedding <=> query_embedding) > match_threshold
+      order by c.embedding <=> query_embedding
+      limit match_count;
+  end if;
+end;
+$$;
@@ -0,0 +1,32 @@
+-- Yeniden indekslemede eski parçaları tek çağrıda silen fonksiyon.
+-- Parça id'leri (user_id, collection_name, source, içerik hash'i) üzerinden deterministik
+-- üretilir ve satırlar upsert edilir; indeksleme bitince repoda id'si keep_ids'te olmayan
+-- satırlar (değişen/silinen parçalar, eski rastgele id'li satırlar) küme farkıyla silinir.
+-- p_sources verilirse (artımlı indeksleme) sadece o dosyaların satırlarına bakılır.
+-- Silinen satır sayısını döner. 002 numaralı migration'dan sonra çalıştırılmalıdır.
+-- Supabase SQL Editor'da çalıştırılmalıdır.
+
+create or replace function public.delete_stale_documents(
+  p_user_id text,
+  p_collection_name text,
+  keep_ids uuid[],
+  p_sources text[] default null
+)
+returns bigint
+language sql
+volatile
+as $$
+  with deleted as (
+    delete from public.documents d
+    where d.user_id = p_user_id
+      and d.collection_name = p_collection_name
+      and (p_sources is null or d.source = any(p_sources))
+      -- Binlerce id için hash anti-join (id <> all(...) satır başına diziyi tarar)
+      and not exists (select 1 from unnest(keep_ids) as k(id) where k.id = d.id)
+    returning 1
+  )
+  select count(*) from deleted;
+$$;
+
+-- Sadece sunucu (service role) çağırır
+revoke execute on function public.delete_stale_documents(text, text, uuid[], text[]) from public, anon, authenticated;
@@ -0,0 +1,9 @@
+-- /chat/history keyset sayfalaması: (user_id, repo_name) eşitlik, (created_at, id) azalan sıra.
+-- Sorgu "created_at < c or (created_at = c and id < i)" ile indeksten sırayla okur,
+-- limit kadar satırda durur; geçmiş uzadıkça sayfa maliyeti sabit kalır.
+-- Supabase SQL Editor'da çalıştırılmalıdır.
+
+create index if not exists chat_messages_history_idx
+  on public.chat_messages (user_id, repo_name, created_at desc, id desc);
+
+analyze public.chat_messages;
@@ -0,0 +1,19 @@
+"""
+Testler geliştirme verisine (backend/data) dokunmaz: önbellek, indeks ve sayaç dosyaları
+her test çalıştırmasında boş bir geçici dizinde oluşturulur. app.core.config import
+edilmeden önce çalışmalıdır.
+"""
+import os
+import tempfile
+
+_data = tempfile.mkdtemp(prefix="repo-analyst-tests-")
+
+os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(_data, "embedding_cache.sqlite3"))
+os.environ.setdefault("LEXICAL_INDEX_PATH", os.path.join(_data, "lexical_index.sqlite3"))
+os.environ.setdefault("INDEX_JOBS_PATH", os.path.join(_data, "index_jobs.sqlite3"))
+os.environ.setdefault("CACHE_VERSIONS_PATH", os.path.join(_data, "cache_versions.sqlite3"))
+os.environ.setdefault("LOCAL_VECTOR_DIR", os.path.join(_data, "vectors"))
+os.environ.setdefault("TEMP_REPO_DIR", os.path.join(_data, "temp_repos"))
+os.environ.setdefault(
+    "RATE_LIMIT_STORAGE_URI", "sqlite:///" + os.path.join(_data, "rate_limits.sqlite3").lstrip("/")
+)
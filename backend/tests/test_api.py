@@ -16,6 +16,7 @@ from app.main import app
 from app.deps import get_current_user
 from app.api.endpoints import repo as repo_module
 from app.api.endpoints import chat as chat_module
+from app.services.resources import resources
 
 
 TEST_USER_ID = "test-user-id"
@@ -50,6 +51,7 @@ def test_health_ok():
     body = resp.json()
     assert body.get("status") == "healthy"
     assert "model" in body
+    assert "embedding_cache" not in body
 
 
 def test_repo_index_success(monkeypatch):
@@ -76,21 +78,11 @@ def test_repo_index_success(monkeypatch):
             return DummyResponse(data=self._data, count=self.count)
 
     class DummySupabase:
-        def __init__(self):
-            self.calls = 0
-
         def table(self, name: str):
-            self.calls += 1
-            # 1. çağrı: count sorgusu, 0 kayıt
-            if self.calls == 1 and name == "user_repos":
-                return DummyTable(data=[], count=0)
-            # 2. çağrı: existing repo kontrolü, yine boş
-            if self.calls == 2 and name == "user_repos":
-                return DummyTable(data=[])
-            # Diğer çağrılar için boş sonuç
+            # Kullanıcının indekslenmiş reposu yok
             return DummyTable(data=[])
 
-    async def fake_index_repository(repo_url: str, user_id: str):
+    async def fake_index_repository(repo_url: str, user_id: str, job=None):
         return {
             "status": "success",
             "message": "indexed in tests",
@@ -98,7 +90,7 @@ def test_repo_index_success(monkeypatch):
             "repo_name": repo_url.split("/")[-1].replace(".git", ""),
         }
 
-    monkeypatch.setattr(repo_module, "supabase", DummySupabase())
+    monkeypatch.setitem(resources.__dict__, "supabase", DummySupabase())
     monkeypatch.setattr(repo_module.rag_service, "index_repository", fake_index_repository)
 
     payload = {
@@ -112,11 +104,81 @@ def test_repo_index_success(monkeypatch):
         headers={"Authorization": "Bearer dummy"},
     )
 
-    assert resp.status_code == 200
+    assert resp.status_code == 202
     body = resp.json()
-    assert body.get("status") == "success"
+    assert body.get("status") == "queued"
     assert body.get("repo_name") == "repo"
 
+    # İş arka planda tamamlanmalı ve durumu sorgulanabilmeli
+    repo_module.index_queue.wait(body["job_id"], timeout=5)
+    resp_job = client.get(
+        f"/api/v1/repo/jobs/{body['job_id']}",
+        headers={"Authorization": "Bearer dummy"},
+    )
+    assert resp_job.status_code == 200
+    job = resp_job.json()
+    assert job["status"] == "succeeded"
+    assert job["result"]["repo_name"] == "repo"
+
+
+def test_repo_index_limit_ignores_reindexed_repos(monkeypatch):
+    """Zaten indekslenmiş reponun yeniden indekslenmesi 3 repo limitinde ikinci kez sayılmamalı."""
+    from app.services.index_jobs import IndexJobQueue
+
+    class DummyTable:
+        def select(self, *_, **__):
+            return self
+
+        def eq(self, *_, **__):
+            return self
+
+        def execute(self):
+            return DummyResponse(data=[{"repo_name": "a"}, {"repo_name": "b"}])
+
+    queue = IndexJobQueue(runner=None)
+    queue._ensure_workers = lambda: None
+    queue.submit(TEST_USER_ID, "https://github.com/example/a", "a")  # yeniden indeksleme kuyrukta
+    monkeypatch.setattr(repo_module, "index_queue", queue)
+    monkeypatch.setitem(resources.__dict__, "supabase", SimpleNamespace(table=lambda name: DummyTable()))
+
+    def index(repo):
+        return client.post(
+            "/api/v1/repo/index",
+            json={"repo_url": f"https://github.com/example/{repo}", "user_id": TEST_USER_ID},
+            headers={"Authorization": "Bearer dummy"},
+        )
+
+    assert index("c").status_code == 202
+    resp = index("d")
+    assert resp.status_code == 400
+    assert "Repo limiti" in resp.json()["detail"]
+
+
+def test_index_job_cancel_and_fairness():
+    """Kuyruktaki iş iptal edilebilmeli; kullanıcılar arasında round-robin uygulanmalı."""
+    from app.services.index_jobs import IndexJobQueue, JobStatus
+
+    queue = IndexJobQueue(runner=None, worker_count=1)
+    queue._ensure_workers = lambda: None  # worker başlatmadan sıralamayı test et
+
+    a1 = queue.submit("user-a", "https://github.com/a/one", "one")
+    a2 = queue.submit("user-a", "https://github.com/a/two", "two")
+    b1 = queue.submit("user-b", "https://github.com/b/three", "three")
+    assert queue.submit("user-a", "https://github.com/a/one", "one").id == a1.id
+
+    assert queue._take_next().id == a1.id
+    assert queue._take_next().id == b1.id
+
+    assert queue.cancel(a2.id).status == JobStatus.CANCELLED
+    assert queue.get(a2.id).status == JobStatus.CANCELLED
+    assert queue.active_repo_names("user-a") == {"one"}
+
+    resp = client.post(
+        f"/api/v1/repo/jobs/{a1.id}/cancel",
+        headers={"Authorization": "Bearer dummy"},
+    )
+    assert resp.status_code == 404
+
 
 def test_repo_list_returns_data(monkeypatch):
     """Kullanıcının repolarını listeleyen uç noktanın Supabase ile entegrasyonu."""
@@ -146,8 +208,8 @@ def test_repo_list_returns_data(monkeypatch):
             assert name == "user_repos"
             return DummyTable(sample)
 
-    # RAGService içindeki supabase'i değiştiriyoruz
-    monkeypatch.setattr(repo_module.rag_service, "supabase", DummySupabase())
+    # Paylaşılan supabase istemcisini değiştiriyoruz
+    monkeypatch.setitem(resources.__dict__, "supabase", DummySupabase())
 
     resp = client.get(
         "/api/v1/repo/list",
@@ -170,9 +232,10 @@ def test_chat_save_and_history(monkeypatch):
         def __init__(self, data):
             self._data = data
 
-        def insert(self, record):
-            self._data.append(record)
-            return DummyResponse(data=[record])
+        def insert(self, records):
+            # Tampon toplu insert yapar (satır listesi)
+            self._data.extend(records if isinstance(records, list) else [records])
+            return DummyResponse(data=records)
 
         def select(self, *_, **__):
             return self
@@ -183,6 +246,9 @@ def test_chat_save_and_history(monkeypatch):
         def order(self, *_, **__):
             return self
 
+        def limit(self, *_, **__):
+            return self
+
         def execute(self):
             return DummyResponse(data=self._data)
 
@@ -191,7 +257,7 @@ def test_chat_save_and_history(monkeypatch):
             assert name == "chat_messages"
             return ChatMessagesTable(storage)
 
-    monkeypatch.setattr(chat_module, "supabase", DummySupabase())
+    monkeypatch.setitem(resources.__dict__, "supabase", DummySupabase())
 
     # 1) Mesaj kaydet
     payload = {
@@ -207,10 +273,9 @@ def test_chat_save_and_history(monkeypatch):
         headers={"Authorization": "Bearer dummy"},
     )
     assert resp.status_code == 200
-    assert resp.json().get("status") == "saved"
-    assert len(storage) == 1
+    assert resp.json().get("status") == "queued"
 
-    # 2) Geçmişi oku
+    # 2) Geçmişi oku (tamponda bekleyen mesaj önce yazılır)
     resp_hist = client.get(
         "/api/v1/chat/history",
         params={"user_id": TEST_USER_ID, "repo_name": "demo_repo"},
@@ -221,4 +286,200 @@ def test_chat_save_and_history(monkeypatch):
     history = resp_hist.json()
     assert isinstance(history, list)
     assert history[0]["content"] == "bu bir test mesajıdır"
+    assert len(storage) == 1
+
+    # 3) Soru + cevap tek istekte
+    batch = {"messages": [{**payload, "content": "soru"}, {**payload, "role": "ai", "content": "cevap"}]}
+    resp_batch = client.post("/api/v1/chat/save/batch", json=batch, headers={"Authorization": "Bearer dummy"})
+    assert resp_batch.json() == {"status": "queued", "count": 2}
+    forged = {"messages": [{**payload, "user_id": "baskasi"}]}
+    assert client.post("/api/v1/chat/save/batch", json=forged, headers={"Authorization": "Bearer dummy"}).status_code == 403
+
+    from app.services.message_buffer import message_buffer
+
+    message_buffer.flush()
+    assert [m["content"] for m in storage[1:]] == ["soru", "cevap"]
+    assert storage[1]["created_at"] < storage[2]["created_at"]
+
+
+
+def test_chat_history_keyset_pages_and_etag(monkeypatch):
+    """Geçmiş en yeni sayfadan başlar; imleç daha eski sayfayı, ETag 304'ü sağlar."""
+
+    messages = [
+        {"id": i, "role": "user", "content": f"mesaj {i}", "created_at": f"2024-01-01T00:00:0{i}+00:00"}
+        for i in range(1, 6)
+    ]
+
+    class HistoryQuery:
+        def __init__(self):
+            self.rows = list(messages)
+            self.row_limit = None
+
+        def select(self, columns):
+            assert columns == "id, role, content, created_at"
+            return self
+
+        def eq(self, *_):
+            return self
+
+        def or_(self, filters):
+            # created_at.lt."<ts>",and(...id.lt."<id>") → imleçten eski satırlar
+            created_at = filters.split('"')[1]
+            self.rows = [r for r in self.rows if r["created_at"] < created_at]
+            return self
 
+        def order(self, column, desc=False):
+            return self
+
+        def limit(self, count):
+            self.row_limit = count
+            return self
+
+        def execute(self):
+            ordered = sorted(self.rows, key=lambda r: (r["created_at"], r["id"]), reverse=True)
+            return DummyResponse(data=ordered[:self.row_limit])
+
+    class DummySupabase:
+        def table(self, name):
+            return HistoryQuery()
+
+    monkeypatch.setitem(resources.__dict__, "supabase", DummySupabase())
+    headers = {"Authorization": "Bearer dummy"}
+    params = {"user_id": TEST_USER_ID, "repo_name": "demo_repo", "limit": 2}
+
+    first = client.get("/api/v1/chat/history", params=params, headers=headers)
+    assert [m["id"] for m in first.json()] == [4, 5]
+    cursor = first.headers["x-next-cursor"]
+
+    second = client.get("/api/v1/chat/history", params={**params, "before": cursor}, headers=headers)
+    assert [m["id"] for m in second.json()] == [2, 3]
+    last = client.get(
+        "/api/v1/chat/history", params={**params, "before": second.headers["x-next-cursor"]}, headers=headers
+    )
+    assert [m["id"] for m in last.json()] == [1]
+    assert "x-next-cursor" not in last.headers
+
+    cached = client.get("/api/v1/chat/history", params=params, headers={**headers, "If-None-Match": first.headers["etag"]})
+    assert cached.status_code == 304
+    assert client.get("/api/v1/chat/history", params={**params, "before": "bozuk"}, headers=headers).status_code == 400
+    # Biçimi geçerli ama içeriği filtreyi bozan imleçler de sorguya gitmeden reddedilir
+    import base64
+    import json
+
+    for values in (['2024-01-01",id.gt."0', 1], ["2024-01-01T00:00:00+00:00", '1",or(id.gt.0)']):
+        forged = base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+        assert client.get(
+            "/api/v1/chat/history", params={**params, "before": forged}, headers=headers
+        ).status_code == 400
+    assert client.get("/api/v1/chat/history", params={**params, "limit": 10_000}, headers=headers).status_code == 422
+
+
+def test_chat_ask_replays_cached_answer_without_llm(monkeypatch):
+    """Benzer soru önbellekten akıtılır; yeniden indeksleme (invalidate) sonrası LLM tekrar çağrılır."""
+    from app.services.retrieval_cache import retrieval_cache
+
+    class FakeChain:
+        calls = 0
+
+        async def astream(self, chain_input):
+            FakeChain.calls += 1
+            for chunk in ["FastAPI ", "kullanılıyor."]:
+                yield chunk
+
+    class FakeEmbeddings:
+        async def aembed_query(self, text):
+            # "hangi" içeren sorular aynı yöne düşer (eşiğin üstünde benzer)
+            return [1.0, 0.0, 0.01] if "hangi" in text.lower() else [0.0, 1.0, 0.0]
+
+    monkeypatch.setitem(resources.__dict__, "chat_chain", FakeChain())
+    monkeypatch.setitem(resources.__dict__, "vector_store", SimpleNamespace(embeddings=FakeEmbeddings()))
+    retrieval_cache.query_embeddings.clear()
+    retrieval_cache.answers.clear()
+
+    def ask(question):
+        payload = {"collection_name": "cache-repo", "question": question, "user_id": TEST_USER_ID}
+        response = client.post("/api/v1/chat/ask", json=payload)
+        assert response.status_code == 200
+        return response.text
+
+    assert ask("Hangi framework kullanılıyor?") == "FastAPI kullanılıyor."
+    assert ask("hangi framework kullanılır") == "FastAPI kullanılıyor."
+    assert FakeChain.calls == 1
+
+    ask("Testler nerede?")
+    assert FakeChain.calls == 2
+
+    retrieval_cache.invalidate("cache-repo", TEST_USER_ID)
+    assert ask("Hangi framework kullanılıyor?") == "FastAPI kullanılıyor."
+    assert FakeChain.calls == 3
+
+
+def test_chat_ask_cache_hits_do_not_spend_daily_quota(monkeypatch):
+    """Günlük /ask hakkı sadece LLM'e giden (önbellekte olmayan) sorulardan düşer."""
+    from app.limiter import limiter
+    from app.services.retrieval_cache import retrieval_cache
+
+    class FakeChain:
+        async def astream(self, chain_input):
+            yield "cevap"
+
+    class FakeEmbeddings:
+        async def aembed_query(self, text):
+            axis = ["aynı", "başka", "üçüncü"].index(text.split()[0])
+            return [1.0 if i == axis else 0.0 for i in range(3)]
+
+    monkeypatch.setitem(resources.__dict__, "chat_chain", FakeChain())
+    monkeypatch.setitem(resources.__dict__, "vector_store", SimpleNamespace(embeddings=FakeEmbeddings()))
+    monkeypatch.setattr(chat_module, "ASK_DAILY_LIMIT", "2/day")
+    retrieval_cache.query_embeddings.clear()
+    retrieval_cache.answers.clear()
+    limiter.reset()
+
+    def ask(question):
+        payload = {"collection_name": "quota-repo", "question": question, "user_id": TEST_USER_ID}
+        return client.post("/api/v1/chat/ask", json=payload).status_code
+
+    assert ask("aynı soru") == 200
+    assert [ask("aynı soru") for _ in range(5)] == [200] * 5
+    assert ask("başka soru") == 200
+    assert ask("üçüncü soru") == 429
+    assert ask("aynı soru") == 200
+    limiter.reset()
+
+
+def test_server_timing_header_and_metrics_endpoint(monkeypatch):
+    """Aşama süreleri Server-Timing başlığına ve /metrics histogramlarına yazılır."""
+    from app.core.config import settings
+
+
+    class HistoryTable:
+        def select(self, *_, **__):
+            return self
+
+        eq = order = limit = select
+
+        def execute(self):
+            return DummyResponse(data=[])
+
+    monkeypatch.setitem(resources.__dict__, "supabase", SimpleNamespace(table=lambda name: HistoryTable()))
+
+    response = client.get("/api/v1/chat/history", params={"user_id": TEST_USER_ID, "repo_name": "metrics-repo"})
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    assert "history_query;dur=" in timing and "app;dur=" in timing
+    # Yol parametresinin değeri şablonun başka bir parçasıyla aynı olsa da etiket şablondur
+    assert client.get("/api/v1/repo/jobs/jobs").status_code == 404
+
+    # Token ayarlı değilse /metrics kapalıdır; ayarlıysa Bearer token ister
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "")
+    assert client.get("/metrics").status_code == 404
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "metrik-token")
+    assert client.get("/metrics").status_code == 401
+    body = client.get("/metrics", headers={"Authorization": "Bearer metrik-token"}).text
+    assert 'repo_analyst_stage_duration_seconds_count{stage="history_query"}' in body
+    assert 'route="/api/v1/chat/history"' in body
+    assert 'route="/api/v1/repo/jobs/{job_id}"' in body
+    assert "repo_analyst_message_buffer_pending" in body
+    assert "repo_analyst_embedding_cache_entries" in body
+    assert "repo_analyst_results_cache_hits" in body
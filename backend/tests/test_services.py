@@ -0,0 +1,1245 @@
+"""
+Servis katmanı testleri. Ağ çağrıları sahte nesnelerle değiştirilir.
+"""
+import asyncio
+import os
+import threading
+
+import pytest
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.services.ingest_pipeline import IngestPipeline
+
+
+class RecordingVectorStore:
+    """add_documents çağrılarını kaydeden sahte vektör deposu."""
+
+    def __init__(self):
+        self.batches = []
+
+    def add_documents(self, docs, **kwargs):
+        self.batches.append(list(docs))
+        return [str(i) for i in range(len(docs))]
+
+
+def _write_repo(root, file_count):
+    for i in range(file_count):
+        sub = os.path.join(root, f"pkg{i % 3}")
+        os.makedirs(sub, exist_ok=True)
+        with open(os.path.join(sub, f"mod{i}.py"), "w", encoding="utf-8") as f:
+            f.write(f"def func_{i}():\n    return {i}\n")
+    os.makedirs(os.path.join(root, ".git"), exist_ok=True)
+    with open(os.path.join(root, ".git", "config.py"), "w") as f:
+        f.write("ignored = True\n")
+    with open(os.path.join(root, "empty.py"), "w") as f:
+        f.write("   \n")
+
+
+def test_ingest_pipeline_streams_in_batches(tmp_path):
+    _write_repo(tmp_path, 30)
+    store = RecordingVectorStore()
+    pipeline = IngestPipeline(
+        store,
+        RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200),
+        batch_size=8,
+        queue_size=2,
+    )
+
+    stats = asyncio.run(pipeline.run(str(tmp_path), {"collection_name": "demo", "user_id": "u1"}))
+
+    assert stats.files_read == 30
+    assert stats.chunks == 30
+    assert sorted(len(b) for b in store.batches) == [6, 8, 8, 8]
+    sources = {d.metadata["source"] for b in store.batches for d in b}
+    assert not any(s.startswith(".git") for s in sources)
+    assert all(d.metadata["user_id"] == "u1" for b in store.batches for d in b)
+
+
+def test_ingest_pipeline_process_pool_matches_in_process_order(tmp_path):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    from app.services.code_chunker import CodeChunker
+
+    _write_repo(tmp_path, 40)
+    meta = {"collection_name": "demo", "user_id": "u1"}
+
+    def run(executor):
+        store = RecordingVectorStore()
+        pipeline = IngestPipeline(
+            store, CodeChunker(max_tokens=64, overlap_tokens=8), batch_size=7, concurrency=1,
+            executor=executor, file_batch_size=3, max_in_flight=4,
+        )
+        stats = asyncio.run(pipeline.run(str(tmp_path), meta))
+        return stats, [(d.id, d.metadata["source"]) for b in store.batches for d in b]
+
+    baseline_stats, baseline = run(None)
+    with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pooled_stats, pooled = run(pool)
+
+    assert pooled == baseline  # dosya sırası korunur, id'ler aynı
+    assert pooled_stats.files_read == baseline_stats.files_read == 40
+    assert len({chunk_id for chunk_id, _ in pooled}) == 40
+
+def _make_bare_repo(tmp_path):
+    """Yerel bir bare repo oluşturur; partial clone için uploadpack.allowFilter açılır."""
+    from git import Actor, Repo
+
+    work = tmp_path / "work"
+    os.makedirs(work / "src")
+    os.makedirs(work / ".github")
+    (work / "src" / "app.py").write_text("print('hello')\n")
+    (work / "README.md").write_text("# demo\n")
+    (work / ".github" / "ci.json").write_text("{}\n")
+    (work / "logo.png").write_bytes(os.urandom(64 * 1024))
+
+    repo = Repo.init(work)
+    repo.index.add(["src/app.py", "README.md", ".github/ci.json", "logo.png"])
+    author = Actor("test", "test@example.com")
+    repo.index.commit("first", author=author, committer=author)
+    (work / "src" / "app.py").write_text("print('hello again')\n")
+    repo.index.add(["src/app.py"])
+    repo.index.commit("second", author=author, committer=author)
+
+    bare = Repo.clone_from(str(work), str(tmp_path / "origin.git"), bare=True)
+    bare.git.config("uploadpack.allowFilter", "true")
+    bare.git.config("uploadpack.allowAnySHA1InWant", "true")
+    return repo, f"file://{tmp_path / 'origin.git'}"
+
+
+def test_git_service_shallow_sparse_clone(tmp_path):
+    from app.services.git_service import GitService
+
+    work_repo, url = _make_bare_repo(tmp_path)
+    result = GitService.clone_repository(url, str(tmp_path / "clone"), depth=1, blob_filter="blob:none", sparse=True)
+
+    checked_out = sorted(
+        os.path.relpath(os.path.join(root, f), result.path).replace(os.sep, "/")
+        for root, dirs, files in os.walk(result.path)
+        if ".git" not in root.split(os.sep)
+        for f in files
+    )
+    assert checked_out == ["README.md", "src/app.py"]
+    assert result.commit == work_repo.head.commit.hexsha
+    assert os.path.exists(os.path.join(result.path, ".git", "shallow"))
+    assert result.bytes_transferred > 0
+    assert result.duration_seconds > 0
+
+
+def test_git_service_file_limit_checked_before_checkout(tmp_path):
+    from app.services.git_service import GitService
+
+    _, url = _make_bare_repo(tmp_path)
+    target = tmp_path / "clone"
+    with pytest.raises(Exception, match="dosya sayısı limiti"):
+        GitService.clone_repository(url, str(target), max_file_count=1)
+    assert not target.exists()
+
+
+def test_git_service_diff_commits_from_shallow_clone(tmp_path):
+    from git import Actor
+
+    from app.services.git_service import GitService
+
+    work_repo, url = _make_bare_repo(tmp_path)
+    old_commit = work_repo.head.commit.hexsha
+
+    work = tmp_path / "work"
+    os.makedirs(work / "docs")
+    work_repo.index.move(["README.md", "docs/README.md"])
+    (work / "src" / "app.py").write_text("print('changed')\n")
+    (work / "src" / "new.py").write_text("x = 1\n")
+    work_repo.index.add(["src/app.py", "src/new.py"])
+    author = Actor("test", "test@example.com")
+    work_repo.index.commit("third", author=author, committer=author)
+    work_repo.git.push(str(tmp_path / "origin.git"), f"HEAD:{work_repo.active_branch.name}")
+
+    clone = GitService.clone_repository(url, str(tmp_path / "clone"))
+    diff = GitService.diff_commits(clone.path, old_commit, clone.commit)
+
+    assert sorted(diff.upserted) == ["docs/README.md", "src/app.py", "src/new.py"]
+    assert diff.deleted == ["README.md"]
+
+
+class CountingEmbeddings:
+    """Her metin için deterministik vektör üreten, çağrıları sayan sahte model."""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0, 0.5] for t in texts]
+
+    def embed_query(self, text):
+        return [0.0, 0.0, 1.0]
+
+
+def test_cached_embeddings_skip_network_on_hit(tmp_path):
+    from app.services.embedding_cache import CachedEmbeddings, EmbeddingCacheStore
+
+    model = CountingEmbeddings()
+    store = EmbeddingCacheStore(str(tmp_path / "cache.sqlite3"), max_bytes=1024 * 1024)
+    cached = CachedEmbeddings(model, store, namespace="models/test")
+
+    first = cached.embed_documents(["a = 1", "b = 2", "a = 1"])
+    assert model.calls == [["a = 1", "b = 2"]]
+    assert first[0] == first[2] == [5.0, 1.0, 0.5]
+
+    # Satır sonu boşlukları normalize edilir; ikinci çağrı ağa çıkmaz
+    second = cached.embed_documents(["b = 2  ", "a = 1"])
+    assert len(model.calls) == 1
+    assert second == [[5.0, 1.0, 0.5], [5.0, 1.0, 0.5]]
+    assert cached.stats()["hits"] == 3
+    assert cached.stats()["misses"] == 2
+
+    # Farklı model adı farklı anahtar üretir
+    other = CachedEmbeddings(model, store, namespace="models/other")
+    other.embed_documents(["a = 1"])
+    assert len(model.calls) == 2
+
+
+def test_embedding_cache_store_evicts_least_recently_used(tmp_path):
+    from app.services.embedding_cache import EmbeddingCacheStore
+
+    # Her vektör 3 * 4 = 12 bayt; sınır 3 kayda izin verir
+    store = EmbeddingCacheStore(str(tmp_path / "cache.sqlite3"), max_bytes=36)
+    store.put_many({"k1": [1, 2, 3]})
+    store.put_many({"k2": [1, 2, 3]})
+    store.put_many({"k3": [1, 2, 3]})
+    store.get_many(["k1"])  # k1 yeniden kullanıldı, k2 en eski
+    store.put_many({"k4": [1, 2, 3]})
+
+    remaining = store.get_many(["k1", "k2", "k3", "k4"])
+    assert "k2" not in remaining
+    assert {"k1", "k4"} <= set(remaining)
+    assert store.stats()["bytes"] <= 36
+
+
+def test_token_bucket_aimd():
+    from app.services.upload_engine import AdaptiveTokenBucket
+
+    bucket = AdaptiveTokenBucket(rate=10, min_rate=1, max_rate=12, increase=1)
+    assert bucket.reserve(10) == 0
+    assert bucket.reserve(5) > 0  # borç: beklemek gerekir
+
+    bucket.on_success()
+    bucket.on_success()
+    bucket.on_success()
+    assert bucket.rate == 12  # max_rate ile sınırlı
+    bucket.on_throttle()
+    assert bucket.rate == 6
+    assert bucket.tokens <= 0
+
+
+def test_upload_engine_runs_batches_concurrently_and_retries_429():
+    import threading
+    import time
+
+    from langchain_core.documents import Document
+
+    from app.services.upload_engine import AdaptiveTokenBucket, UploadEngine
+
+    class SlowStore:
+        def __init__(self):
+            self.in_flight = 0
+            self.max_in_flight = 0
+            self.failed_once = False
+            self.uploaded = []
+            self.lock = threading.Lock()
+
+        def add_documents(self, docs):
+            with self.lock:
+                if not self.failed_once:
+                    self.failed_once = True
+                    raise Exception("429 RESOURCE_EXHAUSTED")
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            time.sleep(0.05)
+            with self.lock:
+                self.in_flight -= 1
+                self.uploaded.extend(docs)
+
+    store = SlowStore()
+    bucket = AdaptiveTokenBucket(rate=1000, min_rate=10, max_rate=1000, increase=1)
+
+    async def run():
+        engine = UploadEngine(store, bucket, concurrency=3, base_sleep_seconds=0.01)
+        for i in range(6):
+            await engine.submit([Document(page_content=f"chunk {i}")])
+        await engine.drain()
+        return engine
+
+    engine = asyncio.run(run())
+    assert len(store.uploaded) == 6
+    assert store.max_in_flight > 1
+    assert engine.retries == 1
+    assert bucket.throttled == 1
+
+
+def test_retrieval_cache_skips_embed_and_rpc_until_invalidated():
+    from types import SimpleNamespace
+
+    from app.services.custom_supabase import CustomSupabaseVectorStore
+    from app.services.retrieval_cache import retrieval_cache
+
+    class QueryEmbeddings:
+        calls = 0
+
+        def embed_query(self, text):
+            QueryEmbeddings.calls += 1
+            return [0.1, 0.2, 0.3]
+
+    class FakeClient:
+        rpc_calls = 0
+
+        def rpc(self, name, params):
+            FakeClient.rpc_calls += 1
+            row = {"content": "def f(): pass", "metadata": {"source": "a.py"}, "similarity": 0.9}
+            return SimpleNamespace(execute=lambda: SimpleNamespace(data=[row]))
+
+        def table(self, name):
+            class Query:
+                def delete(self):
+                    return self
+
+                def eq(self, *_):
+                    return self
+
+                def execute(self):
+                    return SimpleNamespace(data=[])
+            return Query()
+
+    retrieval_cache.query_embeddings.clear()
+    retrieval_cache.results.clear()
+    store = CustomSupabaseVectorStore(embeddings=QueryEmbeddings())
+    store._client = FakeClient()
+    filt = {"collection_name": "demo", "user_id": "u1"}
+
+    first = store.similarity_search("What framework is used?", k=5, filter=filt)
+    second = store.similarity_search("  what framework is USED ", k=5, filter=filt)
+    assert first[0].page_content == second[0].page_content
+    assert QueryEmbeddings.calls == 1
+    assert FakeClient.rpc_calls == 1
+
+    store.delete_collection("demo", "u1")
+    store.similarity_search("what framework is used", k=5, filter=filt)
+    assert QueryEmbeddings.calls == 1
+    assert FakeClient.rpc_calls == 2
+
+
+def test_cache_invalidation_reaches_other_workers(tmp_path):
+    from app.services.answer_cache import SemanticAnswerCache
+    from app.services.cache_versions import RepoVersions
+    from app.services.retrieval_cache import RetrievalCache
+
+    # İki worker aynı sürüm dosyasını paylaşır, bellek içi kayıtları ayrıdır
+    path = str(tmp_path / "versions.sqlite3")
+    workers = [
+        RetrievalCache(16, 60, 16, 60, answers=SemanticAnswerCache(versions=RepoVersions(path)))
+        for _ in range(2)
+    ]
+    indexer, other = workers
+    filt = {"collection_name": "demo", "user_id": "u1"}
+    key = other.result_key([1.0, 0.0], 5, filt, 0.5)
+    other.results.set(key, ["eski sonuç"])
+    version = other.answers.version("demo", "u1")
+    assert other.answers.put("demo", "u1", [1.0, 0.0], ["eski cevap"], version=version)
+    assert other.answers.get("demo", "u1", [1.0, 0.0]) == ["eski cevap"]
+
+    indexer.invalidate("demo", "u1")
+    assert other.results.get(other.result_key([1.0, 0.0], 5, filt, 0.5)) is None
+    assert other.answers.get("demo", "u1", [1.0, 0.0]) is None
+    # İndeksleme sırasında başlayıp sonra biten cevap saklanmaz
+    assert not other.answers.put("demo", "u1", [1.0, 0.0], ["eski cevap"], version=version)
+
+
+def test_supabase_deletes_fall_back_to_metadata_without_tenant_columns():
+    from types import SimpleNamespace
+
+    from postgrest.exceptions import APIError
+
+    from app.services.custom_supabase import CustomSupabaseVectorStore
+
+    filters = []
+
+    class Query:
+        def __init__(self):
+            self.columns = []
+
+        def delete(self):
+            return self
+
+        def eq(self, column, value):
+            self.columns.append(column)
+            return self
+
+        def in_(self, column, values):
+            return self.eq(column, values)
+
+        def execute(self):
+            missing = [c for c in self.columns if c in ("collection_name", "user_id", "source")]
+            if missing:
+                raise APIError({"code": "42703", "message": f"column documents.{missing[0]} does not exist"})
+            filters.append(self.columns)
+            return SimpleNamespace(data=[])
+
+    store = CustomSupabaseVectorStore(embeddings=None, client=SimpleNamespace(table=lambda name: Query()))
+    # Migration 002 yoksa silme 500 yerine metadata filtresiyle yapılır
+    store.delete_collection("demo", "u1")
+    store.delete_sources("demo", "u1", ["a.py"])
+    assert filters == [
+        ["metadata->>collection_name", "metadata->>user_id"],
+        ["metadata->>collection_name", "metadata->>user_id", "metadata->>source"],
+    ]
+
+
+def test_async_retrieval_uses_async_embedding_and_rpc_concurrently():
+    import time
+    from types import SimpleNamespace
+
+    from app.services.custom_supabase import CustomSupabaseVectorStore
+    from app.services.retrieval_cache import retrieval_cache
+
+    class AsyncOnlyEmbeddings:
+        def embed_query(self, text):
+            raise AssertionError("senkron embed_query çağrılmamalı")
+
+        async def aembed_query(self, text):
+            await asyncio.sleep(0.05)
+            return [float(len(text)), 1.0]
+
+    class AsyncClient:
+        calls = 0
+
+        def rpc(self, name, params):
+            async def execute():
+                AsyncClient.calls += 1
+                await asyncio.sleep(0.05)
+                row = {"content": f"match {params['query_embedding'][0]}", "metadata": {"source": "a.py"}}
+                return SimpleNamespace(data=[row])
+            return SimpleNamespace(execute=execute)
+
+    retrieval_cache.query_embeddings.clear()
+    retrieval_cache.results.clear()
+    store = CustomSupabaseVectorStore(embeddings=AsyncOnlyEmbeddings(), async_client=AsyncClient())
+    store._client = None  # senkron istemciye dokunulursa hata verir
+
+    async def run():
+        filt = {"collection_name": "demo", "user_id": "u1"}
+        return await asyncio.gather(*(store.ahybrid_search("q" * (i + 1), k=3, filter=filt) for i in range(20)))
+
+    started = time.perf_counter()
+    results = asyncio.run(run())
+    # 20 istek × (embedding + RPC) sırayla ~2s sürerdi; eşzamanlı ~0.1s
+    assert time.perf_counter() - started < 1.0
+    assert [docs[0].page_content for docs in results] == [f"match {float(i + 1)}" for i in range(20)]
+    assert AsyncClient.calls == 20
+
+def test_token_verifier_local_checks_and_cache():
+    import time
+
+    import jwt
+
+    from app.core.security import InvalidToken, TokenVerifier
+
+    SECRET = "test-jwt-secret-at-least-32-bytes-long"
+    remote_calls = []
+    verifier = TokenVerifier(
+        secret=SECRET,
+        audience="authenticated",
+        leeway=0,
+        remote_verify=lambda token: remote_calls.append(token) or "remote-user",
+    )
+    now = int(time.time())
+    claims = {"sub": "u1", "aud": "authenticated", "exp": now + 3600}
+    token = jwt.encode(claims, SECRET, algorithm="HS256")
+
+    assert asyncio.run(verifier.verify(token)) == "u1"
+    assert verifier.cache.stats()["size"] == 1
+    assert asyncio.run(verifier.verify(token)) == "u1"
+    assert verifier.cache.stats()["hits"] == 1
+
+    bad_tokens = [
+        jwt.encode(claims, "a-different-secret-also-32-bytes-long", algorithm="HS256"),
+        jwt.encode({**claims, "exp": now - 60}, SECRET, algorithm="HS256"),
+        jwt.encode({**claims, "nbf": now + 600}, SECRET, algorithm="HS256"),
+        jwt.encode({**claims, "aud": "anon"}, SECRET, algorithm="HS256"),
+        "not-a-jwt",
+    ]
+    for bad in bad_tokens:
+        with pytest.raises(InvalidToken):
+            asyncio.run(verifier.verify(bad))
+    assert remote_calls == []
+
+    verifier.mode = "remote"
+    other = jwt.encode({**claims, "sub": "u2"}, SECRET, algorithm="HS256")
+    assert asyncio.run(verifier.verify(other)) == "remote-user"
+    assert asyncio.run(verifier.verify(other)) == "remote-user"
+    assert remote_calls == [other]
+
+
+def test_code_chunker_splits_on_syntax_boundaries():
+    from langchain_core.documents import Document
+
+    from app.services.code_chunker import CodeChunker, approx_token_count
+
+    methods = "".join(
+        f"    def method_{i}(self):\n        value = {i} * 2\n        return value + {i}\n\n"
+        for i in range(40)
+    )
+    source = (
+        "import os\n\n\n"
+        "# yardımcı\n"
+        "def small(a):\n    return a + 1\n\n\n"
+        "@decorator\n"
+        "class Big:\n"
+        '    """Çok metotlu sınıf."""\n\n'
+        + methods
+    )
+    chunker = CodeChunker(max_tokens=120, overlap_tokens=20, count_tokens=approx_token_count)
+    chunks = chunker.split_documents([Document(page_content=source, metadata={"file_name": "m.py"})])
+
+    assert all(approx_token_count(c.page_content) <= 120 for c in chunks)
+    # Küçük birimler birleştirilir, fonksiyon/metot ortadan bölünmez, örtüşme yok
+    assert chunks[0].page_content.startswith("import os")
+    assert "def small(a):\n    return a + 1" in chunks[0].page_content
+    for c in chunks[1:]:
+        assert c.page_content.lstrip().startswith(("def ", "@decorator"))
+    ranges = [(c.metadata["start_line"], c.metadata["end_line"]) for c in chunks]
+    assert all(prev[1] < cur[0] for prev, cur in zip(ranges, ranges[1:]))
+    assert sum(c.page_content.count("def method_") for c in chunks) == 40
+
+    # Bölünemeyen tek birimde pencereler örtüşür
+    paragraph = "## Başlık\n" + "".join(f"satır {i} uzun bir paragrafın parçası\n" for i in range(60))
+    parts = chunker.split_documents([Document(page_content=paragraph, metadata={"file_name": "README.md"})])
+    assert len(parts) > 1
+    assert parts[1].metadata["start_line"] <= parts[0].metadata["end_line"]
+
+
+def test_lexical_index_bm25_and_hybrid_fusion(tmp_path):
+    from types import SimpleNamespace
+
+    from langchain_core.documents import Document
+
+    from app.services.custom_supabase import CustomSupabaseVectorStore
+    from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize_code
+
+    assert tokenize_code("getCurrentUser(REPO_LOCK)") == [
+        "getcurrentuser", "get", "current", "user", "repo_lock", "repo", "lock",
+    ]
+
+    index = LexicalIndex(str(tmp_path / "lexical.sqlite3"))
+    meta = {"collection_name": "demo", "user_id": "u1"}
+    index.add(
+        [
+            "def get_current_user(token):\n    return verify(token)",
+            "REPO_PROCESSING_LOCK = threading.Lock()",
+            "def user_profile(user):\n    return user.name",
+        ],
+        [{**meta, "source": "deps.py"}, {**meta, "source": "repo.py"}, {**meta, "source": "profile.py"}],
+    )
+    assert index.has_collection("demo", "u1")
+    assert not index.has_collection("demo", "other-user")
+
+    top = index.search("get_current_user nerede?", "demo", "u1", k=3)
+    assert top[0][0].metadata["source"] == "deps.py"
+    assert index.search("REPO_PROCESSING_LOCK", "demo", "u1")[0][0].metadata["source"] == "repo.py"
+    assert index.search("get_current_user", "demo", "other-user") == []
+
+    index.delete_sources("demo", "u1", ["deps.py"])
+    assert all(doc.metadata["source"] != "deps.py" for doc, _ in index.search("get_current_user", "demo", "u1"))
+
+    a, b, c = (Document(page_content=t, metadata={"source": t}) for t in "abc")
+    assert [d.page_content for d in reciprocal_rank_fusion([[a, b, c], [b]])] == ["b", "a", "c"]
+
+    class FakeClient:
+        def rpc(self, name, params):
+            rows = [{"content": "x = 1", "metadata": {"source": "other.py"}, "similarity": 0.8}]
+            return SimpleNamespace(execute=lambda: SimpleNamespace(data=rows))
+
+    class QueryEmbeddings:
+        def embed_query(self, text):
+            return [0.5, 0.5]
+
+        async def aembed_query(self, text):
+            return self.embed_query(text)
+
+    store = CustomSupabaseVectorStore(embeddings=QueryEmbeddings(), client=FakeClient(), lexical_index=index)
+    filt = {"collection_name": "demo", "user_id": "u1"}
+    found = asyncio.run(store.ahybrid_search("REPO_PROCESSING_LOCK", k=2, filter=filt))
+    assert {d.metadata["source"] for d in found} == {"repo.py", "other.py"}
+    assert store.hybrid_search("REPO_PROCESSING_LOCK", k=1, filter=filt)[0].page_content
+    index.close()
+
+
+def test_context_packer_merges_dedupes_and_respects_budget():
+    from langchain_core.documents import Document
+
+    from app.services.context_packer import pack_context
+
+    lines = [f"line_{i} = {i}" for i in range(1, 41)]
+
+    def chunk(source, start, end, tokens=10):
+        text = "\n".join(lines[start - 1:end])
+        return Document(
+            page_content=text,
+            metadata={"source": source, "start_line": start, "end_line": end, "tokens": tokens},
+        )
+
+    docs = [
+        chunk("a.py", 11, 20),
+        chunk("b.py", 1, 10),
+        chunk("a.py", 1, 10),  # komşu → tek blok
+        chunk("a.py", 15, 25),  # örtüşen → sadece yeni satırlar
+        chunk("a.py", 11, 20),  # tekrar → atlanır
+        chunk("c.py", 1, 10, tokens=500),  # bütçeye sığmaz
+        Document(page_content="x" * 30 + "OVERLAP-TEXT-1234567890", metadata={"source": "old.md"}),
+        Document(page_content="OVERLAP-TEXT-1234567890" + "y" * 30, metadata={"source": "old.md"}),
+    ]
+    context = pack_context(docs, max_tokens=100)
+
+    assert context.index("`a.py`") < context.index("`b.py`") < context.index("`old.md`")
+    assert "`c.py`" not in context
+    assert context.count("`a.py`") == 1
+    assert "Satır 1-25:" in context
+    assert context.count("line_15 = 15") == 1
+    assert context.count("line_5 = 5") == 2  # a.py ve b.py
+    assert context.count("OVERLAP-TEXT-1234567890") == 1
+    assert "```python" in context
+
+    # Uzun tek satırın bölünmüş parçaları aynı satır numarasını taşır; hepsi bağlama girer
+    pieces = [
+        Document(page_content=f"part{i}_" * 5, metadata={"source": "min.js", "start_line": 1, "end_line": 1})
+        for i in range(3)
+    ]
+    assert all(f"part{i}_" in pack_context(pieces, max_tokens=1000) for i in range(3))
+
+    # Dosya başlığı ve kod bloğu işaretleri de bütçeden düşülür
+    from app.services.code_chunker import approx_token_count
+
+    many = [chunk(f"f{i}.py", 1, 2, tokens=approx_token_count("\n".join(lines[:2]))) for i in range(20)]
+    packed = pack_context(many, max_tokens=60)
+    assert 0 < packed.count("📁") < 20
+    assert approx_token_count(packed) <= 60
+
+
+def test_local_vector_store_topk_append_delete_and_compaction(tmp_path):
+    import numpy as np
+
+    from app.services.local_vector_store import LocalVectorStore
+
+    class AxisEmbeddings:
+        """Metindeki ilk rakam hangi eksense o eksende birim vektör."""
+
+        def embed_documents(self, texts):
+            return [self.embed_query(t) for t in texts]
+
+        def embed_query(self, text):
+            vector = np.full(8, 0.01)
+            vector[int(next(ch for ch in text if ch.isdigit()))] = 1.0
+            return vector.tolist()
+
+    store = LocalVectorStore(AxisEmbeddings(), str(tmp_path / "vectors"), dtype="float16")
+    meta = {"collection_name": "demo", "user_id": "u1"}
+    store.add_texts(
+        [f"chunk {i}" for i in range(6)],
+        [{**meta, "source": f"f{i % 3}.py"} for i in range(6)],
+    )
+    store.add_texts(["chunk 7"], [{**meta, "source": "f7.py"}])
+    store.add_texts(["chunk 7 other user"], [{"collection_name": "demo", "user_id": "u2", "source": "x.py"}])
+
+    filt = {"collection_name": "demo", "user_id": "u1"}
+    hits = store.similarity_search_by_vector_with_relevance_scores(store.embeddings.embed_query("7"), k=3, filter=filt)
+    assert hits[0][0].page_content == "chunk 7"
+    assert hits[0][1] > 0.99 and hits[0][1] >= hits[1][1] >= hits[2][1]
+    assert len(hits) == 3
+    assert store.similarity_search("4", k=1, filter={**filt, "source": "f1.py"})[0].page_content == "chunk 4"
+    assert store.similarity_search("1", k=3, filter={"collection_name": "demo"}) == []
+
+    # Yeni örnek diskteki veriyi okur; silme ve sıkıştırma sonrası sonuçlar tutarlı
+    reopened = LocalVectorStore(AxisEmbeddings(), str(tmp_path / "vectors"))
+    reopened.delete_sources("demo", "u1", ["f0.py", "f1.py"])
+    remaining = {d.page_content for d in reopened.similarity_search("2", k=10, filter=filt)}
+    assert remaining == {"chunk 2", "chunk 5", "chunk 7"}
+    assert reopened._load(reopened._path("demo", "u1")).count == 3
+
+    reopened.delete_collection("demo", "u1")
+    assert reopened.similarity_search("2", k=10, filter=filt) == []
+    assert reopened.similarity_search("7", k=1, filter={"collection_name": "demo", "user_id": "u2"})
+
+
+def test_local_vector_store_compaction_survives_crash_before_header_swap(tmp_path, monkeypatch):
+    """Sıkıştırma header değişmeden yarıda kalırsa eski nesil geçerli kalmalı, artıklar sonra silinmeli."""
+    from app.services.local_vector_store import LocalVectorStore
+
+    class Embeddings:
+        def embed_documents(self, texts):
+            return [self.embed_query(t) for t in texts]
+
+        def embed_query(self, text):
+            return [1.0, float(len(text)), 0.5]
+
+    directory = str(tmp_path / "vectors")
+    store = LocalVectorStore(Embeddings(), directory)
+    filt = {"collection_name": "demo", "user_id": "u1"}
+    store.add_texts([f"chunk {i}" for i in range(8)], [{**filt, "source": f"f{i}.py"} for i in range(8)])
+
+    def crash(*args, **kwargs):
+        raise OSError("disk kapandı")
+
+    monkeypatch.setattr(store, "_write_header", crash)
+    with pytest.raises(OSError):
+        store.delete_sources("demo", "u1", [f"f{i}.py" for i in range(4)])  # %50 silinmiş: sıkıştırma
+    monkeypatch.undo()
+
+    reopened = LocalVectorStore(Embeddings(), directory)
+    assert len(reopened.similarity_search("x", k=20, filter=filt)) == 8
+    path = reopened._path("demo", "u1")
+    assert "vectors.1.bin" in os.listdir(path)
+
+    reopened.delete_sources("demo", "u1", [f"f{i}.py" for i in range(4)])
+    contents = {d.page_content for d in reopened.similarity_search("x", k=20, filter=filt)}
+    assert contents == {f"chunk {i}" for i in range(4, 8)}
+    assert sorted(os.listdir(path)) == ["alive.1.npy", "header.json", "records.1.jsonl", "vectors.1.bin"]
+    fresh = LocalVectorStore(Embeddings(), directory)
+    assert {d.page_content for d in fresh.similarity_search("x", k=20, filter=filt)} == contents
+
+
+def test_deletes_invalidate_retrieval_cache_after_rows_are_gone(tmp_path, monkeypatch):
+    """Geçersiz kılma silmeden önce olursa arada gelen sorgu eski satırları yeni sürümle önbelleğe yazar."""
+    from app.services.local_vector_store import LocalVectorStore
+    from app.services.retrieval_cache import retrieval_cache
+
+    class Embeddings:
+        def embed_documents(self, texts):
+            return [self.embed_query(t) for t in texts]
+
+        def embed_query(self, text):
+            return [1.0, 0.5, 0.25]
+
+    store = LocalVectorStore(Embeddings(), str(tmp_path / "vectors"))
+    filt = {"collection_name": "demo", "user_id": "u1"}
+    visible = []
+    monkeypatch.setattr(
+        retrieval_cache, "invalidate",
+        lambda collection_name, user_id: visible.append(len(store.similarity_search("x", k=10, filter=filt))),
+    )
+
+    ids = store.add_texts(["a", "b", "c"], [{**filt, "source": f"{n}.py"} for n in "abc"])
+    store.delete_sources("demo", "u1", ["a.py"])
+    store.delete_stale("demo", "u1", ids[2:])
+    store.delete_collection("demo", "u1")
+    assert visible == [2, 1, 0]
+
+
+def test_reindex_skips_unchanged_chunks_and_deletes_stale(tmp_path):
+    from app.services.lexical_index import LexicalIndex
+    from app.services.local_vector_store import LocalVectorStore
+
+    class CountingEmbeddings:
+        def __init__(self):
+            self.embedded = 0
+
+        def embed_documents(self, texts):
+            self.embedded += len(texts)
+            return [self.embed_query(t) for t in texts]
+
+        def embed_query(self, text):
+            return [float(len(text) % 7 + 1), 1.0, 0.5]
+
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    for name in ("a", "b", "c"):
+        (repo / f"{name}.py").write_text(f"def {name}():\n    return '{name}'\n", encoding="utf-8")
+
+    embeddings = CountingEmbeddings()
+    lexical = LexicalIndex(str(tmp_path / "lexical.sqlite3"))
+    store = LocalVectorStore(embeddings, str(tmp_path / "vectors"), lexical_index=lexical)
+    meta = {"collection_name": "demo", "user_id": "u1"}
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=0)
+
+    def index():
+        pipeline = IngestPipeline(store, splitter, batch_size=2)
+        stats = asyncio.run(pipeline.run(str(repo), meta))
+        return stats, store.delete_stale("demo", "u1", pipeline.chunk_ids)
+
+    stats, deleted = index()
+    assert (stats.chunks, stats.skipped, deleted, embeddings.embedded) == (3, 0, 0, 3)
+
+    # Değişmeyen parçalar ne embed edilir ne yazılır; değişen dosyanın eski parçası silinir
+    (repo / "b.py").write_text("def b():\n    return 'changed'\n", encoding="utf-8")
+    (repo / "c.py").unlink()
+    stats, deleted = index()
+    assert (stats.chunks, stats.skipped, deleted, embeddings.embedded) == (1, 1, 2, 4)
+
+    filt = {"collection_name": "demo", "user_id": "u1"}
+    contents = {d.page_content for d in store.similarity_search("x", k=10, filter=filt)}
+    assert contents == {"def a():\n    return 'a'", "def b():\n    return 'changed'"}
+    assert {d.metadata["source"] for d, _ in lexical.search("changed b a", "demo", "u1")} == {"a.py", "b.py"}
+
+
+def test_reindex_rewrites_unchanged_chunk_when_lines_shift(tmp_path):
+    from app.services.code_chunker import CodeChunker
+    from app.services.context_packer import pack_context
+    from app.services.local_vector_store import LocalVectorStore
+
+    class Embeddings:
+        def embed_documents(self, texts):
+            return [self.embed_query(t) for t in texts]
+
+        def embed_query(self, text):
+            return [1.0, 0.5, 0.25]
+
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    body = "".join(f"def f{i}():\n    return {i}\n\n\n" for i in range(3))
+    (repo / "m.py").write_text(body, encoding="utf-8")
+
+    store = LocalVectorStore(Embeddings(), str(tmp_path / "vectors"))
+    meta = {"collection_name": "demo", "user_id": "u1"}
+    chunker = CodeChunker(max_tokens=5, overlap_tokens=0, count_tokens=lambda text: len(text.split()))
+
+    def index():
+        pipeline = IngestPipeline(store, chunker, batch_size=2)
+        stats = asyncio.run(pipeline.run(str(repo), meta))
+        store.delete_stale("demo", "u1", pipeline.chunk_ids)
+        return stats
+
+    first = index()
+    assert first.chunks > 1
+    # Dosyanın başına satır eklenir; alttaki fonksiyonların içeriği aynı, satırları kaydı
+    (repo / "m.py").write_text("import os\n" + body, encoding="utf-8")
+    index()
+
+    docs = sorted(store.similarity_search("x", k=20, filter=meta), key=lambda d: d.metadata["start_line"])
+    lines = ("import os\n" + body).splitlines()
+    for doc in docs:
+        start, end = doc.metadata["start_line"], doc.metadata["end_line"]
+        assert doc.page_content.splitlines() == lines[start - 1:end]
+    context = pack_context(docs, max_tokens=10_000)
+    assert all(f"return {i}" in context for i in range(3))
+
+
+def test_save_indexed_repo_falls_back_without_indexed_commit_column(monkeypatch):
+    from types import SimpleNamespace
+
+    from postgrest.exceptions import APIError
+
+    from app.services.rag_service import RAGService
+    from app.services.resources import resources
+
+    inserted = []
+
+    class UserRepos:
+        def insert(self, row):
+            if "indexed_commit" in row:
+                raise APIError({
+                    "code": "PGRST204",
+                    "message": "Could not find the 'indexed_commit' column of 'user_repos' in the schema cache",
+                })
+            inserted.append(row)
+            return SimpleNamespace(execute=lambda: SimpleNamespace(data=[row]))
+
+    monkeypatch.setitem(resources.__dict__, "supabase", SimpleNamespace(table=lambda name: UserRepos()))
+    # Migration 001 yoksa repo yine kaydedilir (commit'siz); başka hatalar yutulmaz
+    RAGService().save_indexed_repo("u1", "demo", "https://github.com/o/demo", "abc123", exists=False)
+    assert inserted == [{"user_id": "u1", "repo_name": "demo", "repo_url": "https://github.com/o/demo"}]
+
+    def broken(name):
+        raise APIError({"code": "23505", "message": "duplicate key value violates unique constraint"})
+
+    monkeypatch.setitem(resources.__dict__, "supabase", SimpleNamespace(table=broken))
+    with pytest.raises(APIError):
+        RAGService().save_indexed_repo("u1", "demo", "https://github.com/o/demo", "abc123", exists=False)
+
+
+def test_message_buffer_coalesces_writes_and_requeues_on_failure():
+    import time
+
+    from app.services.message_buffer import MessageWriteBuffer
+
+    writes = []
+    fail = {"next": True}
+
+    def write(rows):
+        if fail["next"]:
+            fail["next"] = False
+            raise Exception("bağlantı hatası")
+        writes.append(list(rows))
+
+    buffer = MessageWriteBuffer(write, flush_interval=0.1, batch_size=50, max_pending=5)
+    for i in range(4):
+        buffer.add("u1", "demo", "user", f"m{i}")
+    assert buffer.has_pending("u1", "demo") and not buffer.has_pending("u1", "other")
+
+    # İlk yazma hata verir, mesajlar tamponda kalır ve bir sonraki turda tek insert ile yazılır
+    deadline = time.time() + 5
+    while not writes and time.time() < deadline:
+        time.sleep(0.02)
+    assert [[m["content"] for m in batch] for batch in writes] == [["m0", "m1", "m2", "m3"]]
+    assert [m["created_at"] for m in writes[0]] == sorted(m["created_at"] for m in writes[0])
+
+    # Sınır aşılınca en eski mesajlar atılır; kapanışta kalanlar yazılır
+    buffer.add_many([{"user_id": "u1", "repo_name": "demo", "role": "ai", "content": f"x{i}"} for i in range(7)])
+    buffer.shutdown()
+    assert [m["content"] for m in writes[-1]] == ["x2", "x3", "x4", "x5", "x6"]
+    assert buffer.stats() == {"pending": 0, "written": 9, "dropped": 2, "dead_lettered": 0}
+
+
+def test_message_buffer_dead_letters_bad_row_and_backs_off():
+    from app.services.message_buffer import MessageWriteBuffer
+
+    writes = []
+    down = {"value": True}
+
+    def write(rows):
+        if down["value"] or any(m["content"] == "bozuk" for m in rows):
+            raise Exception("insert hatası")
+        writes.append([m["content"] for m in rows])
+
+    # Uzun flush_interval: arka plan worker'ı test süresince kendiliğinden yazmaz
+    buffer = MessageWriteBuffer(write, flush_interval=5, batch_size=50, max_backoff=30)
+    buffer.add_many([
+        {"user_id": "u1", "repo_name": "demo", "role": "user", "content": c} for c in ("a\x00", "bozuk", "b")
+    ])
+
+    # Veritabanı erişilemezken satırlar atılmaz, bekleme süresi üstel artar ve sınırlanır
+    buffer.flush()
+    assert buffer.backoff_seconds() == 5
+    for _ in range(3):
+        buffer.flush()
+    assert buffer.stats()["pending"] == 3 and buffer.dead_lettered == 0
+    assert buffer.backoff_seconds() == 30
+
+    # Erişim gelince bozuk satır ayıklanır, diğerleri yazılır ve kuyruk tıkanmaz
+    down["value"] = False
+    buffer.flush()
+    assert writes == [["a"], ["b"]]
+    assert [m["content"] for m in buffer.dead_letters] == ["bozuk"]
+    assert buffer.backoff_seconds() == 0
+    buffer.add("u1", "demo", "ai", "c")
+    buffer.shutdown()
+    assert writes[-1] == ["c"]
+    assert buffer.stats() == {"pending": 0, "written": 3, "dead_lettered": 1, "dropped": 0}
+
+
+def test_sqlite_rate_limit_storage_is_shared_and_sliding(tmp_path, monkeypatch):
+    from limits import parse
+    from limits.strategies import SlidingWindowCounterRateLimiter
+
+    from app.services import rate_limit_storage
+    from app.services.rate_limit_storage import SQLiteStorage
+
+    uri = f"sqlite:///{tmp_path.as_posix().lstrip('/')}/limits.sqlite3"
+    # İki ayrı depo örneği = aynı dosyayı paylaşan iki worker
+    workers = [SlidingWindowCounterRateLimiter(SQLiteStorage(uri)) for _ in range(2)]
+    limit = parse("5/minute")
+
+    assert [workers[i % 2].hit(limit, "u1") for i in range(6)] == [True] * 5 + [False]
+    assert workers[0].hit(limit, "u2")
+    assert workers[1].get_window_stats(limit, "u1").remaining == 0
+
+    # Bir sonraki pencerenin başında önceki pencere hâlâ tam ağırlıkla sayılır (sınırda patlama yok)
+    now = 1_700_000_000.0 - 1_700_000_000.0 % 60 + 59
+    monkeypatch.setattr(rate_limit_storage.time, "time", lambda: now)
+    fresh = SlidingWindowCounterRateLimiter(SQLiteStorage(uri))
+    assert [fresh.hit(limit, "edge") for _ in range(5)] == [True] * 5
+    now += 2  # yeni pencerenin 1. saniyesi: floor(5 × 59/60) = 4 → tek hak
+    assert [fresh.hit(limit, "edge") for _ in range(2)] == [True, False]
+    now += 45  # önceki pencerenin 14 sn'si kaldı: floor(5 × 14/60 + 1) = 2 → 3 hak
+    assert [fresh.hit(limit, "edge") for _ in range(4)] == [True] * 3 + [False]
+
+
+def test_pipeline_without_process_pool_splits_serially(tmp_path, monkeypatch):
+    import threading
+    import time
+
+    from app.services import ingest_pipeline
+
+    # Süreç havuzu yokken parçalama thread'lerde eşzamanlı çalışmamalı (3.11'de ast.parse SystemError)
+    active, peak = [0], [0]
+    lock = threading.Lock()
+    original = ingest_pipeline.process_files
+
+    def tracking_process_files(*args):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        try:
+            return original(*args)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    monkeypatch.setattr(ingest_pipeline, "process_files", tracking_process_files)
+    for i in range(12):
+        (tmp_path / f"m{i}.py").write_text(f"def f{i}():\n    return {i}\n")
+    store = RecordingVectorStore()
+    pipeline = IngestPipeline(
+        store, RecursiveCharacterTextSplitter(chunk_size=4000, chunk_overlap=0),
+        file_batch_size=1, max_in_flight=4,
+    )
+    stats = asyncio.run(pipeline.run(str(tmp_path), {"collection_name": "demo", "user_id": "u1"}))
+    assert stats.files_read == 12
+    assert peak[0] == 1
+
+
+def test_benchmark_index_scenario_with_fakes():
+    from benchmarks.scenarios import run_index
+
+    options = {
+        "seed": 1, "embed_dims": 64, "embed_latency": 0.0, "throttle_every": 2, "embed_rate": 0,
+        "retry_sleep": 0.0, "cpu_workers": 0, "db_latency": 0.0,
+    }
+    result = run_index(40, options)
+
+    assert result["chunks"] > 0 and result["rows"] == result["chunks"]
+    assert result["throttled"] > 0 and result["retries"] == result["throttled"]
+    # Değişmeyen repo yeniden indekslenince hiçbir parça tekrar embed edilmez
+    assert result["reindex_skipped"] == result["chunks"]
+    assert result["reindex_embedded"] == 0
+    assert result["skipped_files"] == 4  # build/ (.gitignore), node_modules, lock, .min.js
+
+
+def test_file_filter_skips_ignored_vendored_generated_and_minified(tmp_path):
+    import base64
+
+    from app.services.file_filter import FileFilter
+
+    files = {
+        ".gitignore": "build/\n*.tmp.py\n!keep.tmp.py\n\\!important.py\n",
+        ".gitattributes": "gen/** linguist-generated\nvendor/** -linguist-vendored\n",
+        "src/app.py": "def main():\n    return 1\n",
+        "src/keep.tmp.py": "x = 1\n",
+        "src/scratch.tmp.py": "x = 2\n",
+        "src/!important.py": "x = 4\n",
+        "src/keys.py": '"""Helpers for auto-generated primary keys."""\n# do not edit by hand\nx = 1\n',
+        "build/out.py": "x = 3\n",
+        "gen/api.ts": "export const a = 1;\n",
+        "vendor/patched.js": "var a = 1;\n",
+        "node_modules/lib/index.js": "module.exports = 1;\n",
+        "web/package-lock.json": "{}\n",
+        "web/app.min.js": "var a=1;\n",
+        "web/bundle.js": "var a=1;" * 400,
+        "proto/user.py": "#!/usr/bin/env python\n\n# Code generated by protoc-gen. DO NOT EDIT.\nx = 1\n",
+        "data/blob.json": "\n".join(base64.b64encode(os.urandom(3000)).decode()[i:i + 76] for i in range(0, 4000, 76)),
+        "data/big.json": "[" + "1, " * 30000 + "1]\n",
+        "docs/guide.md": "The API reference is automatically generated.\n\n" + ("Uzun bir paragraf " * 40 + "\n\n") * 3,
+    }
+    for relative_path, content in files.items():
+        path = tmp_path / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+    store = RecordingVectorStore()
+    file_filter = FileFilter(str(tmp_path), max_file_bytes=512 * 1024, max_json_bytes=64 * 1024)
+    pipeline = IngestPipeline(
+        store, RecursiveCharacterTextSplitter(chunk_size=4000, chunk_overlap=0), file_filter=file_filter,
+    )
+    asyncio.run(pipeline.run(str(tmp_path), {"collection_name": "demo", "user_id": "u1"}))
+
+    indexed = sorted({d.metadata["source"] for b in store.batches for d in b})
+    # Docstring / düzyazıdaki "auto-generated" ifadeleri üretilmiş dosya başlığı değildir
+    assert indexed == ["docs/guide.md", "src/app.py", "src/keep.tmp.py", "src/keys.py", "vendor/patched.js"]
+    report = file_filter.report.to_dict()
+    reasons = {example["path"]: example["reason"] for example in report["examples"]}
+    assert reasons == {
+        "src/scratch.tmp.py": "gitignore",
+        "src/!important.py": "gitignore",
+        "build/": "gitignore",
+        "gen/api.ts": "generated",
+        "node_modules/": "vendored",
+        "web/package-lock.json": "lockfile",
+        "web/app.min.js": "minified",
+        "web/bundle.js": "minified",
+        "proto/user.py": "generated",
+        "data/blob.json": "high_entropy",
+        "data/big.json": "too_large",
+    }
+    assert report["files"] == 11
+    assert report["bytes"] == sum(
+        len(files[p].encode()) for p in files if p not in indexed and not p.startswith(".git")
+    )
+
+    # Artımlı indekslemede verilen yollar da aynı kurallardan geçer
+    from app.services.ingest_pipeline import iter_source_files
+
+    paths = ["build/out.py", "src/app.py", "node_modules/lib/index.js"]
+    assert [p for _, p in iter_source_files(str(tmp_path), paths, FileFilter(str(tmp_path)))] == ["src/app.py"]
+
+
+def test_content_heuristics_entropy_ignores_non_latin_text():
+    """CJK düzyazı ve yorumlar karakter başına yüksek entropili olsa da veri sayılmamalı."""
+    import base64
+    import random
+
+    from app.services.file_filter import ContentHeuristics
+
+    rng = random.Random(1)
+    hanzi = [chr(0x4E00 + rng.randrange(2500)) for _ in range(3000)]
+    readme = "# 项目说明\n\n" + "\n".join("".join(hanzi[i:i + 40]) + "。" for i in range(0, 3000, 40))
+    source = "".join(
+        f"def f{i}(x):\n    # {''.join(hanzi[i * 30:i * 30 + 30])}\n    return x + {i}\n\n" for i in range(60)
+    )
+    blob = "\n".join(base64.b64encode(rng.randbytes(3000)).decode()[i:i + 76] for i in range(0, 4000, 76))
+
+    heuristics = ContentHeuristics()
+    assert heuristics.reason("README.zh.md", readme) is None
+    assert heuristics.reason("src/calc.py", source) is None
+    assert heuristics.reason("data/blob.txt", blob) == "high_entropy"
+
+
+def test_minhash_permutations_match_exact_modular_arithmetic():
+    import numpy as np
+    from app.services.near_duplicates import _hash_values, _permutations
+
+    a, b = _permutations(64, 1)
+    hashes = np.array([0, 1, 12345, 0x7FFFFFFF, 0xFFFFFFFF], dtype=np.uint64)
+    prime = (1 << 61) - 1
+    expected = [[(int(ai) * int(x) + int(bi)) % prime for x in hashes] for ai, bi in zip(a, b)]
+    assert _hash_values(a, b, hashes).tolist() == expected
+
+
+def test_near_duplicate_chunks_embedded_once_with_duplicate_sources(tmp_path):
+    from app.services.context_packer import pack_context
+    from app.services.local_vector_store import LocalVectorStore
+    from app.services.near_duplicates import MinHasher, NearDuplicateIndex
+
+    class CountingEmbeddings:
+        def __init__(self):
+            self.embedded = 0
+
+        def embed_documents(self, texts):
+            self.embedded += len(texts)
+            return [self.embed_query(t) for t in texts]
+
+        def embed_query(self, text):
+            return [float(len(text) % 7 + 1), 1.0, 0.5]
+
+    header = "\n".join(f"# Licensed under the Apache License clause {i} you may not use this file except" for i in range(8))
+    repo = tmp_path / "repo"
+    (repo / "vendor_copy").mkdir(parents=True)
+    (repo / "a.py").write_text(header + "\n", encoding="utf-8")
+    (repo / "vendor_copy" / "a.py").write_text(header + "\n# kopya\n", encoding="utf-8")
+    (repo / "b.py").write_text(header.replace("Apache", "MIT") + "\n", encoding="utf-8")
+    (repo / "c.py").write_text(" ".join(f"unique_{i}" for i in range(60)) + "\n", encoding="utf-8")
+    (repo / "short.py").write_text("x = 1\n", encoding="utf-8")
+    (repo / "short_copy.py").write_text("x = 1\n", encoding="utf-8")
+
+    embeddings = CountingEmbeddings()
+    store = LocalVectorStore(embeddings, str(tmp_path / "vectors"))
+    meta = {"collection_name": "demo", "user_id": "u1"}
+    splitter = RecursiveCharacterTextSplitter(chunk_size=4000, chunk_overlap=0)
+
+    def index():
+        pipeline = IngestPipeline(
+            store, splitter, batch_size=2,
+            deduplicator=NearDuplicateIndex(threshold=0.8), hasher=MinHasher(min_tokens=20),
+        )
+        stats = asyncio.run(pipeline.run(str(repo), meta))
+        return stats, store.delete_stale("demo", "u1", pipeline.chunk_ids)
+
+    stats, deleted = index()
+    # a.py + kopyası (tek satır farklı) tek satır; MIT başlığı yakın ama eşiğin altında;
+    # kısa parçalar karşılaştırılmaz. a.py kopyası bulunmadan yüklendiği için sonda
+    # duplicate_sources ile bir kez daha yazılır, ilk satırı silinir.
+    assert (stats.files_read, stats.chunks, stats.duplicates, embeddings.embedded, deleted) == (6, 6, 1, 6, 1)
+    docs = store.similarity_search("x", k=10, filter=meta)
+    duplicates = {d.metadata["source"]: d.metadata.get("duplicate_sources") for d in docs}
+    assert duplicates == {
+        "a.py": ["vendor_copy/a.py"], "b.py": None, "c.py": None, "short.py": None, "short_copy.py": None,
+    }
+
+    # Değişmeyen repo: kümeler ve id'ler aynı, hiçbir şey yeniden embed edilmez
+    stats, deleted = index()
+    assert (stats.skipped, deleted, embeddings.embedded) == (5, 0, 6)
+
+    # Temsilcinin dosyası değişirse kopyası da artımlı indekslemeye dahil edilir
+    assert store.linked_sources("demo", "u1", ["a.py"]) == {"vendor_copy/a.py"}
+    assert store.linked_sources("demo", "u1", ["vendor_copy/a.py"]) == {"a.py"}
+    assert store.linked_sources("demo", "u1", ["c.py"]) == set()
+
+    representative = next(d for d in docs if d.metadata["source"] == "a.py")
+    assert "`vendor_copy/a.py`" in pack_context([representative], max_tokens=1000)
+
+
+def test_near_duplicate_dedup_uploads_before_walk_finishes(tmp_path):
+    """Dedup açıkken de parçalar tarama bitmeden yüklenmeye başlamalı (akış korunur)."""
+    from app.services.near_duplicates import MinHasher, NearDuplicateIndex
+
+    for i in range(120):
+        (tmp_path / f"mod{i:03}.py").write_text(" ".join(f"word_{i}_{j}" for j in range(40)) + "\n")
+    (tmp_path / "zz_copy.py").write_text(" ".join(f"word_0_{j}" for j in range(40)) + "\n")
+
+    class WalkTrackingPipeline(IngestPipeline):
+        walk_done = False
+
+        async def _walk(self, *args):
+            await super()._walk(*args)
+            self.walk_done = True
+
+    uploads_before_walk = []
+
+    class Store(RecordingVectorStore):
+        def add_documents(self, docs, **kwargs):
+            uploads_before_walk.append(not pipeline.walk_done)
+            return super().add_documents(docs, **kwargs)
+
+    store = Store()
+    pipeline = WalkTrackingPipeline(
+        store, RecursiveCharacterTextSplitter(chunk_size=4000, chunk_overlap=0), batch_size=2,
+        deduplicator=NearDuplicateIndex(threshold=0.8), hasher=MinHasher(min_tokens=20),
+    )
+    stats = asyncio.run(pipeline.run(str(tmp_path), {"collection_name": "demo", "user_id": "u1"}))
+
+    assert uploads_before_walk[0] is True
+    assert stats.duplicates == 1
+    sources = [d.metadata.get("duplicate_sources") for b in store.batches for d in b]
+    assert sources.count(["zz_copy.py"]) == 1
+
+
+def test_index_jobs_shared_between_workers(tmp_path):
+    """İş durumu, iptal ve sahiplenme aynı dosyayı kullanan tüm worker süreçlerinde geçerli olmalı."""
+    from app.services.index_jobs import IndexJobQueue, JobStatus, JobStore
+
+    path = str(tmp_path / "jobs.sqlite3")
+    started, release = threading.Event(), threading.Event()
+
+    async def runner(job):
+        started.set()
+        while not release.is_set():
+            job.check_cancelled()
+            await asyncio.sleep(0.01)
+        return {"ok": True}
+
+    submitter = IndexJobQueue(runner=runner, store=JobStore(path))
+    submitter._ensure_workers = lambda: None  # bu "worker" iş çalıştırmıyor
+    worker = IndexJobQueue(runner=runner, store=JobStore(path), poll_interval=0.05, heartbeat_interval=0.05)
+
+    job = submitter.submit("user-a", "https://github.com/a/one", "one")
+    queued = submitter.submit("user-a", "https://github.com/a/two", "two")
+    worker.start()
+    try:
+        assert started.wait(5)
+        assert submitter.get(job.id).status == JobStatus.RUNNING
+        assert submitter.active_repo_names("user-a") == {"one", "two"}
+
+        # Başka süreçten gelen iptal çalışan işe kalp atışıyla ulaşır
+        submitter.cancel(job.id)
+        assert worker.wait(job.id, timeout=5).status == JobStatus.CANCELLED
+
+        release.set()
+        assert submitter.wait(queued.id, timeout=5).status == JobStatus.SUCCEEDED
+        assert submitter.get(queued.id).result == {"ok": True}
+    finally:
+        release.set()
+        worker.shutdown(timeout=5)
+
+    # Kalp atışı kesilen (çöken worker'ın) işi başka bir worker yeniden alır
+    orphan = submitter.submit("user-b", "https://github.com/b/three", "three")
+    claimed = submitter.store.claim("dead-worker", 1, stale_after=60, max_attempts=3)
+    assert claimed.id == orphan.id
+    assert submitter.store.claim("other", 1, stale_after=60, max_attempts=3) is None
+    assert submitter.store.claim("other", 1, stale_after=-1, max_attempts=3).id == orphan.id
@@ -15,7 +15,7 @@ import ResetPasswordModal from './components/ResetPasswordModal';
 import NotFound from './components/NotFound';
 import EnhancedMarkdown from './components/EnhancedMarkdown';
 import Auth from './pages/Auth';
-import { indexRepo, chatWithRepo, getUserRepos, saveMessage, getChatHistory, deleteRepo } from './services/api';
+import { indexRepo, chatWithRepo, getUserRepos, getChatHistory, deleteRepo } from './services/api';
 import type { UserRepo } from './services/api';
 import { supabase } from './supabase';
 
@@ -36,6 +36,9 @@ function App() {
   const [activeRepo, setActiveRepo] = useState<string | null>(null);
   const [indexing, setIndexing] = useState(false);
   const [messages, setMessages] = useState<Message[]>([]);
+  // Geçmişte daha eski mesajlar varsa bir sonraki sayfanın imleci
+  const [historyCursor, setHistoryCursor] = useState<string | null>(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const [input, setInput] = useState('');
   const [thinking, setThinking] = useState(false);
   const [status, setStatus] = useState('');
@@ -152,16 +155,14 @@ function App() {
     setActiveRepo(repoName);
     setError(null);
     setStatus('');
+    setHistoryCursor(null);
     setMessages([{ role: 'ai', content: '⏳ Geçmiş konuşmalar yükleniyor...' }]);
 
     try {
         const history = await getChatHistory(session.user.id, repoName);
-        if (history && history.length > 0) {
-            const formattedMessages = history.map((msg: any) => ({
-                role: msg.role,
-                content: msg.content
-            }));
-            setMessages(formattedMessages);
+        setHistoryCursor(history.nextCursor);
+        if (history.messages.length > 0) {
+            setMessages(history.messages.map((msg) => ({ role: msg.role, content: msg.content })));
         } else {
             setMessages([{ role: 'ai', content: `📂 **${repoName}** arşivi açıldı. Kaldığımız yerden devam edebiliriz!` }]);
         }
@@ -171,6 +172,23 @@ function App() {
     }
   };
 
+  const loadOlderMessages = async () => {
+    if (!session?.user?.id || !activeRepo || !historyCursor || loadingOlder) return;
+    setLoadingOlder(true);
+    try {
+        const history = await getChatHistory(session.user.id, activeRepo, historyCursor);
+        setHistoryCursor(history.nextCursor);
+        setMessages(prev => [
+            ...history.messages.map((msg) => ({ role: msg.role, content: msg.content })),
+            ...prev,
+        ]);
+    } catch (err) {
+        console.error("Eski mesajlar yüklenemedi", err);
+    } finally {
+        setLoadingOlder(false);
+    }
+  };
+
   const promptDelete = (e: React.MouseEvent, repoName: string) => {
       e.stopPropagation();
       setRepoToDelete(repoName);
@@ -188,6 +206,7 @@ function App() {
           if (activeRepo === repoToDelete) {
               setActiveRepo(null);
               setMessages([]);
+              setHistoryCursor(null);
           }
           
           setShowDeleteModal(false);
@@ -202,6 +221,7 @@ function App() {
   const handleLogout = async () => {
     await supabase.auth.signOut();
     setMessages([]);
+    setHistoryCursor(null);
     setActiveRepo(null);
     setRepoList([]);
   };
@@ -224,9 +244,15 @@ function App() {
     setStatus('Repo inceleniyor...');
     setError(null);
     try {
-      const result = await indexRepo(repoUrl, session.user.id);
+      const result = await indexRepo(repoUrl, session.user.id, (job) => {
+        const { files_read, chunks_total, chunks_uploaded } = job.progress;
+        setStatus(job.status === 'queued'
+          ? 'Sırada bekleniyor...'
+          : `Repo inceleniyor... (${files_read} dosya, ${chunks_uploaded}/${chunks_total} parça)`);
+      });
       
       setActiveRepo(result.repo_name);
+      setHistoryCursor(null);
       
       setStatus('');
       setToastMessage({text: `${result.repo_name} başarıyla analiz edildi!`, type: 'success'});
@@ -264,12 +290,8 @@ function App() {
     setMessages(prev => [...prev, { role: 'user', content: userMsg }]);
     setThinking(true);
 
-    saveMessage(session.user.id, activeRepo, 'user', userMsg);
-    let fullAiResponse = "";
-
     try {
       await chatWithRepo(activeRepo, userMsg, session.user.id, (chunk) => {
-        fullAiResponse += chunk;
         setMessages(prev => {
           const lastMsg = prev[prev.length - 1];
           if (lastMsg.role === 'ai') {
@@ -279,10 +301,6 @@ function App() {
           }
         });
       });
-      
-      if (fullAiResponse) {
-          saveMessage(session.user.id, activeRepo, 'ai', fullAiResponse);
-      }
     } catch (err: any) {
       // Rate limit veya diğer hataları yakala
       if (err.message && (err.message.includes('Günlük hakkınız doldu') || err.message.includes('429') || err.message.includes('rate limit'))) {
@@ -519,6 +537,18 @@ function App() {
           </div>
         ) : (
           <div className="flex-1 overflow-y-auto p-6 space-y-6 relative z-10 scroll-smooth">
+            {historyCursor && (
+              <div className="flex justify-center">
+                <button
+                  onClick={loadOlderMessages}
+                  disabled={loadingOlder}
+                  className="flex items-center gap-2 text-xs text-slate-400 hover:text-blue-400 bg-slate-900 border border-slate-800 rounded-full px-4 py-1.5 transition-colors disabled:opacity-50"
+                >
+                  {loadingOlder ? <Loader2 className="w-3 h-3 animate-spin" /> : <Clock className="w-3 h-3" />}
+                  Daha eski mesajları yükle
+                </button>
+              </div>
+            )}
             {messages.map((msg, idx) => (
               <div
                 key={idx}
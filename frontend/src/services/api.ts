@@ -30,13 +30,56 @@ export interface UserRepo {
   created_at: string;
 }
 
-export const indexRepo = async (url: string, user_id: string): Promise<RepoIndexResponse> => {
+export interface IndexJobProgress {
+  files_read: number;
+  chunks_total: number;
+  chunks_embedded: number;
+  chunks_uploaded: number;
+}
+
+export interface IndexJob {
+  job_id: string;
+  repo_name: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled';
+  progress: IndexJobProgress;
+  result: RepoIndexResponse | null;
+  error: string | null;
+}
+
+const JOB_POLL_INTERVAL = 2000; // 2 saniye
+
+export const getIndexJob = async (job_id: string): Promise<IndexJob> => {
+  const headers = await getAuthHeaders();
+  const response = await apiClient.get<IndexJob>(`/repo/jobs/${job_id}`, { headers: headers });
+  return response.data;
+};
+
+export const cancelIndexJob = async (job_id: string): Promise<IndexJob> => {
+  const headers = await getAuthHeaders();
+  const response = await apiClient.post<IndexJob>(`/repo/jobs/${job_id}/cancel`, {}, { headers: headers });
+  return response.data;
+};
+
+// İndeksleme arka planda çalışır: iş kuyruğa alınır, bitene kadar durumu sorgulanır
+export const indexRepo = async (
+  url: string,
+  user_id: string,
+  onProgress?: (job: IndexJob) => void
+): Promise<RepoIndexResponse> => {
   const headers = await getAuthHeaders();
-  const response = await apiClient.post<RepoIndexResponse>('/repo/index', { 
+  const response = await apiClient.post<{ job_id: string }>('/repo/index', { 
     repo_url: url,
     user_id: user_id
   }, { headers: headers });
-  return response.data;
+
+  while (true) {
+    const job = await getIndexJob(response.data.job_id);
+    onProgress?.(job);
+    if (job.status === 'succeeded' && job.result) return job.result;
+    if (job.status === 'failed') throw new Error(job.error || 'Repo indekslenirken bir hata oluştu.');
+    if (job.status === 'cancelled') throw new Error('İndeksleme iptal edildi.');
+    await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL));
+  }
 };
 
 export const getUserRepos = async (user_id: string): Promise<UserRepo[]> => {
@@ -65,7 +108,9 @@ export const chatWithRepo = async (
       body: JSON.stringify({ 
         collection_name, 
         question, 
-        user_id 
+        user_id,
+        // Soru ve tamamlanan cevap sunucuda kaydedilir (ayrı /chat/save çağrısı yok)
+        save_messages: true
       }),
       signal: controller.signal,
     });
@@ -116,13 +161,45 @@ export const saveMessage = async (user_id: string, repo_name: string, role: 'use
   },{ headers: headers });
 };
 
-export const getChatHistory = async (user_id: string, repo_name: string) => {
-  const headers = await getAuthHeaders();
-  const response = await apiClient.get('/chat/history', {
-    params: { user_id, repo_name },
-    headers: headers
+export interface ChatHistoryMessage {
+  id: number | string;
+  role: 'user' | 'ai';
+  content: string;
+  created_at: string;
+}
+
+export interface ChatHistoryPage {
+  messages: ChatHistoryMessage[]; // Sayfa içinde eskiden yeniye
+  nextCursor: string | null; // Daha eski mesajlar varsa getChatHistory'ye before olarak verilir
+}
+
+// ETag ile doğrulanan sayfalar: sayfa değişmediyse sunucu 304 döner, gövde buradan alınır
+const historyPages = new Map<string, { etag: string; page: ChatHistoryPage }>();
+
+export const getChatHistory = async (user_id: string, repo_name: string, before?: string | null): Promise<ChatHistoryPage> => {
+  const headers: Record<string, string> = await getAuthHeaders();
+  const key = `${user_id}|${repo_name}|${before ?? ''}`;
+  const cached = historyPages.get(key);
+  if (cached) {
+    headers['If-None-Match'] = cached.etag;
+  }
+  const response = await apiClient.get<ChatHistoryMessage[]>('/chat/history', {
+    params: before ? { user_id, repo_name, before } : { user_id, repo_name },
+    headers: headers,
+    validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
   });
-  return response.data;
+  if (response.status === 304 && cached) {
+    return cached.page;
+  }
+  const page: ChatHistoryPage = {
+    messages: response.data,
+    nextCursor: (response.headers['x-next-cursor'] as string | undefined) ?? null,
+  };
+  const etag = response.headers['etag'] as string | undefined;
+  if (etag) {
+    historyPages.set(key, { etag, page });
+  }
+  return page;
 };
 
 export const deleteRepo = async (user_id: string, repo_name: string) => {